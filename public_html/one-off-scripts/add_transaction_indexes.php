@@ -0,0 +1,45 @@
+<?php
+/**
+ * Add Transaction Keyset Indexes
+ *
+ * Creates the composite indexes that the MCP server's get_transactions tool
+ * pages through with its (trade_date, id) keyset cursor, with and without a
+ * client/account filter. Safe to run more than once: indexes that already
+ * exist are left alone.
+ */
+
+require_once 'index.php';
+
+$indexes = [
+    'idx_hl_transactions_date_id'         => '(trade_date, id)',
+    'idx_hl_transactions_account_date_id' => '(client_name, account_type, trade_date, id)',
+];
+
+echo "=== Transaction Keyset Indexes ===\n\n";
+
+try {
+    $pdo = db();
+
+    $check = $pdo->prepare("
+        SELECT COUNT(*)
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE()
+        AND table_name = 'hl_transactions'
+        AND index_name = :name
+    ");
+
+    foreach ($indexes as $name => $columns) {
+        $check->execute([':name' => $name]);
+        if ($check->fetchColumn() > 0) {
+            echo "[SKIP] {$name} already exists\n";
+            continue;
+        }
+        $pdo->exec("CREATE INDEX {$name} ON hl_transactions {$columns}");
+        echo "[OK] Created {$name} on hl_transactions {$columns}\n";
+    }
+
+} catch (Exception $e) {
+    echo "ERROR: " . $e->getMessage() . "\n";
+    exit(1);
+}
+?>
@@ -0,0 +1,576 @@
+#!/usr/bin/env python3
+"""
+Account Snapshots
+Single-pass valuation engine for hl_account_values_historical.
+
+The PHP cron (cron/daily_update_historical_values.php) values each
+(client, account, date) with three queries, one of which reads every price row
+on or before the date to keep the latest. This engine reads hl_transactions
+and hl_prices_historical once and answers any set of dates with array
+operations:
+
+    positions  cumulative (event date × account × ticker) quantities and
+               (event date × account) cash, over the sorted transaction dates
+    prices     (price date × ticker) matrix, forward-filled so each row holds
+               the latest price on or before that date
+    values     for each requested date, searchsorted picks the position and
+               price rows, and holdings/cash/total come out for every account
+
+Values follow calculate_historical_account_balance exactly, so rows written
+here match the ones the PHP cron writes:
+  - only tickers with a positive net Buy/Sell quantity are held; unpriced
+    holdings count as 0
+  - holdings are quantity × price as stored, summed across currencies
+  - cash is the signed sum of value_gbp (Buy/Withdrawal/Fee negative)
+  - an account with no open holdings on a date is recorded as all zeros
+
+The engine holds no connection or global state: SnapshotEngine.load() takes
+any cursor (tuple or dictionary rows), so the MCP server can build one on a
+pooled connection and call values() for arbitrary dates.
+
+Usage:
+    python3 account_snapshots.py                         today, like the cron
+    python3 account_snapshots.py 2025-01-26              one date
+    python3 account_snapshots.py --from 2015-06-26 [--to 2025-12-31] [--replace] [--dry-run]
+    python3 account_snapshots.py --incremental [date]    nightly: from the saved state
+    python3 account_snapshots.py --verify [date]         incremental vs full rebuild, no writes
+
+Existing rows are kept unless --replace is given, as with the PHP scripts.
+
+Every run that writes also saves each account's positions and cash as of its
+last date in hl_snapshot_state, unless the saved state is already for a later
+date (a backfill doesn't rewind it). --incremental starts from that state and
+reads only the transactions and prices dated after it, so the nightly cost
+follows the day's activity rather than the length of the history; it writes
+every date since the state, so a missed night is filled in by the next run.
+It falls back to a full rebuild when there is no state, or when hl_transactions
+has gained rows dated on or before the state or lost rows since (checked via
+MAX(id) and COUNT(*)). Edits to existing rows are not detected; --verify
+recomputes the date both ways and lists any differences.
+Output is appended to ../logs/account_snapshots.jsonl (see runlog.py).
+"""
+
+import sys
+import json
+import time
+import argparse
+import datetime as dt
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import runlog
+import price_sink
+from price_index import as_days
+
+CLIENTS       = ("David", "Jen")
+ACCOUNT_TYPES = ("SIPP", "ISA", "Fund & Share")
+# Same order as the PHP cron's $accounts
+ACCOUNTS = [(client, account) for client in CLIENTS for account in ACCOUNT_TYPES]
+
+TABLE   = "hl_account_values_historical"
+COLUMNS = ("client_name", "account_type", "trade_date", "holdings_value_gbp", "cash_value_gbp", "total_value_gbp")
+
+LOG_FILE = "../logs/account_snapshots.jsonl"
+
+# Positions and cash as of the last snapshot, so the nightly run only applies that day's transactions
+STATE_TABLE   = "hl_snapshot_state"
+STATE_COLUMNS = ("client_name", "account_type", "as_of", "last_txn_id", "txn_count", "cash_gbp", "positions")
+STATE_SCHEMA  = f"""
+    CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+        client_name  VARCHAR(50)   NOT NULL,
+        account_type VARCHAR(50)   NOT NULL,
+        as_of        DATE          NOT NULL,
+        last_txn_id  INT           NOT NULL,
+        txn_count    INT           NOT NULL,
+        cash_gbp     DECIMAL(18,2) NOT NULL,
+        positions    MEDIUMTEXT    NOT NULL,
+        updated_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (client_name, account_type)
+    ) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+# MySQL error for a missing table: the state table before the first writing run
+ER_NO_SUCH_TABLE = 1146
+
+# hl_transactions.quantity is DECIMAL(18,6)
+QTY_DP = 6
+
+# Dates valued per block, bounding the (dates × accounts × tickers) temporaries
+DATE_BLOCK = 256
+
+CASH_IN  = ("Deposit", "Interest", "Sell", "Dividend", "Loyalty Payment")
+CASH_OUT = ("Buy", "Withdrawal", "Fee")
+
+
+def _tuples(cur) -> List[tuple]:
+    """fetchall() as tuples in column order, for tuple or dictionary cursors."""
+    return [tuple(r.values()) if isinstance(r, dict) else tuple(r) for r in cur.fetchall()]
+
+
+class SnapshotEngine:
+    """
+    Positions, cash and prices for every account, indexed for as-of lookups.
+    Build with load(cur) or directly from row lists (see load() for shapes).
+    """
+
+    def __init__(self, transactions: Sequence[tuple], prices: Sequence[tuple],
+                 accounts: Sequence[Tuple[str, str]] = ACCOUNTS):
+        self.accounts = list(accounts)
+        a_idx = {key: i for i, key in enumerate(self.accounts)}
+
+        # Ticker columns: everything ever bought or sold (None → "" so it sorts)
+        self.tickers = sorted({(r[2] or "") for r in transactions if r[4] in ("Buy", "Sell")})
+        t_idx = {ticker: j for j, ticker in enumerate(self.tickers)}
+
+        # ── Positions and cash at each transaction date ──────────────────────
+        txns = [r for r in transactions if (r[0], r[1]) in a_idx]
+        self.event_dates, e = np.unique(as_days(r[3] for r in txns), return_inverse=True)
+        acct  = np.fromiter((a_idx[(r[0], r[1])] for r in txns), dtype=np.intp, count=len(txns))
+        kind  = np.array([r[4] for r in txns], dtype=object)
+        qty   = np.array([np.nan if r[5] is None else float(r[5]) for r in txns])
+        value = np.array([np.nan if r[6] is None else float(r[6]) for r in txns])
+
+        trades = np.isin(kind, ("Buy", "Sell")) & ~np.isnan(qty)
+        col    = np.fromiter((t_idx.get(r[2] or "", 0) for r in txns), dtype=np.intp, count=len(txns))
+        qty_delta = np.zeros((len(self.event_dates), len(self.accounts), len(self.tickers)))
+        np.add.at(qty_delta, (e[trades], acct[trades], col[trades]),
+                  np.where(kind[trades] == "Buy", qty[trades], -qty[trades]))
+
+        signed = np.where(np.isin(kind, CASH_IN), value,
+                          np.where(np.isin(kind, CASH_OUT), -np.abs(value), 0.0))
+        signed = np.nan_to_num(signed)          # SUM() ignores NULL value_gbp
+        cash_delta = np.zeros((len(self.event_dates), len(self.accounts)))
+        np.add.at(cash_delta, (e, acct), signed)
+
+        # Rounded to the column's 6dp so a fully sold line nets to exactly 0, as SUM() does
+        self.qty  = np.round(np.cumsum(qty_delta, axis=0), QTY_DP)
+        self.cash = np.cumsum(cash_delta, axis=0)
+
+        # ── Forward-filled price matrix ──────────────────────────────────────
+        rows = [r for r in prices if r[0] in t_idx and r[2] is not None]
+        self.price_dates, p = np.unique(as_days(r[1] for r in rows), return_inverse=True)
+        matrix = np.full((len(self.price_dates), len(self.tickers)), np.nan)
+        matrix[p, np.fromiter((t_idx[r[0]] for r in rows), dtype=np.intp, count=len(rows))] = \
+            [float(r[2]) for r in rows]
+        self.prices = self._forward_fill(matrix)
+
+    @staticmethod
+    def _forward_fill(matrix: np.ndarray) -> np.ndarray:
+        """Replace each NaN with the last non-NaN value above it in its column."""
+        if matrix.size == 0:
+            return matrix
+        rows = np.where(~np.isnan(matrix), np.arange(len(matrix))[:, None], 0)
+        np.maximum.accumulate(rows, axis=0, out=rows)
+        return matrix[rows, np.arange(matrix.shape[1])]
+
+    @classmethod
+    def load(cls, cur, accounts: Sequence[Tuple[str, str]] = ACCOUNTS,
+             until: Optional[dt.date] = None) -> "SnapshotEngine":
+        """Read the transactions and prices (optionally only up to `until`) in two queries."""
+        bound, params = ("AND trade_date <= %s", [until]) if until else ("", [])
+        cur.execute(f"""
+            SELECT client_name, account_type, ticker, trade_date, type, quantity, value_gbp
+            FROM hl_transactions
+            WHERE 1 = 1 {bound}
+        """, params)
+        transactions = _tuples(cur)
+        cur.execute(f"""
+            SELECT ticker, trade_date, price, currency
+            FROM hl_prices_historical
+            WHERE ticker IN (SELECT DISTINCT ticker FROM hl_transactions WHERE type IN ('Buy', 'Sell'))
+            {bound}
+        """, params)
+        return cls(transactions, _tuples(cur), accounts)
+
+    def first_date(self) -> Optional[dt.date]:
+        return self.event_dates[0].item() if len(self.event_dates) else None
+
+    def values(self, dates: Iterable) -> Dict[str, np.ndarray]:
+        """
+        {"dates", "holdings", "cash", "total"} for each date; the value arrays
+        are (date × account), aligned to self.accounts.
+        """
+        days = as_days(dates)
+        shape = (len(days), len(self.accounts))
+        holdings = np.zeros(shape)
+        cash     = np.zeros(shape)
+        e = np.searchsorted(self.event_dates, days, side="right") - 1
+        p = np.searchsorted(self.price_dates, days, side="right") - 1
+        if not len(self.event_dates):
+            return {"dates": days, "holdings": holdings, "cash": cash, "total": holdings + cash}
+
+        for start in range(0, len(days), DATE_BLOCK):
+            block = slice(start, start + DATE_BLOCK)
+            eb, pb = e[block], p[block]
+            has_pos = eb >= 0
+            qty = np.where(has_pos[:, None, None], self.qty[np.maximum(eb, 0)], 0.0)
+            if len(self.price_dates):
+                price = np.where((pb >= 0)[:, None], self.prices[np.maximum(pb, 0)], np.nan)
+            else:
+                price = np.full((len(eb), len(self.tickers)), np.nan)
+            held   = qty > 0
+            priced = held & ~np.isnan(price)[:, None, :]
+            holdings[block] = np.where(priced, qty * np.nan_to_num(price)[:, None, :], 0.0).sum(axis=-1)
+            # No open holdings → the PHP function returns before adding cash
+            cash[block] = np.where(has_pos[:, None] & held.any(axis=-1),
+                                   self.cash[np.maximum(eb, 0)], 0.0)
+
+        return {"dates": days, "holdings": holdings, "cash": cash, "total": holdings + cash}
+
+    def state(self, day: dt.date) -> "SnapshotState":
+        """Open positions and cash for every account after all transactions up to `day`."""
+        e = int(np.searchsorted(self.event_dates, as_days([day])[0], side="right")) - 1
+        accounts = {}
+        for i, key in enumerate(self.accounts):
+            if e < 0:
+                accounts[key] = ({}, 0.0)
+                continue
+            qty = self.qty[e, i]
+            accounts[key] = ({self.tickers[j]: float(qty[j]) for j in np.flatnonzero(qty)},
+                             float(self.cash[e, i]))
+        return SnapshotState(day, accounts)
+
+    def rows(self, dates: Iterable) -> List[tuple]:
+        """hl_account_values_historical rows for every account on every date."""
+        v = self.values(dates)
+        holdings, cash, total = (np.round(v[k], 2) for k in ("holdings", "cash", "total"))
+        return [(client, account, day, float(holdings[d, i]), float(cash[d, i]), float(total[d, i]))
+                for d, day in enumerate(v["dates"].tolist())
+                for i, (client, account) in enumerate(self.accounts)]
+
+
+def date_range(first: dt.date, last: dt.date) -> List[dt.date]:
+    return [first + dt.timedelta(days=n) for n in range((last - first).days + 1)]
+
+
+def existing_keys(cur, first: dt.date, last: dt.date) -> set:
+    cur.execute(f"""
+        SELECT client_name, account_type, trade_date
+        FROM {TABLE}
+        WHERE trade_date BETWEEN %s AND %s
+    """, (first, last))
+    return {(c, a, d) for c, a, d in _tuples(cur)}
+
+
+def write_snapshots(conn, rows: List[tuple], replace: bool = False,
+                    state: Optional["SnapshotState"] = None) -> Tuple[int, int, bool]:
+    """
+    Store snapshot rows, and the state they were computed from if given, in
+    one transaction. Rows that already exist are skipped, or overwritten with
+    `replace`. The state is kept only if it is no older than the saved one
+    (see save_state). Returns (written, skipped, state saved).
+    """
+    if not rows:
+        return 0, 0, False
+    first = min(r[2] for r in rows)
+    last  = max(r[2] for r in rows)
+    with price_sink.transaction(conn) as cur:
+        if replace:
+            accounts = sorted({(r[0], r[1]) for r in rows})
+            cur.execute(f"""
+                DELETE FROM {TABLE}
+                WHERE trade_date BETWEEN %s AND %s
+                  AND ({' OR '.join(['(client_name = %s AND account_type = %s)'] * len(accounts))})
+            """, [first, last] + [v for key in accounts for v in key])
+            todo = rows
+        else:
+            have = existing_keys(cur, first, last)
+            todo = [r for r in rows if (r[0], r[1], r[2]) not in have]
+        price_sink.upsert_rows(cur, TABLE, COLUMNS, COLUMNS[3:], todo)
+        saved = state is not None and save_state(cur, state)
+    return len(todo), len(rows) - len(todo), saved
+
+
+# ── Incremental snapshots ────────────────────────────────────────────────────
+
+class SnapshotState:
+    """
+    Open positions ({ticker: quantity}) and cash per account after every
+    transaction dated on or before `as_of`. `last_txn_id` and `txn_count` are
+    hl_transactions' MAX(id) and COUNT(*) when the state was taken, so a later
+    run can tell whether rows were since added on or before as_of, or deleted.
+    """
+
+    def __init__(self, as_of: dt.date, accounts: Dict[Tuple[str, str], Tuple[Dict[str, float], float]],
+                 last_txn_id: int = 0, txn_count: int = 0):
+        self.as_of       = as_of
+        self.accounts    = accounts
+        self.last_txn_id = last_txn_id
+        self.txn_count   = txn_count
+
+    def opening_rows(self) -> List[tuple]:
+        """The state as transaction rows dated as_of: a Buy per position and a Deposit for the cash."""
+        rows = []
+        for (client, account), (positions, cash) in self.accounts.items():
+            rows += [(client, account, ticker, self.as_of, "Buy", qty, None) for ticker, qty in positions.items()]
+            rows.append((client, account, None, self.as_of, "Deposit", None, cash))
+        return rows
+
+
+def ensure_state_table(cur):
+    cur.execute(STATE_SCHEMA)
+
+
+def transaction_marker(cur) -> Tuple[int, int]:
+    """(MAX(id), COUNT(*)) of hl_transactions."""
+    cur.execute("SELECT COALESCE(MAX(id), 0), COUNT(*) FROM hl_transactions")
+    last_id, count = _tuples(cur)[0]
+    return int(last_id), int(count)
+
+
+def load_state(cur, accounts: Sequence[Tuple[str, str]] = ACCOUNTS) -> Optional[SnapshotState]:
+    """
+    The saved state, or None if there is none yet (no table or an account
+    missing) or the rows were saved by different runs.
+    """
+    try:
+        cur.execute(f"SELECT {', '.join(STATE_COLUMNS)} FROM {STATE_TABLE}")
+    except Exception as e:
+        if getattr(e, "errno", None) != ER_NO_SUCH_TABLE:
+            raise
+        return None
+    saved = {(r[0], r[1]): r for r in _tuples(cur)}
+    if any(key not in saved for key in accounts):
+        return None
+    markers = {saved[key][2:5] for key in accounts}
+    if len(markers) != 1:
+        return None
+    as_of, last_id, count = markers.pop()
+    return SnapshotState(as_of, {key: (json.loads(saved[key][6]), float(saved[key][5])) for key in accounts},
+                         int(last_id), int(count))
+
+
+def save_state(cur, state: SnapshotState) -> bool:
+    """
+    Store `state` unless the saved one is for a later date, so backfilling a
+    past date doesn't rewind the nightly run. Returns whether it was stored.
+    """
+    cur.execute(f"SELECT MAX(as_of) FROM {STATE_TABLE}")
+    saved_as_of = _tuples(cur)[0][0]
+    if saved_as_of is not None and saved_as_of > state.as_of:
+        return False
+    rows = [(client, account, state.as_of, state.last_txn_id, state.txn_count, round(cash, 2),
+             json.dumps(positions, sort_keys=True))
+            for (client, account), (positions, cash) in state.accounts.items()]
+    price_sink.upsert_rows(cur, STATE_TABLE, STATE_COLUMNS, STATE_COLUMNS[2:], rows)
+    return True
+
+
+def recent_prices(cur, tickers: Sequence[str], first: dt.date, last: dt.date) -> List[tuple]:
+    """
+    The last hl_prices_historical row on or before `first` for each ticker,
+    plus every row after it up to `last`, in load()'s shape.
+    """
+    if not tickers:
+        return []
+    cur.execute(f"""
+        SELECT p.ticker, p.trade_date, p.price, p.currency
+        FROM hl_prices_historical p
+        JOIN (
+            SELECT ticker, MAX(trade_date) AS trade_date
+            FROM hl_prices_historical
+            WHERE ticker IN ({', '.join(['%s'] * len(tickers))}) AND trade_date <= %s
+            GROUP BY ticker
+        ) latest ON latest.ticker = p.ticker AND latest.trade_date = p.trade_date
+    """, list(tickers) + [first])
+    rows = _tuples(cur)
+    if last > first:
+        cur.execute(f"""
+            SELECT ticker, trade_date, price, currency
+            FROM hl_prices_historical
+            WHERE ticker IN ({', '.join(['%s'] * len(tickers))}) AND trade_date > %s AND trade_date <= %s
+        """, list(tickers) + [first, last])
+        rows += _tuples(cur)
+    return rows
+
+
+def full_snapshot(cur, day: dt.date,
+                  accounts: Sequence[Tuple[str, str]] = ACCOUNTS) -> Tuple[SnapshotEngine, SnapshotState]:
+    """Engine and state for `day` built from the whole history."""
+    # Marker first: anything inserted while loading has a later id and is checked next run
+    last_id, count = transaction_marker(cur)
+    engine = SnapshotEngine.load(cur, accounts, until=day)
+    state = engine.state(day)
+    state.last_txn_id, state.txn_count = last_id, count
+    return engine, state
+
+
+def incremental_snapshot(cur, day: dt.date, accounts: Sequence[Tuple[str, str]] = ACCOUNTS
+                         ) -> Tuple[Optional[SnapshotEngine], Optional[SnapshotState], str]:
+    """
+    Engine and state for `day` built from the saved state plus the
+    transactions dated after it, and the prices of each ticker that could be
+    held from the day after the state to `day`; the engine values every date
+    from the state's as_of on. Returns (None, None, reason) when the saved
+    state can't be trusted - missing, after `day`, or hl_transactions has gained rows dated
+    on or before it, or lost rows - and the caller should use full_snapshot().
+    Rows edited in place are not detected; --verify catches those.
+    """
+    state = load_state(cur, accounts)
+    if state is None:
+        return None, None, "no saved state"
+    if state.as_of > day:
+        return None, None, f"saved state is for {state.as_of}, after {day}"
+
+    last_id, count = transaction_marker(cur)
+    cur.execute("SELECT id, trade_date FROM hl_transactions WHERE id > %s AND id <= %s",
+                (state.last_txn_id, last_id))
+    added = _tuples(cur)
+    backdated = sum(1 for _, trade_date in added if trade_date <= state.as_of)
+    if backdated:
+        return None, None, f"{backdated} transaction(s) added on or before {state.as_of}"
+    if count != state.txn_count + len(added):
+        return None, None, f"transactions deleted since {state.as_of}"
+
+    cur.execute("""
+        SELECT client_name, account_type, ticker, trade_date, type, quantity, value_gbp
+        FROM hl_transactions
+        WHERE trade_date > %s AND trade_date <= %s
+    """, (state.as_of, day))
+    transactions = _tuples(cur)
+
+    tickers = {ticker for positions, _ in state.accounts.values() for ticker, qty in positions.items() if qty > 0}
+    tickers |= {r[2] for r in transactions if r[4] == "Buy" and r[2]}
+    prices = recent_prices(cur, sorted(tickers), min(state.as_of + dt.timedelta(days=1), day), day)
+    engine = SnapshotEngine(state.opening_rows() + transactions, prices, accounts)
+    new_state = engine.state(day)
+    new_state.last_txn_id, new_state.txn_count = last_id, count
+    return engine, new_state, f"{len(transactions)} transaction(s) applied to the state as of {state.as_of}"
+
+
+def compare(rows: List[tuple], expected: List[tuple], state: SnapshotState, expected_state: SnapshotState) -> List[str]:
+    """Differences between an incremental result and a full rebuild, one line each."""
+    diffs = []
+    by_key = {r[:3]: r for r in expected}
+    for row in rows:
+        want = by_key.get(row[:3])
+        for name, got, exp in zip(COLUMNS[3:], row[3:], want[3:] if want else (None,) * 3):
+            if exp is None or abs(got - exp) >= 0.005:
+                full = "missing" if exp is None else f"{exp:,.2f}"
+                diffs.append(f"{row[0]} {row[1]} {row[2]} {name}: incremental {got:,.2f}, full {full}")
+    for key, (positions, cash) in expected_state.accounts.items():
+        got_positions, got_cash = state.accounts.get(key, ({}, 0.0))
+        if abs(got_cash - cash) >= 0.005:
+            diffs.append(f"{key[0]} {key[1]} state cash: incremental {got_cash:,.2f}, full {cash:,.2f}")
+        for ticker in sorted(set(positions) | set(got_positions)):
+            got, exp = got_positions.get(ticker, 0.0), positions.get(ticker, 0.0)
+            if abs(got - exp) >= 10 ** -QTY_DP:
+                diffs.append(f"{key[0]} {key[1]} state {ticker or '(none)'}: incremental {got:g}, full {exp:g}")
+    return diffs
+
+
+def parse_date(value: str) -> dt.date:
+    try:
+        return dt.date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid date '{value}'. Use YYYY-MM-DD.")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compute account snapshots into hl_account_values_historical.")
+    parser.add_argument("date", nargs="?", type=parse_date, help="Single date (default today)")
+    parser.add_argument("--from", dest="date_from", type=parse_date, help="First date of a range")
+    parser.add_argument("--to", dest="date_to", type=parse_date, help="Last date of a range (default today)")
+    parser.add_argument("--replace", action="store_true", help="Overwrite existing rows")
+    parser.add_argument("--dry-run", action="store_true", help="Compute and print totals; write nothing")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Start from the saved state and apply only the newer transactions")
+    parser.add_argument("--verify", action="store_true",
+                        help="Compute incrementally and from scratch and report differences; write nothing")
+    args = parser.parse_args(argv)
+
+    today = dt.date.today()
+    if args.date_from:
+        first, last = args.date_from, args.date_to or today
+    else:
+        first = last = args.date or today
+    if first > last:
+        parser.error("--from is after --to")
+    if (args.incremental or args.verify) and first != last:
+        parser.error("--incremental and --verify take a single date")
+
+    # Imported here so the MCP server can use the engine without the fetch scripts' dependencies
+    import pipeline
+    lines: List[str] = []
+    started = dt.datetime.now()
+
+    def log(message: str):
+        print(message)
+        lines.append(message)
+
+    def log_rows(rows: List[tuple]):
+        for client, account, _, holdings, cash, total in rows:
+            log(f"  {client} {account}: Holdings £{holdings:,.2f}, Cash £{cash:,.2f}, Total £{total:,.2f}")
+
+    log("=== Account Snapshots ===")
+    log(f"Dates: {first} to {last}" if first != last else f"Target date: {first}")
+    log(f"Started at: {started.strftime('%Y-%m-%d %H:%M:%S')}")
+    log("")
+
+    status = 0
+    t0 = time.perf_counter()
+    conn = None
+    try:
+        conn = pipeline.db_conn()
+        cur = conn.cursor()
+
+        engine = None
+        if args.incremental or args.verify:
+            engine, state, note = incremental_snapshot(cur, last)
+            log(f"Mode: incremental ({note})" if engine else f"Mode: full rebuild ({note})")
+            if engine and not args.verify:
+                # Every date since the saved state, in case earlier nightly runs were missed
+                first = min(engine.first_date() + dt.timedelta(days=1), last)
+                if first < last:
+                    log(f"Catching up from {first}")
+            if args.verify:
+                if engine is None:
+                    raise RuntimeError(f"nothing to verify: {note}")
+                rows = engine.rows([last])
+                full_engine, full_state = full_snapshot(cur, last)
+                diffs = compare(rows, full_engine.rows([last]), state, full_state)
+                log_rows(rows)
+                for diff in diffs:
+                    log(f"  [DIFF] {diff}")
+                log(f"Verify: {len(diffs)} difference(s) from a full rebuild")
+                status = 1 if diffs else 0
+        if engine is None:
+            engine, state = full_snapshot(cur, last)
+        if not (args.verify or args.dry_run):
+            ensure_state_table(cur)     # DDL, so outside write_snapshots()' transaction
+        cur.close()
+
+        if not args.verify:
+            t_load = time.perf_counter() - t0
+            log(f"Loaded {len(engine.event_dates)} transaction dates, {len(engine.tickers)} tickers, "
+                f"{len(engine.price_dates)} price dates in {t_load:.2f}s")
+
+            rows = engine.rows(date_range(first, last))
+            t_value = time.perf_counter() - t0 - t_load
+            log(f"Valued {len(rows)} account-days in {t_value:.2f}s")
+
+            if first == last:
+                log_rows(rows)
+
+            if args.dry_run:
+                log("Dry run: nothing written")
+            else:
+                written, skipped, saved = write_snapshots(conn, rows, args.replace, state)
+                log(f"Written: {written}")
+                log(f"Skipped (already present): {skipped}")
+                log(f"State saved as of {state.as_of}" if saved else "State kept: the saved one is for a later date")
+    except Exception as e:
+        log(f"[ERROR] {e}")
+        status = 1
+    finally:
+        if conn is not None:
+            conn.close()
+
+    log("")
+    log(f"Total time: {time.perf_counter() - t0:.2f} seconds")
+    log(f"Completed at: {dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    runlog.append_run(LOG_FILE, runlog.run_record("snapshots", started, status, lines))
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+"""
+MCP Tool Benchmark
+Generates a deterministic synthetic portfolio, loads it into a local
+MySQL/MariaDB benchmark database, then calls every mcp_server.py tool directly
+and records latency percentiles, SQL statements per call and peak Python memory.
+
+The benchmark refuses to touch a database whose name does not contain "bench",
+so it can't overwrite real data. Create an empty one first:
+
+    mysql -e "CREATE DATABASE investments_bench"
+
+Usage:
+    python3 benchmark_mcp.py generate [--years 10] [--tickers 500] [--households 20] [--seed 42] [--end YYYY-MM-DD]
+    python3 benchmark_mcp.py run [--iterations 20] [--cold] [--out results.json]
+    python3 benchmark_mcp.py compare baseline.json candidate.json [--threshold 10]
+
+Config (environment):
+    DB_HOST / DB_USER / DB_PASS   as for the other scripts
+    BENCH_DB_NAME                 benchmark database (default investments_bench)
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import resource
+import subprocess
+import tracemalloc
+import datetime as dt
+
+import numpy as np
+import mysql.connector
+
+import account_snapshots
+
+# --- Config: read from environment variables (set via .env or cron environment)
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_USER = os.getenv("DB_USER", "root")
+DB_PASS = os.getenv("DB_PASS")
+BENCH_DB_NAME = os.getenv("BENCH_DB_NAME", "investments_bench")
+if DB_PASS is None:
+    raise RuntimeError(
+        "DB_PASS environment variable must be set. "
+        "See .env.example. For cron: export DB_PASS=yourpassword before running."
+    )
+if "bench" not in BENCH_DB_NAME:
+    raise RuntimeError(f"Refusing to benchmark against '{BENCH_DB_NAME}': name must contain 'bench'.")
+
+ACCOUNT_TYPES = ("SIPP", "ISA", "Fund & Share")
+ALLOCATIONS   = ("Global Equity", "UK Equity", "US Equity", "Emerging Markets",
+                 "Bonds", "Property", "Cash", None)
+INSERT_BATCH  = 5000
+
+# Columns the tools and fetch scripts read; mirrors the production tables.
+SCHEMA = [
+    """
+    CREATE TABLE hl_transactions (
+        id              INT AUTO_INCREMENT PRIMARY KEY,
+        client_name     VARCHAR(50)  NOT NULL,
+        account_type    VARCHAR(50)  NOT NULL,
+        trade_date      DATE         NOT NULL,
+        type            VARCHAR(50)  NOT NULL,
+        ticker          VARCHAR(20),
+        description     VARCHAR(255),
+        quantity        DECIMAL(18,6),
+        price_per_share DECIMAL(18,6),
+        value_gbp       DECIMAL(18,2),
+        KEY idx_hl_transactions_date_id (trade_date, id),
+        KEY idx_hl_transactions_account_date_id (client_name, account_type, trade_date, id)
+    ) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE hl_ticker_symbols (
+        ticker            VARCHAR(20) PRIMARY KEY,
+        yahoo_symbol      VARCHAR(30) NOT NULL,
+        currency          VARCHAR(3)  NOT NULL,
+        target_allocation VARCHAR(50),
+        is_active         TINYINT(1)  NOT NULL DEFAULT 1
+    ) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE hl_prices_latest (
+        ticker       VARCHAR(20) PRIMARY KEY,
+        yahoo_symbol VARCHAR(30),
+        price        DECIMAL(18,6) NOT NULL,
+        currency     VARCHAR(3),
+        asof_utc     DATETIME,
+        source       VARCHAR(30)
+    ) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE hl_prices_historical (
+        id           INT AUTO_INCREMENT PRIMARY KEY,
+        ticker       VARCHAR(20) NOT NULL,
+        yahoo_symbol VARCHAR(30),
+        price        DECIMAL(18,6) NOT NULL,
+        currency     VARCHAR(3),
+        trade_date   DATE NOT NULL,
+        UNIQUE KEY uq_ticker_date (ticker, trade_date)
+    ) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE hl_account_values_historical (
+        id                 INT AUTO_INCREMENT PRIMARY KEY,
+        client_name        VARCHAR(50) NOT NULL,
+        account_type       VARCHAR(50) NOT NULL,
+        trade_date         DATE NOT NULL,
+        holdings_value_gbp DECIMAL(18,2),
+        cash_value_gbp     DECIMAL(18,2),
+        total_value_gbp    DECIMAL(18,2),
+        UNIQUE KEY uq_account_date (client_name, account_type, trade_date),
+        KEY idx_trade_date (trade_date)
+    ) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE hl_yield_latest (
+        ticker         VARCHAR(20) PRIMARY KEY,
+        yahoo_symbol   VARCHAR(30),
+        dividend_yield DECIMAL(8,4),
+        dividend_rate  DECIMAL(18,6),
+        currency       VARCHAR(3),
+        asof_utc       DATETIME,
+        source         VARCHAR(30),
+        updated_at     TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    ) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE hl_fx_rates (
+        id           INT AUTO_INCREMENT PRIMARY KEY,
+        currency     VARCHAR(3)    NOT NULL,
+        yahoo_symbol VARCHAR(30)   NOT NULL,
+        rate         DECIMAL(18,8) NOT NULL,
+        trade_date   DATE          NOT NULL,
+        updated_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        UNIQUE KEY uq_currency_date (currency, trade_date)
+    ) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+]
+TABLES = ("hl_transactions", "hl_ticker_symbols", "hl_prices_latest",
+          "hl_prices_historical", "hl_account_values_historical", "hl_yield_latest", "hl_fx_rates")
+
+
+def db_conn():
+    return mysql.connector.connect(
+        host=DB_HOST, user=DB_USER, password=DB_PASS, database=BENCH_DB_NAME, autocommit=True
+    )
+
+
+# ── Synthetic data ────────────────────────────────────────────────────────────
+
+def generate(years: int, n_tickers: int, households: int, seed: int, end: dt.date) -> dict:
+    """
+    Build every table's rows from the arguments alone, so the same seed and
+    end date always produce identical data. Returns {table: (columns, rows)}.
+    """
+    rng    = np.random.default_rng(seed)
+    pyrng  = random.Random(seed)
+    start  = end - dt.timedelta(days=365 * years)
+    days   = np.arange(np.datetime64(start), np.datetime64(end) + 1, dtype="datetime64[D]")
+    days   = days[np.is_busday(days)]
+    n_days = len(days)
+
+    # Tickers: mostly pence-quoted UK listings, some GBP funds, a few USD
+    tickers    = [f"TK{j:04d}" for j in range(n_tickers)]
+    currencies = rng.choice(np.array(["GBp", "GBP", "USD"], dtype=object), size=n_tickers, p=[0.6, 0.3, 0.1])
+    start_px   = np.where(currencies == "GBp", rng.uniform(100, 5000, n_tickers),
+                          np.where(currencies == "USD", rng.uniform(10, 500, n_tickers),
+                                   rng.uniform(1, 50, n_tickers)))
+    yields     = np.where(rng.random(n_tickers) < 0.7, rng.uniform(0.5, 6.0, n_tickers), 0.0)
+
+    # Geometric random walk: (days × tickers)
+    drift  = rng.normal(0.0002, 0.0001, n_tickers)
+    shocks = rng.normal(0.0, 0.012, (n_days, n_tickers))
+    prices = start_px * np.exp(np.cumsum(shocks + drift, axis=0))
+
+    # GBPUSD: USD per £1, a gentler random walk around 1.30
+    usd_rate = np.round(1.30 * np.exp(np.cumsum(rng.normal(0.0, 0.004, n_days))), 8)
+    # GBP per unit, for sizing trades and dividends
+    divisors = np.where(currencies == "GBp", 100.0,
+                        np.where(currencies == "USD", usd_rate[:, None], 1.0))
+    unit     = prices / divisors
+
+    symbols = [
+        (t, f"{t}.L" if c != "USD" else t, c, ALLOCATIONS[pyrng.randrange(len(ALLOCATIONS))], 1)
+        for t, c in zip(tickers, currencies)
+    ]
+    latest_asof = dt.datetime.combine(end, dt.time(16, 30))
+    latest = [
+        (t, sym, round(float(prices[-1, j]), 6), c, latest_asof, "bench")
+        for j, (t, sym, c, _, _) in enumerate(symbols)
+    ]
+    historical = [
+        (t, symbols[j][1], round(float(prices[i, j]), 6), symbols[j][2], days[i].item())
+        for j, t in enumerate(tickers)
+        for i in range(n_days)
+    ]
+    fx_rows = [("USD", "GBPUSD=X", float(usd_rate[i]), days[i].item()) for i in range(n_days)]
+    # hl_prices_historical rows per ticker, in SnapshotEngine's (ticker, trade_date, price, currency) shape
+    price_rows: dict[str, list] = {}
+    for t, _, price, currency, trade_date in historical:
+        price_rows.setdefault(t, []).append((t, trade_date, price, currency))
+    yield_rows = [
+        (t, symbols[j][1], round(float(yields[j]), 4),
+         round(float(unit[-1, j] * yields[j] / 100), 6), symbols[j][2], latest_asof, "bench")
+        for j, t in enumerate(tickers) if yields[j] > 0
+    ]
+
+    # Households: the first two use the real client names so filters work
+    clients = ["David", "Jen"] + [f"Client{h:02d}" for h in range(3, households + 1)]
+    clients = clients[:households]
+
+    transactions, values = [], []
+    for client in clients:
+        for account in ACCOUNT_TYPES:
+            universe = sorted(pyrng.sample(range(n_tickers), min(30, n_tickers)))
+            activity = []
+            holdings: dict[int, float] = {}
+            opened = pyrng.randrange(0, max(1, n_days // 10))
+
+            for i in range(opened, n_days, 21):          # roughly monthly
+                trade_date = days[i].item()
+                deposit = round(pyrng.uniform(200, 2000), 2)
+                activity.append((client, account, trade_date, "Deposit", None, "Subscription", None, None, deposit))
+
+                for j in pyrng.sample(universe, pyrng.randint(1, 3)):
+                    amount = round(deposit * pyrng.uniform(0.2, 0.45), 2)
+                    qty    = round(float(amount / unit[i, j]), 6)
+                    activity.append((client, account, trade_date, "Buy", tickers[j], f"Fund {tickers[j]}",
+                                     qty, round(float(prices[i, j]), 6), amount))
+                    holdings[j] = holdings.get(j, 0.0) + qty
+
+                if holdings and pyrng.random() < 0.1:
+                    j   = pyrng.choice(sorted(holdings))
+                    qty = round(holdings[j] * pyrng.uniform(0.1, 0.6), 6)
+                    amount = round(float(qty * unit[i, j]), 2)
+                    activity.append((client, account, trade_date, "Sell", tickers[j], f"Fund {tickers[j]}",
+                                     qty, round(float(prices[i, j]), 6), amount))
+                    holdings[j] -= qty
+
+                fee = round(pyrng.uniform(1, 5), 2)
+                activity.append((client, account, trade_date, "Fee", None, "Platform fee", None, None, fee))
+
+                if (i - opened) % 63 == 0:                # quarterly dividends
+                    for j, qty in sorted(holdings.items()):
+                        if qty > 0 and yields[j] > 0:
+                            amount = round(float(qty * unit[i, j] * yields[j] / 400), 2)
+                            activity.append((client, account, trade_date, "Dividend", tickers[j],
+                                             f"Fund {tickers[j]}", None, None, amount))
+
+                if pyrng.random() < 0.02:
+                    amount = round(pyrng.uniform(100, 1000), 2)
+                    activity.append((client, account, trade_date, "Withdrawal", None, "Withdrawal",
+                                     None, None, -amount))
+
+            # Daily snapshots valued by the engine the nightly job uses (quoted prices, unconverted)
+            engine = account_snapshots.SnapshotEngine(
+                [(c, a, ticker, d, kind, qty, value) for c, a, d, kind, ticker, _, qty, _, value in activity],
+                [row for j in universe for row in price_rows[tickers[j]]],
+                [(client, account)],
+            )
+            values += engine.rows(days[opened:].tolist())
+            transactions += activity
+
+    transactions.sort(key=lambda r: r[2])
+    return {
+        "hl_ticker_symbols":   (("ticker", "yahoo_symbol", "currency", "target_allocation", "is_active"), symbols),
+        "hl_prices_latest":    (("ticker", "yahoo_symbol", "price", "currency", "asof_utc", "source"), latest),
+        "hl_prices_historical": (("ticker", "yahoo_symbol", "price", "currency", "trade_date"), historical),
+        "hl_yield_latest":     (("ticker", "yahoo_symbol", "dividend_yield", "dividend_rate", "currency",
+                                 "asof_utc", "source"), yield_rows),
+        "hl_fx_rates":         (("currency", "yahoo_symbol", "rate", "trade_date"), fx_rows),
+        "hl_transactions":     (("client_name", "account_type", "trade_date", "type", "ticker", "description",
+                                 "quantity", "price_per_share", "value_gbp"), transactions),
+        "hl_account_values_historical": (("client_name", "account_type", "trade_date", "holdings_value_gbp",
+                                          "cash_value_gbp", "total_value_gbp"), values),
+    }
+
+
+def load(data: dict) -> dict:
+    """Recreate the benchmark schema and bulk-insert the generated rows."""
+    conn = db_conn()
+    cur  = conn.cursor()
+    for table in TABLES:
+        cur.execute(f"DROP TABLE IF EXISTS {table}")
+    for ddl in SCHEMA:
+        cur.execute(ddl)
+
+    counts = {}
+    conn.autocommit = False
+    for table, (columns, rows) in data.items():
+        sql = (f"INSERT INTO {table} ({', '.join(columns)}) "
+               f"VALUES ({', '.join(['%s'] * len(columns))})")
+        for k in range(0, len(rows), INSERT_BATCH):
+            cur.executemany(sql, rows[k:k + INSERT_BATCH])
+        conn.commit()
+        counts[table] = len(rows)
+        print(f"  [OK] {table}: {len(rows)} rows")
+    cur.close()
+    conn.close()
+    return counts
+
+
+# ── Runner ────────────────────────────────────────────────────────────────────
+
+def import_server():
+    """Import mcp_server pointed at the benchmark database."""
+    os.environ["DB_NAME"] = BENCH_DB_NAME
+    import mcp_server
+    return mcp_server
+
+
+def reset_caches(server) -> None:
+    """Drop every in-process cache so the next call pays the cold cost."""
+    server.SNAPSHOT  = server.PositionsSnapshot()
+    server.DIVIDENDS = server.DividendRollup()
+    server.PRICES    = server.PriceCache(server.PRICE_CACHE_CHECK, server.PRICE_CACHE_TTL)
+    server.VALUES    = server.price_index.ValueIndex(server.ASOF_INDEX_CHECK, server.ASOF_INDEX_TTL)
+    server.FX        = server.price_index.FxIndex(server.ASOF_INDEX_CHECK, server.ASOF_INDEX_TTL)
+    server.RETURNS   = server.ReturnsCache()
+
+
+def scenarios(server, end: dt.date) -> list[tuple[str, str, dict]]:
+    """
+    (label, tool, kwargs) for every tool; tools without a listed case run with
+    defaults. Explicit ranges end at the dataset's last date, `end`, so runs on
+    different days benchmark the same window.
+    """
+    five_years = {"date_from": (end - dt.timedelta(days=5 * 365)).isoformat(), "date_to": end.isoformat()}
+    cases = [
+        ("portfolio_summary",          "get_portfolio_summary",    {}),
+        ("portfolio_summary[David]",   "get_portfolio_summary",    {"client": "David"}),
+        ("daily_gain_loss",            "get_daily_gain_loss",      {}),
+        ("holdings",                   "get_holdings",             {}),
+        ("holdings[Jen ISA]",          "get_holdings",             {"client": "Jen", "account_type": "ISA"}),
+        ("account_performance",        "get_account_performance",  {}),
+        ("account_performance[5y]",    "get_account_performance",  five_years),
+        ("performance_series[month]",  "get_performance_series",   {"interval": "month"}),
+        ("performance_series[day,5y]", "get_performance_series",   {"interval": "day", **five_years}),
+        ("returns",                    "get_returns",              {}),
+        ("returns[rolling 12M]",       "get_returns",
+            {"periods": ["1Y"], "rolling": "12M", "date_to": end.isoformat()}),
+        ("transactions",               "get_transactions",         {}),
+        ("transactions[500]",          "get_transactions",         {"limit": 500}),
+        ("dividend_income",            "get_dividend_income",      {}),
+        ("dividend_income[year,all]",  "get_dividend_income",      {"group_by": "year", "date_from": "2000-01-01"}),
+        ("dividend_income[ticker]",    "get_dividend_income",      {"group_by": "ticker"}),
+        ("allocation_breakdown",       "get_allocation_breakdown", {}),
+    ]
+    covered = {tool for _, tool, _ in cases}
+    for tool in asyncio.run(server.mcp.list_tools()):
+        if tool.name not in covered:
+            cases.append((tool.name.removeprefix("get_"), tool.name, {}))
+    return cases
+
+
+def statement_count(cur) -> int:
+    """Server-wide statement counter; the benchmark DB is assumed otherwise idle."""
+    cur.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+    return int(cur.fetchone()[1])
+
+
+def run(iterations: int, cold: bool, end: dt.date) -> dict:
+    server  = import_server()
+    monitor = db_conn()
+    mcur    = monitor.cursor()
+    loop    = asyncio.new_event_loop()
+
+    results = {}
+    for label, tool, kwargs in scenarios(server, end):
+        fn = getattr(server, tool)
+        reset_caches(server)
+        latencies, queries = [], []
+        tracemalloc.start()
+        for k in range(iterations + 1):
+            if cold and k:
+                reset_caches(server)
+            before = statement_count(mcur)
+            t0     = time.perf_counter()
+            loop.run_until_complete(fn(**kwargs))
+            elapsed = (time.perf_counter() - t0) * 1000
+            # The second SHOW is itself counted once
+            queries.append(statement_count(mcur) - before - 1)
+            latencies.append(elapsed)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        warm = np.array(latencies[1:])
+        results[label] = {
+            "tool":             tool,
+            "args":             kwargs,
+            "iterations":       iterations,
+            "first_call_ms":    round(latencies[0], 3),
+            "p50_ms":           round(float(np.percentile(warm, 50)), 3),
+            "p95_ms":           round(float(np.percentile(warm, 95)), 3),
+            "p99_ms":           round(float(np.percentile(warm, 99)), 3),
+            "mean_ms":          round(float(warm.mean()), 3),
+            "first_call_queries": queries[0],
+            "queries_per_call": round(float(np.mean(queries[1:])), 2),
+            "peak_mem_kb":      round(peak / 1024, 1),
+        }
+        r = results[label]
+        print(f"  {label:<30} p50 {r['p50_ms']:>9.2f} ms  p95 {r['p95_ms']:>9.2f} ms  "
+              f"p99 {r['p99_ms']:>9.2f} ms  q/call {r['queries_per_call']:>5}  peak {r['peak_mem_kb']:>9.1f} KB")
+
+    loop.close()
+    mcur.execute("SELECT " + ", ".join(f"(SELECT COUNT(*) FROM {t})" for t in TABLES))
+    sizes = dict(zip(TABLES, mcur.fetchone()))
+    mcur.close()
+    monitor.close()
+    return {"sizes": sizes, "results": results}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(baseline_path: str, candidate_path: str, threshold: float) -> int:
+    """Print p50/p95 deltas per scenario; exit status 1 if any regress past `threshold` %."""
+    with open(baseline_path, encoding="utf-8") as f:
+        base = json.load(f)["results"]
+    with open(candidate_path, encoding="utf-8") as f:
+        cand = json.load(f)["results"]
+
+    regressions = 0
+    print(f"{'scenario':<30} {'p50 base':>10} {'p50 new':>10} {'Δ%':>7} {'p95 base':>10} {'p95 new':>10} {'Δ%':>7}")
+    for label in sorted(set(base) & set(cand)):
+        row = [label]
+        flagged = False
+        for metric in ("p50_ms", "p95_ms"):
+            b, c  = base[label][metric], cand[label][metric]
+            delta = (c - b) / b * 100 if b else 0.0
+            flagged |= delta > threshold
+            row += [f"{b:10.2f}", f"{c:10.2f}", f"{delta:+7.1f}"]
+        regressions += flagged
+        print(f"{row[0]:<30} " + " ".join(row[1:]) + ("  [REGRESSION]" if flagged else ""))
+    for label in sorted(set(base) ^ set(cand)):
+        print(f"{label:<30} only in {'baseline' if label in base else 'candidate'}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mcp_server.py tools against synthetic data.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    g = sub.add_parser("generate", help="Generate and load a synthetic portfolio")
+    g.add_argument("--years", type=int, default=10)
+    g.add_argument("--tickers", type=int, default=500)
+    g.add_argument("--households", type=int, default=20)
+    g.add_argument("--seed", type=int, default=42)
+    g.add_argument("--end", default=None, help="Last generated date (default yesterday); fix it to reproduce a dataset")
+
+    r = sub.add_parser("run", help="Call every tool and record latency/queries/memory")
+    r.add_argument("--iterations", type=int, default=20)
+    r.add_argument("--cold", action="store_true", help="Reset in-process caches before every call")
+    r.add_argument("--out", default=None, help="Write results JSON here")
+
+    c = sub.add_parser("compare", help="Compare two results files")
+    c.add_argument("baseline")
+    c.add_argument("candidate")
+    c.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        print(f"Generating {args.years}y × {args.tickers} tickers × {args.households} households (seed {args.seed})...")
+        end  = dt.date.fromisoformat(args.end) if args.end else dt.date.today() - dt.timedelta(days=1)
+        t0   = time.perf_counter()
+        data = generate(args.years, args.tickers, args.households, args.seed, end)
+        print(f"Loading into {BENCH_DB_NAME}...")
+        load(data)
+        meta = {"years": args.years, "tickers": args.tickers, "households": args.households,
+                "seed": args.seed, "end": end.isoformat()}
+        conn = db_conn()
+        cur  = conn.cursor()
+        cur.execute("CREATE TABLE IF NOT EXISTS bench_meta (k VARCHAR(50) PRIMARY KEY, v TEXT)")
+        cur.execute("REPLACE INTO bench_meta (k, v) VALUES ('dataset', %s)", (json.dumps(meta),))
+        cur.close()
+        conn.close()
+        print(f"Done in {time.perf_counter() - t0:.1f}s")
+        return 0
+
+    if args.command == "run":
+        conn = db_conn()
+        cur  = conn.cursor()
+        cur.execute("SELECT v FROM bench_meta WHERE k = 'dataset'")
+        row = cur.fetchone()
+        cur.close()
+        conn.close()
+
+        dataset = json.loads(row[0]) if row else None
+        # Without a bench_meta row, assume generate's default end (yesterday)
+        end = dt.date.fromisoformat(dataset["end"]) if dataset else dt.date.today() - dt.timedelta(days=1)
+
+        print(f"Benchmarking against {BENCH_DB_NAME} ({args.iterations} iterations{', cold' if args.cold else ''})")
+        report = run(args.iterations, args.cold, end)
+        report["meta"] = {
+            "dataset":    dataset,
+            "iterations": args.iterations,
+            "cold":       args.cold,
+            "git":        git_revision(),
+            "python":     platform.python_version(),
+            "host":       platform.node(),
+            "run_at":     dt.datetime.now().isoformat(timespec="seconds"),
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, default=str)
+            print(f"Results written to {args.out}")
+        return 0
+
+    return compare(args.baseline, args.candidate, args.threshold)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
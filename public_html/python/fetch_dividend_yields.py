@@ -2,100 +2,57 @@
 """
 Dividend Yield Fetcher
 Fetches the latest dividend yield information for all active ticker symbols.
-This script is designed to be run daily via cron.
+This script is designed to be run daily via cron. Yields change slowly, so
+symbols refreshed within YIELD_MAX_AGE_HOURS (default 168, one week) are skipped.
+Runs as the "yields" job of pipeline.py.
 
-Usage: python3 fetch_dividend_yields.py
+Usage: python3 fetch_dividend_yields.py [--force]
 Cron example: 0 19 * * 1-5 /path/to/python3 /path/to/fetch_dividend_yields.py >> /path/to/logs/dividend_yields.log 2>&1
 """
 
 import os
 import sys
-import time
 import datetime as dt
-from typing import List, Tuple, Optional, Dict, Any
+from typing import Tuple, Optional, Dict, Any
 
-import pytz
-import yfinance as yf
-import mysql.connector
+import pipeline
+import providers
+from pipeline import UTC
+from fetch_engine import TokenBucket
 
-# --- Config: read from environment variables (set via .env or cron environment)
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_NAME = os.getenv("DB_NAME", "investments")
-DB_USER = os.getenv("DB_USER", "root")
-DB_PASS = os.getenv("DB_PASS")
-if DB_PASS is None:
-    raise RuntimeError(
-        "DB_PASS environment variable must be set. "
-        "See .env.example. For cron: export DB_PASS=yourpassword before running."
-    )
+# Symbols whose stored yield is newer than this are skipped (unless --force)
+YIELD_MAX_AGE_HOURS = float(os.getenv("YIELD_MAX_AGE_HOURS", "168"))
 
-UTC = pytz.UTC
-
-def prepend_log_block(log_file: str, content: str):
-    """Prepend a complete log block to a log file with proper separation."""
-    try:
-        # Ensure logs directory exists
-        log_dir = os.path.dirname(log_file)
-        if log_dir and not os.path.exists(log_dir):
-            os.makedirs(log_dir, exist_ok=True)
-        
-        # Read existing content if file exists
-        existing_content = ""
-        if os.path.exists(log_file):
-            with open(log_file, 'r', encoding='utf-8') as f:
-                existing_content = f.read()
-        
-        # Write new content + blank lines + existing content
-        with open(log_file, 'w', encoding='utf-8') as f:
-            f.write(content)
-            if existing_content:
-                f.write("\n\n\n" + existing_content)  # Three blank lines for separation
-    except Exception as e:
-        print(f"[ERROR] Failed to write to log file {log_file}: {e}")
-
-# Global variable to collect log output
-log_output = []
-
-def log_and_print(message: str):
-    """Print message and collect it for logging."""
-    print(message)
-    log_output.append(message)
-
-def db_conn():
-    return mysql.connector.connect(
-        host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME, autocommit=True
-    )
-
-def fetch_active_symbols(cursor) -> List[Tuple[str, str, str]]:
-    """Get all active ticker symbols from the database."""
-    cursor.execute("""
-        SELECT ticker, yahoo_symbol, currency
-        FROM hl_ticker_symbols
-        WHERE is_active = 1
-        ORDER BY ticker
-    """)
-    return cursor.fetchall()
-
-def get_dividend_yield_info(symbol: str) -> Optional[Dict[str, Any]]:
+def get_dividend_yield_info(symbol: str, provider: Optional[providers.Provider] = None,
+                            limiter: Optional[TokenBucket] = None
+                            ) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
     """
-    Fetch dividend yield information for a symbol.
-    Returns dict with yield info or None if failed.
+    Fetch dividend yield information for a symbol, requesting info (the
+    slowest Yahoo endpoint) once. Each provider request, including the
+    dividend history fallback, takes a limiter token.
+    Returns (yield info dict or None, diagnostics). The diagnostics record what
+    Yahoo returned - whether info carried a yield, the raw value, whether there
+    is dividend history and any error - for logging when no yield is found.
     """
+    diagnostics: Dict[str, Any] = {'has_yield': None, 'raw_yield': None, 'has_dividends': None, 'error': None}
+    provider = provider or providers.get_provider()
     try:
-        ticker = yf.Ticker(symbol)
-        
         # Get basic info which includes dividend yield
-        info = ticker.info
+        if limiter is not None:
+            limiter.acquire()
+        info = provider.info(symbol)
         
         # Extract dividend yield (yfinance already returns as percentage)
         dividend_yield = info.get('dividendYield')
+        diagnostics['has_yield'] = dividend_yield is not None
+        diagnostics['raw_yield'] = dividend_yield
         if dividend_yield is not None:
             dividend_yield = float(dividend_yield)  # Already a percentage from yfinance
             
             # Sanity check: yield should be reasonable (0-50%)
             if dividend_yield > 50.0:
                 print(f"  [WARN] Unrealistic yield {dividend_yield:.2f}% - likely data error, skipping")
-                return None
+                return None, diagnostics
         
         # Extract dividend rate (annual dividend per share)
         dividend_rate = info.get('dividendRate')
@@ -111,8 +68,12 @@ def get_dividend_yield_info(symbol: str) -> Optional[Dict[str, Any]]:
         if dividend_yield is None:
             # Try getting dividend history to calculate yield
             try:
+                if limiter is not None:
+                    limiter.acquire()
+                history = provider.dividends(symbol)
+                diagnostics['has_dividends'] = not history.empty
                 # Get last 12 months of dividends
-                dividends = ticker.dividends.tail(4)  # Last 4 quarters
+                dividends = history.tail(4)  # Last 4 quarters
                 if not dividends.empty:
                     annual_dividend = dividends.sum()
                     current_price = info.get('currentPrice') or info.get('regularMarketPrice')
@@ -130,13 +91,19 @@ def get_dividend_yield_info(symbol: str) -> Optional[Dict[str, Any]]:
                 'dividend_yield': dividend_yield,
                 'dividend_rate': dividend_rate,
                 'currency': currency
-            }
+            }, diagnostics
         
-        return None
+        return None, diagnostics
         
     except Exception as e:
         print(f"[ERROR] Failed to fetch dividend info for {symbol}: {e}")
-        return None
+        diagnostics['error'] = str(e)
+        return None, diagnostics
+
+def fetch_yield_ages(cursor) -> Dict[str, dt.datetime]:
+    """asof_utc (naive UTC) of the stored yield for each ticker."""
+    cursor.execute("SELECT ticker, asof_utc FROM hl_yield_latest WHERE asof_utc IS NOT NULL")
+    return {ticker: asof for ticker, asof in cursor.fetchall()}
 
 def upsert_dividend_yield(cursor, ticker: str, yahoo_symbol: str, currency: str, 
                          dividend_yield: float, dividend_rate: Optional[float] = None) -> bool:
@@ -165,104 +132,91 @@ def upsert_dividend_yield(cursor, ticker: str, yahoo_symbol: str, currency: str,
         print(f"[ERROR] Failed to store dividend yield for {ticker}: {e}")
         return False
 
-def main():
-    """Main function to fetch and store dividend yields."""
-    global log_output
-    log_output = []  # Reset log output for this run
-    
-    log_and_print(f"Dividend Yield Fetcher - {dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    log_and_print("=" * 60)
-    
-    # Connect to database
-    try:
-        conn = db_conn()
-        cursor = conn.cursor()
-    except Exception as e:
-        log_and_print(f"[ERROR] Failed to connect to database: {e}")
-        return 1
-    
-    # Get active symbols
-    try:
-        symbols = fetch_active_symbols(cursor)
-        if not symbols:
-            log_and_print("No active symbols found; exiting.")
-            return 0
-    except Exception as e:
-        log_and_print(f"[ERROR] Failed to fetch symbols: {e}")
-        return 1
-    
-    log_and_print(f"Found {len(symbols)} active symbols")
-    log_and_print("")
-    
-    successful_count = 0
-    failed_count = 0
-    no_yield_count = 0
-    
-        # Process each symbol
-    for i, (ticker, yahoo_symbol, currency) in enumerate(symbols, 1):
-        log_and_print(f"[{i}/{len(symbols)}] Processing {ticker} ({yahoo_symbol})...")
-        
-        # Fetch dividend yield info
-        yield_info = get_dividend_yield_info(yahoo_symbol)
+class DividendYieldsJob(pipeline.Job):
+    """Refresh stale dividend yields; symbols refreshed recently are skipped."""
+
+    name = "yields"
+    title = "Dividend Yield Fetcher"
+    log_file = "../logs/yields_cron_daily.jsonl"
+
+    def prepare(self, ctx):
+        self.log(f"Found {len(ctx.symbols)} active symbols")
+        
+        self.successful_count = 0
+        self.failed_count = 0
+        self.no_yield_count = 0
+        
+        # Yields move slowly: only refetch symbols whose stored yield is older than the max age
+        try:
+            self.ages = {} if ctx.options.force else fetch_yield_ages(ctx.cursor)
+        except Exception as e:
+            self.log(f"[WARN] Could not read yield ages, refreshing all: {e}")
+            self.ages = {}
+        cutoff = dt.datetime.now(tz=UTC).replace(tzinfo=None) - dt.timedelta(hours=YIELD_MAX_AGE_HOURS)
+        self.fresh = {ticker for ticker, asof in self.ages.items() if asof >= cutoff}
+        stale = sum(1 for row in ctx.symbols if row[0] not in self.fresh)
+        self.log(f"Refreshing {stale} symbols with yields older than "
+                 f"{YIELD_MAX_AGE_HOURS:g}h{' (forced)' if ctx.options.force else ''}")
+        self.log("")
+
+    def fetch(self, ctx, row):
+        ticker, yahoo_symbol, _ = row
+        if ticker in self.fresh:
+            return pipeline.Skip(f"Fresh yield as of {self.ages[ticker]} UTC")
+        return get_dividend_yield_info(yahoo_symbol, ctx.provider, ctx.limiter)
+
+    def validate(self, ctx, row, result):
+        yield_info, diagnostics = result
         
         # Debug: show what data we got
         if yield_info is None:
-            try:
-                debug_ticker = yf.Ticker(yahoo_symbol)
-                debug_info = debug_ticker.info
-                has_yield = 'dividendYield' in debug_info and debug_info['dividendYield'] is not None
-                has_dividends = not debug_ticker.dividends.empty
-                log_and_print(f"  [DEBUG] Has yield in info: {has_yield}, Has dividend history: {has_dividends}")
-                if has_yield:
-                    raw_yield = debug_info.get('dividendYield', 'None')
-                    log_and_print(f"  [DEBUG] Raw yield value: {raw_yield}")
-            except Exception as debug_e:
-                log_and_print(f"  [DEBUG] Could not get debug info: {debug_e}")
-        
-        if yield_info is None:
-            log_and_print(f"  [NO YIELD] No dividend yield data available")
-            no_yield_count += 1
-            continue
-        
+            if diagnostics['error'] is not None:
+                self.log(f"  [DEBUG] Fetch failed: {diagnostics['error']}")
+            else:
+                has_dividends = diagnostics['has_dividends']
+                self.log(f"  [DEBUG] Has yield in info: {diagnostics['has_yield']}, Has dividend history: "
+                         f"{'not checked' if has_dividends is None else has_dividends}")
+                if diagnostics['has_yield']:
+                    self.log(f"  [DEBUG] Raw yield value: {diagnostics['raw_yield']}")
+            
+            self.log(f"  [NO YIELD] No dividend yield data available")
+            self.no_yield_count += 1
+            return None
+        return yield_info
+
+    def sink(self, ctx, row, yield_info):
+        ticker, yahoo_symbol, currency = row
         dividend_yield = yield_info['dividend_yield']
         dividend_rate = yield_info.get('dividend_rate')
         currency = yield_info.get('currency', currency)
         
         # Store in database
-        success = upsert_dividend_yield(cursor, ticker, yahoo_symbol, currency, 
+        success = upsert_dividend_yield(ctx.cursor, ticker, yahoo_symbol, currency, 
                                       dividend_yield, dividend_rate)
         
         if success:
             rate_str = f" (Rate: {dividend_rate:.4f})" if dividend_rate else ""
-            log_and_print(f"  [OK] Yield: {dividend_yield:.2f}%{rate_str} {currency}")
-            successful_count += 1
+            self.log(f"  [OK] Yield: {dividend_yield:.2f}%{rate_str} {currency}")
+            self.successful_count += 1
         else:
-            log_and_print(f"  [ERROR] Failed to store dividend yield data")
-            failed_count += 1
-        
-        # Small delay to be respectful to yfinance
-        if i < len(symbols):
-            time.sleep(1)
-    
-    # Summary
-    log_and_print("")
-    log_and_print("=" * 60)
-    log_and_print("SUMMARY")
-    log_and_print(f"Symbols processed: {successful_count + failed_count + no_yield_count}/{len(symbols)}")
-    log_and_print(f"Successful: {successful_count}")
-    log_and_print(f"No yield data: {no_yield_count}")
-    log_and_print(f"Failed: {failed_count}")
-    log_and_print(f"Completed at: {dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    
-    cursor.close()
-    conn.close()
-    
-    # Write all collected log output to file
-    if log_output:
-        log_content = "\n".join(log_output)
-        prepend_log_block("../logs/yields_cron_daily.log", log_content)
-    
-    return 0 if failed_count == 0 else 1
+            self.log(f"  [ERROR] Failed to store dividend yield data")
+            self.failed_count += 1
+
+    def summary(self, ctx):
+        self.log("")
+        self.log("=" * self.rule)
+        self.log("SUMMARY")
+        self.log(f"Symbols processed: {self.successful_count + self.failed_count + self.no_yield_count}"
+                 f"/{len(ctx.symbols)}")
+        self.log(f"Successful: {self.successful_count}")
+        self.log(f"Skipped (fresh): {self.skipped}")
+        self.log(f"No yield data: {self.no_yield_count}")
+        self.log(f"Failed: {self.failed_count}")
+        self.log(f"Completed at: {dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        return 0 if self.failed_count == 0 else 1
+
+def main():
+    return pipeline.main(["yields"] + sys.argv[1:])
 
 if __name__ == "__main__":
     sys.exit(main())
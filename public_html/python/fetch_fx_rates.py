@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+FX Rate Fetcher
+Fetches daily GBP cross rates into hl_fx_rates for every non-sterling currency
+in hl_ticker_symbols, so USD/EUR prices can be converted to GBP. A rate is the
+close of Yahoo's GBP<CCY>=X pair: units of the currency per £1, so
+GBP value = price / rate. GBP needs no rate and GBp (pence) is divided by 100.
+
+Rates go through the same path as historical prices: the on-disk history
+cache (history_cache.py), the pipeline's provider and rate limiter, and
+multi-row upserts in one transaction (price_sink.py). Only the missing tail is
+fetched: each currency starts the day after its latest stored rate, up to
+yesterday, and currencies with no rates yet get the full range from 2015-06-26.
+
+Runs as the "fx" job of pipeline.py.
+
+Usage: python3 fetch_fx_rates.py [--full] [--no-cache]
+Cron example: 30 7 * * * /path/to/python3 /path/to/fetch_fx_rates.py >> /path/to/logs/fx_rates.log 2>&1
+"""
+
+import sys
+import datetime as dt
+from typing import Dict, List, Tuple
+
+import pipeline
+import price_sink
+import valuation
+import history_cache
+from fetch_historical_prices import HISTORY_START, get_historical_prices
+
+FX_TABLE   = "hl_fx_rates"
+FX_COLUMNS = ("currency", "yahoo_symbol", "rate", "trade_date")
+FX_SCHEMA  = f"""
+    CREATE TABLE IF NOT EXISTS {FX_TABLE} (
+        id           INT AUTO_INCREMENT PRIMARY KEY,
+        currency     VARCHAR(3)    NOT NULL,
+        yahoo_symbol VARCHAR(30)   NOT NULL,
+        rate         DECIMAL(18,8) NOT NULL,
+        trade_date   DATE          NOT NULL,
+        updated_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        UNIQUE KEY uq_currency_date (currency, trade_date)
+    ) DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+def fx_symbol(currency: str) -> str:
+    """Yahoo symbol quoting `currency` per £1."""
+    return f"GBP{currency}=X"
+
+def fetch_currencies(cursor) -> List[str]:
+    """Non-sterling currencies of every ticker, active or not (older holdings still need converting)."""
+    cursor.execute("SELECT DISTINCT currency FROM hl_ticker_symbols")
+    return sorted({code for code in (valuation.fx_currency(currency) for currency, in cursor.fetchall()) if code})
+
+def fetch_last_dates(cursor) -> Dict[str, dt.date]:
+    """Latest stored trade_date per currency in hl_fx_rates."""
+    cursor.execute(f"SELECT currency, MAX(trade_date) FROM {FX_TABLE} GROUP BY currency")
+    return {currency: last for currency, last in cursor.fetchall()}
+
+def fx_rows(currency: str, hist_data, start_date: dt.date, end_date: dt.date) -> List[Tuple]:
+    """hl_fx_rates rows from a history DataFrame (closes within [start_date, end_date])."""
+    symbol = fx_symbol(currency)
+    return [(currency, symbol, rate, trade_date)
+            for _, _, rate, _, trade_date in price_sink.history_rows(currency, symbol, currency, hist_data,
+                                                                     start_date, end_date)
+            if rate > 0]
+
+class FxRatesJob(pipeline.Job):
+    """Backfill each currency's missing tail of GBP cross rates, stored in one transaction."""
+
+    name = "fx"
+    title = "FX Rate Fetcher"
+    rule = 50
+
+    def prepare(self, ctx):
+        self.end_date = dt.date.today() - dt.timedelta(days=1)  # Yesterday, as for historical prices
+        ctx.cursor.execute(FX_SCHEMA)
+        currencies = fetch_currencies(ctx.cursor)
+        self.pairs = [(currency, fx_symbol(currency), currency) for currency in currencies]
+        self.last_dates = {} if ctx.options.full else fetch_last_dates(ctx.cursor)
+        self.start_dates = {
+            currency: self.last_dates[currency] + dt.timedelta(days=1) if currency in self.last_dates else HISTORY_START
+            for currency in currencies
+        }
+        self.log(f"Mode: {'full' if ctx.options.full else 'incremental'}")
+        self.log(f"Currencies: {', '.join(currencies) if currencies else 'none besides GBP'}")
+
+        self.use_cache = history_cache.available() and not ctx.options.no_cache
+        self.log(f"History cache: {history_cache.HISTORY_CACHE_DIR if self.use_cache else 'off'}")
+        self.log("")
+
+        self.rate_rows = []
+        self.successful_count = 0
+        self.failed_count = 0
+
+    def rows(self, ctx):
+        return self.pairs
+
+    def fetch(self, ctx, row):
+        currency, symbol, _ = row
+        if self.start_dates[currency] > self.end_date:
+            return pipeline.Skip(f"Up to date (last rate {self.last_dates[currency]})")
+        hist = get_historical_prices(symbol, self.start_dates[currency], self.end_date,
+                                     ctx.limiter, self.use_cache, ctx.provider)
+        return (hist,)
+
+    def validate(self, ctx, row, result):
+        currency = row[0]
+        rows = fx_rows(currency, result[0], self.start_dates[currency], self.end_date)
+        if not rows:
+            # Weekends and holidays have no rate; a failed request looks the same
+            self.log(f"  [SKIP] No rates from {self.start_dates[currency]} to {self.end_date}")
+            return None
+        return rows
+
+    def sink(self, ctx, row, rows):
+        self.rate_rows += rows
+        self.log(f"  [OK] {len(rows)} rates, latest {rows[-1][2]:.4f} {row[0]} per GBP on {rows[-1][3]}")
+        self.successful_count += 1
+
+    def flush(self, ctx):
+        if not self.rate_rows:
+            return
+        try:
+            with price_sink.transaction(ctx.conn) as cursor:
+                price_sink.upsert_rows(cursor, FX_TABLE, FX_COLUMNS, ("yahoo_symbol", "rate"), self.rate_rows)
+        except Exception as e:
+            self.log("")
+            self.log(f"[ERROR] Failed to store {len(self.rate_rows)} rates: {e}")
+            self.failed_count += self.successful_count
+            self.successful_count = 0
+
+    def summary(self, ctx):
+        self.log("")
+        self.log("=" * self.rule)
+        self.log("SUMMARY")
+        self.log(f"Currencies updated: {self.successful_count}/{len(self.pairs)}")
+        self.log(f"Already up to date: {self.skipped}")
+        self.log(f"Rates stored: {len(self.rate_rows) if self.successful_count else 0}")
+        self.log(f"Failed: {self.failed_count}")
+        return 0 if self.failed_count == 0 else 1
+
+def main():
+    return pipeline.main(["fx"] + sys.argv[1:])
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,200 +1,234 @@
 #!/usr/bin/env python3
 """
 Historical Price Fetcher
-Fetches end-of-day prices for all active tickers from 2015-06-26 to yesterday.
-This is a one-time script to populate historical data.
+Fetches end-of-day prices for all active tickers up to yesterday.
 
-Usage: python3 fetch_historical_prices.py
+By default only the missing tail is fetched: each ticker starts the day after
+its latest row in hl_prices_historical, and tickers with no rows yet get the
+full range from 2015-06-26. Progress is checkpointed after every ticker, so an
+interrupted run picks up where it stopped when started again.
+
+Downloads go through the on-disk history cache (history_cache.py), so ranges
+fetched by an earlier run, e.g. before a database restore, are read from disk.
+
+Runs as the "historical" job of pipeline.py.
+
+Usage: python3 fetch_historical_prices.py [--full] [--no-cache]
 """
 
 import os
 import sys
-import time
+import json
 import datetime as dt
-from typing import List, Tuple, Optional
-
-import pytz
-import yfinance as yf
-import mysql.connector
-
-# --- Config: read from environment variables (set via .env or cron environment)
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_NAME = os.getenv("DB_NAME", "investments")
-DB_USER = os.getenv("DB_USER", "root")
-DB_PASS = os.getenv("DB_PASS")
-if DB_PASS is None:
-    raise RuntimeError(
-        "DB_PASS environment variable must be set. "
-        "See .env.example. For cron: export DB_PASS=yourpassword before running."
-    )
-
-UTC = pytz.UTC
-
-def db_conn():
-    return mysql.connector.connect(
-        host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME, autocommit=True
-    )
-
-def fetch_active_symbols(cursor) -> List[Tuple[str, str, str]]:
-    """Get all active ticker symbols from the database."""
-    cursor.execute("""
-        SELECT ticker, yahoo_symbol, currency
-        FROM hl_ticker_symbols
-        WHERE is_active = 1
-        ORDER BY ticker
-    """)
-    return cursor.fetchall()
+from typing import Dict, Optional, Set
+
+import pipeline
+import providers
+import price_sink
+import history_cache
+from fetch_engine import TokenBucket
+
+# First date of price history for newly added tickers (and --full runs)
+HISTORY_START = dt.date(2015, 6, 26)
+
+# Completed tickers for the current run, removed once the run finishes
+CHECKPOINT_FILE = os.getenv("HISTORICAL_CHECKPOINT", "../logs/historical_prices.checkpoint.json")
 
-def get_historical_prices(symbol: str, start_date: dt.date, end_date: dt.date) -> Optional[yf.Ticker]:
+def download_history(symbol: str, start_date: dt.date, end_date: dt.date,
+                     provider: Optional[providers.Provider] = None):
     """
-    Fetch historical prices for a symbol between start and end dates.
-    Returns the yfinance Ticker object with history data, or None if failed.
+    One provider request for daily prices from start_date to end_date inclusive.
+    Returns the history DataFrame (possibly empty), or None if the request failed.
     """
+    provider = provider or providers.get_provider()
     try:
-        ticker = yf.Ticker(symbol)
-        
-        # Fetch daily historical data
-        # yfinance expects datetime objects, not date objects
-        start_dt = dt.datetime.combine(start_date, dt.time())
-        end_dt = dt.datetime.combine(end_date, dt.time())
-        
-        hist = ticker.history(start=start_dt, end=end_dt, interval="1d")
-        
-        if hist.empty:
-            print(f"[WARN] No historical data for {symbol}")
-            return None
-            
-        return ticker
+        return provider.history(symbol, start_date, end_date)
         
     except Exception as e:
         print(f"[ERROR] Failed to fetch historical data for {symbol}: {e}")
         return None
 
-def store_historical_prices(cursor, ticker: str, yahoo_symbol: str, currency: str, 
-                          hist_data, start_date: dt.date, end_date: dt.date) -> int:
+def get_historical_prices(symbol: str, start_date: dt.date, end_date: dt.date,
+                          limiter: Optional[TokenBucket] = None, use_cache: bool = True,
+                          provider: Optional[providers.Provider] = None):
     """
-    Store historical price data in the database.
-    Returns the number of records inserted.
+    Fetch daily prices for a symbol from start_date to end_date inclusive.
+    With use_cache, ranges already in the history cache are read from disk and
+    only the rest is requested from the provider (each request takes a limiter token).
+    Returns the history DataFrame, or None if there is no data or the request failed.
     """
-    inserted_count = 0
+    def fetch(range_start: dt.date, range_end: dt.date):
+        if limiter is not None:
+            limiter.acquire()
+        return download_history(symbol, range_start, range_end, provider)
     
-    try:
-        # Process each day's data
-        for date, row in hist_data.iterrows():
-            # Convert pandas timestamp to date
-            trade_date = date.date()
-            
-            # Skip if outside our desired range
-            if trade_date < start_date or trade_date > end_date:
-                continue
-                
-            price = float(row['Close'])
-            
-            # Insert or update the price
-            cursor.execute("""
-                INSERT INTO hl_prices_historical (ticker, yahoo_symbol, price, currency, trade_date)
-                VALUES (%s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    price = VALUES(price),
-                    yahoo_symbol = VALUES(yahoo_symbol)
-            """, (ticker, yahoo_symbol, price, currency, trade_date))
-            
-            inserted_count += 1
-            
-    except Exception as e:
-        print(f"[ERROR] Failed to store data for {ticker}: {e}")
-        return 0
-        
-    return inserted_count
-
-def main():
-    """Main function to fetch and store historical prices."""
-    print("Historical Price Fetcher")
-    print("=" * 50)
-    
-    # Define date range
-    start_date = dt.date(2015, 6, 26)
-    end_date = dt.date.today() - dt.timedelta(days=1)  # Yesterday
+    if use_cache:
+        hist, _ = history_cache.get_history(symbol, start_date, end_date, fetch)
+    else:
+        hist = fetch(start_date, end_date)
     
-    print(f"Date range: {start_date} to {end_date}")
-    print(f"Total days: {(end_date - start_date).days + 1}")
+    if hist is None or hist.empty:
+        print(f"[WARN] No historical data for {symbol}")
+        return None
     
-    # Connect to database
+    return hist
+
+def fetch_last_dates(cursor) -> Dict[str, dt.date]:
+    """Latest stored trade_date per ticker in hl_prices_historical."""
+    cursor.execute("""
+        SELECT ticker, MAX(trade_date)
+        FROM hl_prices_historical
+        GROUP BY ticker
+    """)
+    return {ticker: last for ticker, last in cursor.fetchall()}
+
+def load_checkpoint(path: str, run_key: dict) -> Set[str]:
+    """
+    Tickers already completed by an interrupted run with the same settings.
+    A checkpoint left by a different run (other mode or end date) is ignored.
+    """
     try:
-        conn = db_conn()
-        cursor = conn.cursor()
-    except Exception as e:
-        print(f"[ERROR] Failed to connect to database: {e}")
-        return 1
-    
-    # Get active symbols
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    if saved.get("run") != run_key:
+        return set()
+    return set(saved.get("done", []))
+
+def save_checkpoint(path: str, run_key: dict, done: Set[str]):
+    """Atomically record the tickers completed so far."""
     try:
-        symbols = fetch_active_symbols(cursor)
-        if not symbols:
-            print("No active symbols found; exiting.")
-            return 0
+        checkpoint_dir = os.path.dirname(path)
+        if checkpoint_dir:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"run": run_key, "done": sorted(done)}, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[WARN] Could not write checkpoint {path}: {e}")
+
+def store_historical_prices(conn, ticker: str, yahoo_symbol: str, currency: str, 
+                          hist_data, start_date: dt.date, end_date: dt.date) -> int:
+    """
+    Store historical price data in the database in bulk, in one transaction.
+    Returns the number of records inserted, or None if storing failed.
+    """
+    try:
+        rows = price_sink.history_rows(ticker, yahoo_symbol, currency, hist_data, start_date, end_date)
+        return price_sink.write_historical(conn, rows)
     except Exception as e:
-        print(f"[ERROR] Failed to fetch symbols: {e}")
-        return 1
-    
-    print(f"Found {len(symbols)} active symbols")
-    print()
-    
-    total_inserted = 0
-    successful_symbols = 0
-    
-    # Process each symbol
-    for i, (ticker, yahoo_symbol, currency) in enumerate(symbols, 1):
-        print(f"[{i}/{len(symbols)}] Processing {ticker} ({yahoo_symbol})...")
+        print(f"[ERROR] Failed to store data for {ticker}: {e}")
+        return None
+
+class HistoricalPricesJob(pipeline.Job):
+    """Backfill each ticker's missing tail (or everything with --full), resumable."""
+
+    name = "historical"
+    title = "Historical Price Fetcher"
+    rule = 50
+
+    def prepare(self, ctx):
+        # Define date range
+        self.end_date = dt.date.today() - dt.timedelta(days=1)  # Yesterday
+        mode = "full" if ctx.options.full else "incremental"
         
-        # Fetch historical data
-        ticker_obj = get_historical_prices(yahoo_symbol, start_date, end_date)
-        if ticker_obj is None:
-            print(f"  [SKIP] No data available")
-            continue
-            
-        # Get the history data
-        try:
-            start_dt = dt.datetime.combine(start_date, dt.time())
-            end_dt = dt.datetime.combine(end_date, dt.time())
-            hist_data = ticker_obj.history(start=start_dt, end=end_dt, interval="1d")
-        except Exception as e:
-            print(f"  [ERROR] Failed to get history data: {e}")
-            continue
+        self.log(f"Mode: {mode}")
+        self.log(f"Date range: {HISTORY_START} to {self.end_date}")
+        
+        self.last_dates = {} if ctx.options.full else fetch_last_dates(ctx.cursor)
+        self.log(f"Found {len(ctx.symbols)} active symbols")
+        
+        # Resume an interrupted run with the same settings
+        self.run_key = {"mode": mode, "end_date": self.end_date.isoformat()}
+        self.done = load_checkpoint(CHECKPOINT_FILE, self.run_key)
+        if self.done:
+            self.log(f"Resuming: {len(self.done)} symbols already completed ({CHECKPOINT_FILE})")
         
-        if hist_data.empty:
-            print(f"  [SKIP] No historical data")
-            continue
+        # Each ticker starts the day after its latest stored price; new tickers get the full range
+        self.start_dates = {
+            ticker: self.last_dates[ticker] + dt.timedelta(days=1) if ticker in self.last_dates else HISTORY_START
+            for ticker, _, _ in ctx.symbols
+        }
+        self.up_to_date = sum(1 for ticker, _, _ in ctx.symbols
+                              if ticker not in self.done and self.start_dates[ticker] > self.end_date)
+        
+        self.total_inserted = 0
+        self.successful_symbols = 0
+        self.failed_symbols = 0
+        
+        # Only real Yahoo requests take a rate-limit token; cache hits don't wait
+        self.use_cache = history_cache.available() and not ctx.options.no_cache
+        self.log(f"History cache: {history_cache.HISTORY_CACHE_DIR if self.use_cache else 'off'}")
+        self.log("")
+
+    def fetch(self, ctx, row):
+        ticker, yahoo_symbol, _ = row
+        if ticker in self.done:
+            return pipeline.Skip("Completed earlier in this run")
+        if self.start_dates[ticker] > self.end_date:
+            return pipeline.Skip(f"Up to date (last price {self.last_dates[ticker]})")
+        hist = get_historical_prices(yahoo_symbol, self.start_dates[ticker], self.end_date,
+                                     ctx.limiter, self.use_cache, ctx.provider)
+        # Distinguish "no data" from a skip so validate() logs it
+        return (hist,)
+
+    def validate(self, ctx, row, result):
+        ticker = row[0]
+        self.log(f"  Range: {self.start_dates[ticker]} to {self.end_date}")
+        hist_data, = result
+        if hist_data is None:
+            # A failed download looks the same, so leave it for a resumed run to retry
+            self.log(f"  [SKIP] No data available")
+            return None
+        return hist_data
+
+    def sink(self, ctx, row, hist_data):
+        ticker, yahoo_symbol, currency = row
         
         # Store in database
-        inserted = store_historical_prices(cursor, ticker, yahoo_symbol, currency, 
-                                         hist_data, start_date, end_date)
+        inserted = store_historical_prices(ctx.conn, ticker, yahoo_symbol, currency, 
+                                         hist_data, self.start_dates[ticker], self.end_date)
         
+        if inserted is None:
+            self.log(f"  [ERROR] Failed to store price records")
+            self.failed_symbols += 1
+            return
         if inserted > 0:
-            print(f"  [OK] Inserted {inserted} price records")
-            total_inserted += inserted
-            successful_symbols += 1
+            self.log(f"  [OK] Inserted {inserted} price records")
+            self.total_inserted += inserted
+            self.successful_symbols += 1
         else:
-            print(f"  [SKIP] No records inserted")
+            self.log(f"  [SKIP] No records inserted")
+        self.mark_done(ticker)
+
+    def mark_done(self, ticker: str):
+        self.done.add(ticker)
+        save_checkpoint(CHECKPOINT_FILE, self.run_key, self.done)
+
+    def end_row(self, ctx, row):
+        self.log("")
+
+    def summary(self, ctx):
+        self.log("=" * self.rule)
+        self.log("SUMMARY")
+        self.log(f"Symbols processed: {self.successful_symbols}/{len(ctx.symbols)}")
+        self.log(f"Already up to date: {self.up_to_date}")
+        self.log(f"Total price records inserted: {self.total_inserted}")
+        self.log(f"Failed: {self.failed_symbols}")
+        self.log(f"Date range: {HISTORY_START} to {self.end_date}")
         
-        # Rate limiting - be respectful to yfinance
-        if i < len(symbols):  # Don't sleep after the last symbol
-            print(f"  [WAIT] Sleeping 2 seconds...")
-            time.sleep(2)
+        # The run finished, so there is nothing to resume
+        try:
+            os.remove(CHECKPOINT_FILE)
+        except FileNotFoundError:
+            pass
         
-        print()
-    
-    # Summary
-    print("=" * 50)
-    print("SUMMARY")
-    print(f"Symbols processed: {successful_symbols}/{len(symbols)}")
-    print(f"Total price records inserted: {total_inserted}")
-    print(f"Date range: {start_date} to {end_date}")
-    
-    cursor.close()
-    conn.close()
-    
-    return 0
+        return 0 if self.failed_symbols == 0 else 1
+
+def main():
+    return pipeline.main(["historical"] + sys.argv[1:])
 
 if __name__ == "__main__":
     sys.exit(main())
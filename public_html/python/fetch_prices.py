@@ -1,85 +1,53 @@
 #!/usr/bin/env python3
+"""
+Latest Price Fetcher
+Refreshes hl_prices_latest with the latest intraday price of every active
+symbol. Runs as the "prices" job of pipeline.py.
+
+Usage: python3 fetch_prices.py [--no-batch] [--batch-size N]
+"""
+
 import os
 import sys
 import time
-import datetime as dt
-
-import pytz
-import yfinance as yf
-import mysql.connector
 
-# --- Config: read from environment variables (set via .env or cron environment)
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_NAME = os.getenv("DB_NAME", "investments")
-DB_USER = os.getenv("DB_USER", "root")
-DB_PASS = os.getenv("DB_PASS")
-if DB_PASS is None:
-    raise RuntimeError(
-        "DB_PASS environment variable must be set. "
-        "See .env.example. For cron: export DB_PASS=yourpassword before running."
-    )
+import pipeline
+import providers
 
-UTC = pytz.UTC
+# Symbols per bulk latest-price request in batched mode
+BATCH_SIZE = int(os.getenv("PRICE_BATCH_SIZE", "100"))
 
-def db_conn():
-    return mysql.connector.connect(
-        host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME, autocommit=True
-    )
-
-def fetch_active_symbols(cursor):
-    cursor.execute("""
-        SELECT ticker, yahoo_symbol, currency
-        FROM hl_ticker_symbols
-        WHERE is_active = 1
-        ORDER BY ticker
-    """)
-    return cursor.fetchall()  # list of tuples
-
-def get_latest_price(symbol):
+def get_latest_price(symbol, provider=None):
     """
-    Use yfinance to get the latest close/last trade price.
-    Strategy: try '1d'/'1m' intraday tail, then fallback to fast_info or last close.
+    Latest close/last trade price for one symbol (see Provider.latest_price).
     Returns (price, asof_utc) or (None, None) if unavailable.
     """
+    provider = provider or providers.get_provider()
     try:
-        t = yf.Ticker(symbol)
-
-        # Try intraday 1-minute latest candle
-        hist = t.history(period="1d", interval="1m")
-        if not hist.empty:
-            last = hist.tail(1).iloc[0]
-            price = float(last.get("Close"))
-            ts = last.name.to_pydatetime()
-            # Ensure UTC:
-            if ts.tzinfo is None:
-                ts = UTC.localize(ts)
-            ts_utc = ts.astimezone(UTC)
-            return price, ts_utc
-
-        # Fallbacks:
-        fi = getattr(t, "fast_info", None)
-        if fi:
-            # fast_info has last_price sometimes
-            price = getattr(fi, "last_price", None)
-            if price is not None:
-                return float(price), dt.datetime.now(tz=UTC)
-
-        # Fallback to last close daily
-        hist = t.history(period="5d", interval="1d")
-        if not hist.empty:
-            last = hist.tail(1).iloc[0]
-            price = float(last.get("Close"))
-            ts = last.name.to_pydatetime()
-            if ts.tzinfo is None:
-                ts = UTC.localize(ts)
-            ts_utc = ts.astimezone(UTC)
-            return price, ts_utc
-
+        return provider.latest_price(symbol)
     except Exception as e:
         print(f"[WARN] {symbol}: {e}", file=sys.stderr)
-
     return None, None
 
+def get_latest_prices_batch(symbols, batch_size=BATCH_SIZE, limiter=None, provider=None):
+    """
+    Latest 1-minute close for many symbols using bulk provider requests of up
+    to `batch_size` symbols each, taking a `limiter` token per request.
+    Returns {symbol: (price, asof_utc)} for the symbols that came back with data;
+    anything missing is left to the caller's per-symbol fallback.
+    """
+    provider = provider or providers.get_provider()
+    found = {}
+    for start in range(0, len(symbols), batch_size):
+        chunk = symbols[start:start + batch_size]
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            found.update(provider.latest_prices(chunk))
+        except Exception as e:
+            print(f"[WARN] batch of {len(chunk)} symbols: {e}", file=sys.stderr)
+    return found
+
 def upsert_price(cursor, ticker, symbol, currency, price, asof_utc):
     cursor.execute("""
         INSERT INTO hl_prices_latest (ticker, yahoo_symbol, price, currency, asof_utc, source)
@@ -92,25 +60,47 @@ def upsert_price(cursor, ticker, symbol, currency, price, asof_utc):
             source       = 'yfinance';
     """, (ticker, symbol, price, currency, asof_utc.strftime("%Y-%m-%d %H:%M:%S")))
 
-def main():
-    conn = db_conn()
-    cur = conn.cursor()
-    rows = fetch_active_symbols(cur)
-    if not rows:
-        print("No active symbols found; exiting.")
-        return
-
-    print(f"Fetching {len(rows)} symbols...")
-    for ticker, symbol, currency in rows:
-        price, asof_utc = get_latest_price(symbol)
-        if price is None:
-            print(f"[MISS] {ticker} ({symbol})")
-            continue
-        upsert_price(cur, ticker, symbol, currency, price, asof_utc)
-        print(f"[OK] {ticker}={price} {currency} @ {asof_utc.isoformat()}")
+class LatestPricesJob(pipeline.Job):
+    """Batched download first; per-symbol fallback only for symbols it missed."""
+
+    name = "prices"
+    progress = False
+
+    def prepare(self, ctx):
+        self.batched = {}
+        self.log(f"Fetching {len(ctx.symbols)} symbols...")
+        if not ctx.options.no_batch:
+            started = time.time()
+            batch_size = ctx.options.batch_size or BATCH_SIZE
+            with ctx.timer.stage("fetch"):
+                self.batched = get_latest_prices_batch(
+                    sorted({symbol for _, symbol, _ in ctx.symbols}), max(1, batch_size),
+                    ctx.limiter, ctx.provider)
+            self.log(f"Batched download: {len(self.batched)}/{len(ctx.symbols)} symbols "
+                     f"in {time.time() - started:.1f}s")
+
+    def fetch(self, ctx, row):
+        symbol = row[1]
+        if symbol in self.batched:
+            return self.batched[symbol]
+        ctx.limiter.acquire()
+        return get_latest_price(symbol, ctx.provider)
+
+    def validate(self, ctx, row, result):
+        ticker, symbol, _ = row
+        if result[0] is None:
+            self.log(f"[MISS] {ticker} ({symbol})")
+            return None
+        return result
+
+    def sink(self, ctx, row, value):
+        ticker, symbol, currency = row
+        price, asof_utc = value
+        upsert_price(ctx.cursor, ticker, symbol, currency, price, asof_utc)
+        self.log(f"[OK] {ticker}={price} {currency} @ {asof_utc.isoformat()}")
 
-    cur.close()
-    conn.close()
+def main():
+    return pipeline.main(["prices"] + sys.argv[1:])
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
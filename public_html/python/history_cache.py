@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+History Cache
+On-disk cache of daily yfinance history, one Arrow IPC (Feather v2) file per
+Yahoo symbol. Files are uncompressed so they can be memory-mapped on read.
+
+Each file records the date range it covers in its schema metadata. A request
+is served from the file when the range is covered; otherwise only the missing
+head and/or tail is downloaded, merged in and the covered range widened. A
+range is only marked as covered when the download for it returned data, since
+yfinance reports many failures as an empty frame, and only up to the last
+date returned, so a trailing close that wasn't published yet is fetched again
+next time.
+
+pyarrow is optional: without it every request goes straight to Yahoo.
+
+Usage:
+    python3 history_cache.py inspect [SYMBOL ...]
+    python3 history_cache.py warm [--start 2015-06-26] [--end YYYY-MM-DD] [SYMBOL ...]
+    python3 history_cache.py prune [--older-than DAYS] [--inactive] [SYMBOL ...]
+
+warm and prune --inactive read active symbols from hl_ticker_symbols, so they
+need the usual DB_* environment variables.
+
+Config (environment):
+    HISTORY_CACHE_DIR   cache directory (default ../cache/history)
+"""
+
+import os
+import sys
+import json
+import argparse
+import datetime as dt
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+HISTORY_CACHE_DIR = os.getenv("HISTORY_CACHE_DIR", "../cache/history")
+
+# Start of price history, matching fetch_historical_prices.HISTORY_START
+DEFAULT_START = dt.date(2015, 6, 26)
+
+Fetcher = Callable[[dt.date, dt.date], Optional[pd.DataFrame]]
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def cache_path(symbol: str, cache_dir: str = HISTORY_CACHE_DIR) -> str:
+    # Yahoo symbols can contain '^' and '=' (indices, FX); keep file names plain
+    safe = "".join(c if c.isalnum() or c in ".-_" else f"%{ord(c):02X}" for c in symbol)
+    return os.path.join(cache_dir, f"{safe}.arrow")
+
+
+def normalise(hist: pd.DataFrame) -> pd.DataFrame:
+    """yfinance frame → float columns on a naive, midnight DatetimeIndex named 'date'."""
+    frame = hist.copy()
+    index = frame.index
+    if getattr(index, "tz", None) is not None:
+        index = index.tz_localize(None)          # keep the exchange-local calendar date
+    frame.index = pd.DatetimeIndex(index).normalize().rename("date")
+    frame = frame.select_dtypes("number").astype("float64")
+    return frame[~frame.index.duplicated(keep="last")].sort_index()
+
+
+def read_entry(symbol: str, cache_dir: str = HISTORY_CACHE_DIR) -> Optional[Tuple[pd.DataFrame, dict]]:
+    """(frame, meta) for a cached symbol, or None if absent or unreadable."""
+    path = cache_path(symbol, cache_dir)
+    if pa is None or not os.path.exists(path):
+        return None
+    try:
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+            meta  = json.loads(table.schema.metadata[b"history_cache"])
+            frame = table.to_pandas()       # copies out before the map is closed
+    except Exception as e:
+        print(f"[WARN] Ignoring unreadable cache file {path}: {e}", file=sys.stderr)
+        return None
+    frame.index = pd.DatetimeIndex(frame.pop("date")).rename("date")
+    return frame, meta
+
+
+def write_entry(symbol: str, frame: pd.DataFrame, covered_from: dt.date, covered_to: dt.date,
+                cache_dir: str = HISTORY_CACHE_DIR) -> None:
+    """Atomically replace the cache file for `symbol`."""
+    os.makedirs(cache_dir, exist_ok=True)
+    meta = {
+        "symbol":       symbol,
+        "covered_from": covered_from.isoformat(),
+        "covered_to":   covered_to.isoformat(),
+        "rows":         len(frame),
+        "updated_at":   dt.datetime.now().isoformat(timespec="seconds"),
+    }
+    table = pa.Table.from_pandas(frame.reset_index(), preserve_index=False)
+    table = table.replace_schema_metadata({"history_cache": json.dumps(meta)})
+    path  = cache_path(symbol, cache_dir)
+    tmp   = path + ".tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def missing_ranges(start: dt.date, end: dt.date, meta: Optional[dict]) -> List[Tuple[dt.date, dt.date]]:
+    """Sub-ranges of [start, end] outside the entry's covered range."""
+    if meta is None:
+        return [(start, end)]
+    covered_from = dt.date.fromisoformat(meta["covered_from"])
+    covered_to   = dt.date.fromisoformat(meta["covered_to"])
+    if end < covered_from or start > covered_to:
+        # Disjoint: fetch the gap as well so coverage stays one contiguous range
+        return [(min(start, covered_to + dt.timedelta(days=1)), max(end, covered_from - dt.timedelta(days=1)))]
+    ranges = []
+    if start < covered_from:
+        ranges.append((start, covered_from - dt.timedelta(days=1)))
+    if end > covered_to:
+        ranges.append((covered_to + dt.timedelta(days=1), end))
+    return ranges
+
+
+def get_history(symbol: str, start: dt.date, end: dt.date, fetch: Fetcher,
+                cache_dir: str = HISTORY_CACHE_DIR) -> Tuple[Optional[pd.DataFrame], int]:
+    """
+    Daily history for `symbol` over [start, end] (inclusive), downloading only
+    what the cache doesn't cover via fetch(range_start, range_end).
+    Returns (frame or None, number of downloads made).
+    """
+    if pa is None:
+        hist = fetch(start, end)
+        return (None if hist is None or hist.empty else normalise(hist)), 1
+
+    entry = read_entry(symbol, cache_dir)
+    frame, meta = entry if entry else (None, None)
+    downloads = 0
+    for range_start, range_end in missing_ranges(start, end, meta):
+        downloads += 1
+        hist = fetch(range_start, range_end)
+        if hist is None or hist.empty:
+            continue
+        hist  = normalise(hist)
+        frame = hist if frame is None else pd.concat([frame, hist])
+        frame = frame[~frame.index.duplicated(keep="last")].sort_index()
+        # Only up to the last close returned: a close not yet published must be asked for again
+        fetched_to = min(range_end, hist.index[-1].date())
+        if meta is None:
+            meta = {"covered_from": range_start.isoformat(), "covered_to": fetched_to.isoformat()}
+        else:
+            meta["covered_from"] = min(dt.date.fromisoformat(meta["covered_from"]), range_start).isoformat()
+            meta["covered_to"]   = max(dt.date.fromisoformat(meta["covered_to"]), fetched_to).isoformat()
+        write_entry(symbol, frame, dt.date.fromisoformat(meta["covered_from"]),
+                    dt.date.fromisoformat(meta["covered_to"]), cache_dir)
+
+    if frame is None:
+        return None, downloads
+    window = frame[(frame.index >= pd.Timestamp(start)) & (frame.index <= pd.Timestamp(end))]
+    return (window if not window.empty else None), downloads
+
+
+def cached_symbols(cache_dir: str = HISTORY_CACHE_DIR) -> Dict[str, str]:
+    """{symbol: path} for every cache file, symbol taken from the file's metadata."""
+    found = {}
+    if not os.path.isdir(cache_dir):
+        return found
+    for name in sorted(os.listdir(cache_dir)):
+        if not name.endswith(".arrow"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            with pa.memory_map(path, "r") as source:
+                schema = pa.ipc.open_file(source).schema
+            found[json.loads(schema.metadata[b"history_cache"])["symbol"]] = path
+        except Exception:
+            found[name[:-len(".arrow")]] = path
+    return found
+
+# ── CLI ───────────────────────────────────────────────────────────────────────
+
+def active_symbols() -> List[str]:
+    import mysql.connector
+    conn = mysql.connector.connect(
+        host=os.getenv("DB_HOST", "localhost"), user=os.getenv("DB_USER", "root"),
+        password=os.getenv("DB_PASS"), database=os.getenv("DB_NAME", "investments"),
+    )
+    cursor = conn.cursor()
+    cursor.execute("SELECT yahoo_symbol FROM hl_ticker_symbols WHERE is_active = 1 ORDER BY ticker")
+    symbols = [r[0] for r in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    return symbols
+
+
+def cmd_inspect(args) -> int:
+    entries = cached_symbols()
+    symbols = args.symbols or list(entries)
+    total = 0
+    print(f"{'symbol':<16} {'covered from':<12} {'covered to':<12} {'rows':>6} {'size KB':>8}  updated")
+    for symbol in symbols:
+        entry = read_entry(symbol)
+        if entry is None:
+            print(f"{symbol:<16} (not cached)")
+            continue
+        _, meta = entry
+        size = os.path.getsize(cache_path(symbol))
+        total += size
+        print(f"{symbol:<16} {meta['covered_from']:<12} {meta['covered_to']:<12} {meta['rows']:>6} "
+              f"{size / 1024:>8.1f}  {meta['updated_at']}")
+    print(f"{len(symbols)} symbols, {total / 1024:.1f} KB in {HISTORY_CACHE_DIR}")
+    return 0
+
+
+def cmd_warm(args) -> int:
+    from fetch_engine import TokenBucket, fetch_in_order
+    import providers
+
+    start = dt.date.fromisoformat(args.start)
+    end   = dt.date.fromisoformat(args.end) if args.end else dt.date.today() - dt.timedelta(days=1)
+    symbols = args.symbols or active_symbols()
+    limiter = TokenBucket()
+    provider = providers.get_provider()
+
+    def warm(symbol):
+        def fetch(range_start, range_end):
+            limiter.acquire()
+            return provider.history(symbol, range_start, range_end)
+        return get_history(symbol, start, end, fetch)
+
+    for i, (symbol, (frame, downloads)) in enumerate(fetch_in_order(symbols, warm), 1):
+        rows = 0 if frame is None else len(frame)
+        status = "cached" if downloads == 0 else f"{downloads} download(s)"
+        print(f"[{i}/{len(symbols)}] {symbol}: {rows} rows ({status})")
+    return 0
+
+
+def cmd_prune(args) -> int:
+    entries = cached_symbols()
+    doomed  = set(args.symbols)
+    if args.inactive:
+        active = set(active_symbols())
+        doomed |= {s for s in entries if s not in active}
+    if args.older_than is not None:
+        cutoff = dt.datetime.now() - dt.timedelta(days=args.older_than)
+        doomed |= {s for s, path in entries.items()
+                   if dt.datetime.fromtimestamp(os.path.getmtime(path)) < cutoff}
+    if not (args.symbols or args.inactive or args.older_than is not None):
+        print("Nothing selected: pass symbols, --inactive or --older-than DAYS")
+        return 1
+    for symbol in sorted(doomed):
+        path = entries.get(symbol)
+        if path is None:
+            continue
+        os.remove(path)
+        print(f"[DEL] {symbol}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the on-disk yfinance history cache.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    i = sub.add_parser("inspect", help="Show covered ranges and sizes")
+    i.add_argument("symbols", nargs="*")
+
+    w = sub.add_parser("warm", help="Download whatever the cache is missing")
+    w.add_argument("symbols", nargs="*", help="Yahoo symbols (default: all active)")
+    w.add_argument("--start", default=DEFAULT_START.isoformat())
+    w.add_argument("--end", default=None, help="Last date (default yesterday)")
+
+    p = sub.add_parser("prune", help="Delete cache entries")
+    p.add_argument("symbols", nargs="*")
+    p.add_argument("--older-than", type=int, default=None, metavar="DAYS",
+                   help="Entries not updated in this many days")
+    p.add_argument("--inactive", action="store_true", help="Entries for symbols no longer active")
+
+    args = parser.parse_args()
+    if pa is None:
+        print("pyarrow is not installed; the history cache is disabled.")
+        return 1
+    return {"inspect": cmd_inspect, "warm": cmd_warm, "prune": cmd_prune}[args.command](args)
+
+if __name__ == "__main__":
+    sys.exit(main())
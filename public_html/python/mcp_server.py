@@ -8,7 +8,7 @@ client) via the Streamable HTTP transport.
 QUICK START
 -----------
 1. Install dependencies:
-       pip install "mcp[cli]" mysql-connector-python uvicorn
+       pip install "mcp[cli]" mysql-connector-python numpy uvicorn
 
 2. Add to your .env:
        MCP_PORT=8765
@@ -41,17 +41,36 @@ TOOLS EXPOSED
   get_portfolio_summary    — Current value by account (holdings + cash)
   get_holdings             — Per-ticker detail with unrealised gain/loss
   get_account_performance  — Historical gain/loss over a date range
-  get_transactions         — Filterable transaction log
+  get_performance_series   — Daily/monthly/yearly value and gain series for a range
+  get_returns              — Time- and money-weighted returns for named or custom periods
+  get_transactions         — Filterable transaction log (cursor-paginated)
   get_dividend_income      — Dividend income with optional grouping
   get_allocation_breakdown — Portfolio breakdown by asset allocation category
 """
 
 import os
+import time
+import base64
+import logging
+import asyncio
+import threading
+import contextvars
 import datetime as dt
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
 
+import numpy as np
 import mysql.connector
 from mcp.server.fastmcp import FastMCP
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+
+import metrics
+import valuation
+import performance
+import price_index
+import account_snapshots
+from metrics import instrumented
 
 # ── Config ────────────────────────────────────────────────────────────────────
 
@@ -62,6 +81,31 @@ DB_PASS  = os.getenv("DB_PASS")
 MCP_PORT = int(os.getenv("MCP_PORT", "8765"))
 MCP_HOST = os.getenv("MCP_HOST", "127.0.0.1")
 
+# Connection pool: max open connections, seconds to wait for a free one, and
+# the age (seconds) after which an idle connection is replaced.
+DB_POOL_SIZE    = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+
+# Worker threads that run blocking DB calls off the event loop. More workers
+# than pool slots lets queued queries wait on the pool (visible in /stats).
+DB_WORKERS = int(os.getenv("DB_WORKERS", str(DB_POOL_SIZE * 2)))
+
+# Latest-price cache: serve without touching the DB for PRICE_CACHE_CHECK
+# seconds, then revalidate against hl_prices_latest's change marker; reload
+# unconditionally once an entry is PRICE_CACHE_TTL seconds old.
+PRICE_CACHE_CHECK = float(os.getenv("PRICE_CACHE_CHECK", "5"))
+PRICE_CACHE_TTL   = float(os.getenv("PRICE_CACHE_TTL", "900"))
+
+# As-of indexes over hl_account_values_historical and hl_fx_rates
+# (price_index.py): refresh at most every ASOF_INDEX_CHECK seconds; drop and
+# reload after ASOF_INDEX_TTL.
+ASOF_INDEX_CHECK = float(os.getenv("ASOF_INDEX_CHECK", "30"))
+ASOF_INDEX_TTL   = float(os.getenv("ASOF_INDEX_TTL", "3600"))
+
+# Log tool calls slower than this many milliseconds, with their SQL (0 = off).
+MCP_SLOW_MS = float(os.getenv("MCP_SLOW_MS", "0"))
+
 if DB_PASS is None:
     raise RuntimeError(
         "DB_PASS environment variable must be set. "
@@ -83,13 +127,187 @@ def db_conn():
     )
 
 
-def to_gbp(price: float, currency: str) -> float:
+class ConnectionPool:
+    """
+    Bounded, process-wide pool of database connections shared by every tool.
+
+    At most `size` connections are open at once. When all of them are borrowed,
+    acquire() waits up to `timeout` seconds for one to be released and then
+    raises TimeoutError. Idle connections are pinged before being handed out and
+    are replaced if the ping fails or they are older than `recycle` seconds, so
+    MySQL's wait_timeout never surfaces as a tool error.
+    """
+
+    def __init__(self, size: int, timeout: float, recycle: int):
+        self.size    = max(1, size)
+        self.timeout = timeout
+        self.recycle = recycle
+        self._cond   = threading.Condition()
+        self._idle: list = []           # LIFO of idle connections, warmest last
+        self._born: dict[int, float] = {}  # id(conn) -> monotonic creation time
+        self._open   = 0
+        self._in_use = 0
+        # Counters exposed via stats()
+        self._acquired  = 0
+        self._created   = 0
+        self._recycled  = 0
+        self._waits     = 0
+        self._wait_time = 0.0
+        self._timeouts  = 0
+
+    def acquire(self):
+        """Borrow a healthy connection, waiting for a free slot if necessary."""
+        started  = time.monotonic()
+        deadline = started + self.timeout
+        waited   = False
+        with self._cond:
+            while not self._idle and self._open >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise TimeoutError(
+                        f"No database connection free after {self.timeout:g}s "
+                        f"(pool size {self.size})"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+            if waited:
+                self._waits     += 1
+                self._wait_time += time.monotonic() - started
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._open += 1             # reserve the slot before connecting
+            self._in_use   += 1
+            self._acquired += 1
+
+        # Health check / connect outside the lock so other callers aren't blocked.
+        try:
+            if conn is not None and not self._healthy(conn):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = db_conn()
+                with self._cond:
+                    self._born[id(conn)] = time.monotonic()
+                    self._created += 1
+            return conn
+        except Exception:
+            with self._cond:
+                self._open   -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard: bool = False) -> None:
+        """
+        Return a borrowed connection to the pool, or with discard=True (it was
+        in use when something failed) close it and free its slot instead.
+        """
+        if discard:
+            self._discard(conn)
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._open -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def _healthy(self, conn) -> bool:
+        """Pre-ping an idle connection; False if it is too old or the server has gone away."""
+        born = self._born.get(id(conn), 0.0)
+        if self.recycle and time.monotonic() - born > self.recycle:
+            return False
+        try:
+            return conn.is_connected()
+        except Exception:
+            return False
+
+    def _discard(self, conn) -> None:
+        """Close a stale connection; its slot stays reserved for the replacement."""
+        with self._cond:
+            self._born.pop(id(conn), None)
+            self._recycled += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        """Snapshot of pool usage, for sizing DB_POOL_SIZE / DB_POOL_TIMEOUT."""
+        with self._cond:
+            return {
+                "size":             self.size,
+                "open":             self._open,
+                "in_use":           self._in_use,
+                "idle":             len(self._idle),
+                "acquired":         self._acquired,
+                "created":          self._created,
+                "recycled":         self._recycled,
+                "waits":            self._waits,
+                "wait_time_s":      round(self._wait_time, 4),
+                "avg_wait_ms":      round(self._wait_time / self._waits * 1000, 2) if self._waits else 0.0,
+                "timeouts":         self._timeouts,
+            }
+
+
+POOL = ConnectionPool(DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_RECYCLE)
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+
+
+def with_cursor(fn: Callable, *args):
+    """
+    Call fn(cur, *args) with a dictionary cursor on a pooled connection. The
+    cursor is wrapped so its statements are charged to the current tool call.
+    The connection always goes back to the pool; if anything raised, it is
+    discarded rather than reused, since it may hold unread results or be broken.
+    """
+    conn   = POOL.acquire()
+    failed = True
+    try:
+        cur = metrics.TimedCursor(conn.cursor(dictionary=True))
+        try:
+            result = fn(cur, *args)
+        finally:
+            cur.close()
+        failed = False
+        return result
+    finally:
+        POOL.release(conn, discard=failed)
+
+
+async def run_db(fn: Callable, *args):
     """
-    Normalise a price to GBP.
-    UK-listed stocks are often quoted in GBp (pence sterling), so divide by 100.
-    Other currencies (USD, EUR) are left as-is — the DB doesn't store FX rates.
+    Run blocking DB work fn(cur, *args) on the DB executor and await the result.
+
+    mysql.connector is synchronous, so tools must never call it on the event
+    loop — one slow query would stall every other client. Each call borrows its
+    own connection, so independent queries can be awaited together with
+    asyncio.gather(). Context variables are carried over, as asyncio.to_thread does.
     """
-    return price / 100.0 if currency == "GBp" else price
+    loop = asyncio.get_running_loop()
+    ctx  = contextvars.copy_context()
+    return await loop.run_in_executor(DB_EXECUTOR, ctx.run, with_cursor, fn, *args)
+
+
+def fetch_all(cur, sql: str, params=()) -> list[dict]:
+    cur.execute(sql, params)
+    return cur.fetchall()
+
+
+def fetch_one(cur, sql: str, params=()) -> Optional[dict]:
+    cur.execute(sql, params)
+    return cur.fetchone()
+
+
+async def query(sql: str, params=()) -> list[dict]:
+    """Run one SELECT off the event loop and return all rows as dicts."""
+    return await run_db(fetch_all, sql, params)
+
+
+async def query_one(sql: str, params=()) -> Optional[dict]:
+    """Run one SELECT off the event loop and return the first row (or None)."""
+    return await run_db(fetch_one, sql, params)
 
 
 # ── Filter helpers ────────────────────────────────────────────────────────────
@@ -131,50 +349,104 @@ def and_from(clauses: list[str]) -> str:
     return ("AND " + " AND ".join(clauses)) if clauses else ""
 
 
-# ── Tools ─────────────────────────────────────────────────────────────────────
+# ── Positions snapshot ────────────────────────────────────────────────────────
 
-@mcp.tool()
-def get_portfolio_summary(
-    client: Optional[str] = None,
-    account_type: Optional[str] = None,
-) -> dict:
+class Positions:
     """
-    Current portfolio value broken down by account.
+    Immutable net positions and cash balances for every client/account.
 
-    Returns holdings value (at latest prices) plus estimated cash balance
-    for each client/account combination, and a grand total in GBP.
+    Positions are stored as (account × ticker) matrices for the valuation
+    kernel: `accounts` labels the rows as (client, account) and `tickers`
+    labels the columns, both sorted. Closed positions stay in the matrix (with
+    net_qty <= 0) so callers can net across accounts before filtering. `cash`
+    maps (client, account) to the cash balance in GBP.
+    """
 
-    Args:
-        client: Filter by "David" or "Jen". Omit for combined view.
-        account_type: Filter by "SIPP", "ISA", or "Fund & Share". Omit for all.
+    def __init__(self, version: tuple, accounts: list[tuple], tickers: list[str],
+                 net_qty: np.ndarray, bought_qty: np.ndarray, cost_gbp: np.ndarray,
+                 descriptions: dict, cash: dict):
+        self.version      = version
+        self.accounts     = accounts
+        self.tickers      = tickers
+        self.net_qty      = net_qty
+        self.bought_qty   = bought_qty
+        self.cost_gbp     = cost_gbp
+        self.descriptions = descriptions   # (row, col) -> description
+        self.cash         = cash
+
+    def rows(self, client: Optional[str], account: Optional[str]) -> np.ndarray:
+        """Indices of the account rows matching the client/account filters."""
+        return np.array([
+            i for i, (c_name, acct) in enumerate(self.accounts)
+            if (not client or c_name == client) and (not account or acct == account)
+        ], dtype=np.intp)
+
+    def cash_for(self, client: Optional[str], account: Optional[str]) -> dict:
+        """Cash balances matching the client/account filters."""
+        return {
+            key: val for key, val in self.cash.items()
+            if (not client or key[0] == client) and (not account or key[1] == account)
+        }
+
+
+class PositionsSnapshot:
     """
-    validate(client, account_type)
-    conn = db_conn()
-    cur  = conn.cursor(dictionary=True)
-    try:
-        f_clauses, f_params = conditions(client, account_type, alias="t")
-
-        # Net holdings per account/ticker
-        cur.execute(f"""
-            SELECT t.client_name,
-                   t.account_type,
-                   t.ticker,
-                   SUM(CASE WHEN t.type = 'Buy' THEN t.quantity ELSE -t.quantity END) AS net_qty
-            FROM hl_transactions t
-            WHERE t.type IN ('Buy', 'Sell')
-            {and_from(f_clauses)}
-            GROUP BY t.client_name, t.account_type, t.ticker
-            HAVING net_qty > 0
-        """, f_params)
-        holdings = cur.fetchall()
-
-        # Latest prices
-        cur.execute("SELECT ticker, price, currency FROM hl_prices_latest")
-        prices = {r["ticker"]: r for r in cur.fetchall()}
-
-        # Cash balance per account
-        c_clauses, c_params = conditions(client, account_type)
-        cur.execute(f"""
+    Process-wide positions/cash snapshot shared by the valuation tools.
+
+    The full GROUP BY scan of hl_transactions runs only when the table's data
+    version changes. The version is (MAX(id), COUNT(*)): one cheap query that
+    catches inserts and deletes. In-place UPDATEs of existing rows are not
+    detected — restart the service after hand-editing old transactions.
+    """
+
+    def __init__(self):
+        self._lock    = threading.Lock()
+        self._current: Optional[Positions] = None
+
+    def get(self, cur) -> Positions:
+        """Return the current snapshot, rebuilding it first if the data has changed."""
+        cur.execute("SELECT MAX(id) AS max_id, COUNT(*) AS n FROM hl_transactions")
+        row     = cur.fetchone()
+        version = (row["max_id"], row["n"])
+        with self._lock:
+            if self._current is None or self._current.version != version:
+                self._current = self._build(cur, version)
+            return self._current
+
+    @staticmethod
+    def _build(cur, version: tuple) -> Positions:
+        cur.execute("""
+            SELECT client_name,
+                   account_type,
+                   ticker,
+                   MAX(description)                                                   AS description,
+                   SUM(CASE WHEN type = 'Buy' THEN quantity  ELSE 0          END)     AS bought_qty,
+                   SUM(CASE WHEN type = 'Buy' THEN quantity  ELSE -quantity  END)     AS net_qty,
+                   SUM(CASE WHEN type = 'Buy' THEN value_gbp ELSE 0          END)     AS cost_gbp
+            FROM hl_transactions
+            WHERE type IN ('Buy', 'Sell')
+            GROUP BY client_name, account_type, ticker
+        """)
+        rows     = cur.fetchall()
+        accounts = sorted({(r["client_name"], r["account_type"]) for r in rows})
+        tickers  = sorted({r["ticker"] for r in rows})
+        a_idx    = {key: i for i, key in enumerate(accounts)}
+        t_idx    = {ticker: j for j, ticker in enumerate(tickers)}
+
+        shape        = (len(accounts), len(tickers))
+        net_qty      = np.zeros(shape)
+        bought_qty   = np.zeros(shape)
+        cost_gbp     = np.zeros(shape)
+        descriptions = {}
+        for r in rows:
+            i = a_idx[(r["client_name"], r["account_type"])]
+            j = t_idx[r["ticker"]]
+            net_qty[i, j]      = float(r["net_qty"]    or 0)
+            bought_qty[i, j]   = float(r["bought_qty"] or 0)
+            cost_gbp[i, j]     = float(r["cost_gbp"]   or 0)
+            descriptions[i, j] = r["description"]
+
+        cur.execute("""
             SELECT client_name,
                    account_type,
                    SUM(CASE
@@ -183,52 +455,442 @@ def get_portfolio_summary(
                        ELSE 0
                    END) AS cash
             FROM hl_transactions
-            {where_from(c_clauses)}
             GROUP BY client_name, account_type
-        """, c_params)
-        cash_map = {
+        """)
+        cash = {
             (r["client_name"], r["account_type"]): float(r["cash"] or 0)
             for r in cur.fetchall()
         }
+        return Positions(version, accounts, tickers, net_qty, bought_qty, cost_gbp,
+                         descriptions, cash)
 
-        # Aggregate
-        h_totals: dict = {}
-        for h in holdings:
-            key    = (h["client_name"], h["account_type"])
-            ticker = h["ticker"]
-            if ticker in prices:
-                p   = prices[ticker]
-                val = float(h["net_qty"]) * to_gbp(float(p["price"]), p["currency"])
-                h_totals[key] = h_totals.get(key, 0.0) + val
-
-        accounts = []
-        grand    = 0.0
-        for key in sorted(set(h_totals) | set(cash_map)):
-            c_name, acct = key
-            h_val  = round(h_totals.get(key, 0.0), 2)
-            c_val  = round(cash_map.get(key, 0.0),  2)
-            total  = round(h_val + c_val, 2)
-            grand += total
-            accounts.append({
-                "client":       c_name,
-                "account":      acct,
-                "holdings_gbp": h_val,
-                "cash_gbp":     c_val,
-                "total_gbp":    total,
-            })
 
-        return {
-            "accounts":        accounts,
-            "grand_total_gbp": round(grand, 2),
-            "as_of":           dt.date.today().isoformat(),
-        }
-    finally:
-        cur.close()
-        conn.close()
+SNAPSHOT = PositionsSnapshot()
+
+
+# ── Latest-price cache ────────────────────────────────────────────────────────
+
+class Prices:
+    """Immutable hl_prices_latest contents plus kernel vectors aligned to a snapshot."""
+
+    def __init__(self, marker: tuple, rows: dict):
+        self.marker   = marker
+        self.rows     = rows        # ticker -> {"ticker", "price", "currency"}
+        self._aligned: dict = {}    # (snapshot version, FX rates) -> (price, divisor)
+
+    def aligned(self, snap: Positions, convert: bool = True) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (price, divisor) vectors for the snapshot's tickers, with foreign
+        currencies converted at the latest FX rates unless `convert` is False
+        (the basis of hl_account_values_historical, which holds quoted prices
+        unconverted); built once per snapshot and set of rates.
+        """
+        rates   = FX.rates_on(dt.date.today()) if convert else {}
+        key     = (snap.version, tuple(sorted(rates.items())))
+        vectors = self._aligned.get(key)
+        if vectors is None:
+            vectors = valuation.price_vector(snap.tickers, self.rows, rates)
+            self._aligned = {k: v for k, v in self._aligned.items() if k[0] == snap.version}
+            self._aligned[key] = vectors
+        return vectors
+
+
+class PriceCache:
+    """
+    Process-level cache of hl_prices_latest.
+
+    Prices only change when fetch_prices.py or fetch_daily_prices.py writes, so
+    the cache is trusted outright for `check` seconds. After that it is
+    revalidated with one cheap query for the table's change marker,
+    (MAX(asof_utc), COUNT(*)), and reloaded only if the marker has moved. As a
+    ceiling against writes that leave the marker unchanged, an entry older than
+    `ttl` seconds is always reloaded.
+    """
+
+    def __init__(self, check: float, ttl: float):
+        self.check    = check
+        self.ttl      = ttl
+        self._lock    = threading.Lock()
+        self._current: Optional[Prices] = None
+        self._loaded  = 0.0
+        self._checked = 0.0
+        self._hits          = 0
+        self._misses        = 0
+        self._revalidations = 0
+
+    def peek(self) -> Optional[Prices]:
+        """The cached prices if they can be served without any DB access, else None."""
+        with self._lock:
+            if self._current is not None and time.monotonic() - self._checked < self.check:
+                self._hits += 1
+                return self._current
+        return None
+
+    def get(self, cur) -> Prices:
+        """Return current prices, revalidating or reloading as needed."""
+        with self._lock:
+            now = time.monotonic()
+            if self._current is not None and now - self._checked < self.check:
+                self._hits += 1
+                return self._current
+
+            cur.execute("SELECT MAX(asof_utc) AS asof, COUNT(*) AS n FROM hl_prices_latest")
+            row    = cur.fetchone()
+            marker = (row["asof"], row["n"])
+            if (self._current is not None and self._current.marker == marker
+                    and now - self._loaded < self.ttl):
+                self._hits          += 1
+                self._revalidations += 1
+                self._checked        = now
+                return self._current
+
+            cur.execute("SELECT ticker, price, currency FROM hl_prices_latest")
+            self._current = Prices(marker, {r["ticker"]: r for r in cur.fetchall()})
+            self._misses += 1
+            self._loaded  = self._checked = now
+            return self._current
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "tickers":       len(self._current.rows) if self._current else 0,
+                "hits":          self._hits,
+                "misses":        self._misses,
+                "revalidations": self._revalidations,
+                "hit_rate":      round(self._hits / lookups, 4) if lookups else None,
+                "age_s":         round(time.monotonic() - self._loaded, 1) if self._current else None,
+            }
+
+
+PRICES = PriceCache(PRICE_CACHE_CHECK, PRICE_CACHE_TTL)
+
+# GBP cross rates from hl_fx_rates (fetch_fx_rates.py), as-of indexed
+FX = price_index.FxIndex(ASOF_INDEX_CHECK, ASOF_INDEX_TTL)
+
+# monotonic time before which hl_fx_rates is assumed still missing
+FX_MISSING_UNTIL = 0.0
+
+
+def sync_fx(cur) -> None:
+    """
+    Refresh FX; until the fx job has created hl_fx_rates, foreign prices stay
+    unconverted and the table isn't looked for again for ASOF_INDEX_TTL seconds.
+    """
+    global FX_MISSING_UNTIL
+    try:
+        FX.sync(cur)
+    except mysql.connector.ProgrammingError as e:
+        if e.errno != 1146:     # ER_NO_SUCH_TABLE
+            raise
+        FX_MISSING_UNTIL = time.monotonic() + ASOF_INDEX_TTL
+
+
+async def latest_prices() -> Prices:
+    """Cached latest prices and FX rates; only goes to the DB executor when revalidation is due."""
+    if time.monotonic() >= FX_MISSING_UNTIL and FX.due():
+        await run_db(sync_fx)
+    return PRICES.peek() or await run_db(PRICES.get)
+
+
+# ── As-of account values ──────────────────────────────────────────────────────
+
+VALUES = price_index.ValueIndex(ASOF_INDEX_CHECK, ASOF_INDEX_TTL)
+
+
+# ── Dividend rollup ───────────────────────────────────────────────────────────
+
+def month_starts(first: dt.date, last: dt.date):
+    """Yield the first day of every calendar month overlapping [first, last]."""
+    month = first.replace(day=1)
+    while month <= last:
+        yield month
+        month = (month + dt.timedelta(days=32)).replace(day=1)
+
+
+def max_description(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    """MAX() of two descriptions, ignoring NULLs as SQL does."""
+    return b if a is None or (b is not None and b > a) else a
+
+
+class DividendRollup:
+    """
+    Dividend totals keyed by (client, account, ticker, month), kept in memory
+    and updated incrementally as new dividend transactions appear.
+
+    Whole months inside a date range are answered from the monthly buckets;
+    only the (at most two) partly covered edge months look at individual
+    payments. A query therefore costs O(months in range), however long the
+    transaction history grows.
+
+    Freshness uses the same (MAX(id), COUNT(*)) version as PositionsSnapshot.
+    When it moves, only rows with id above the last one seen are read; if the
+    row count shows that rows were also deleted, the rollup is rebuilt.
+    """
+
+    def __init__(self):
+        self._lock     = threading.Lock()
+        self._version  = None
+        self._by_month: dict[str, dict[tuple, list]] = {}   # "YYYY-MM" -> (client, account, ticker) -> [total, count, MAX(description)]
+        self._payments: dict[str, list[tuple]]       = {}   # "YYYY-MM" -> [(date, client, account, ticker, value, description)]
+
+    def _refresh(self, cur) -> None:
+        cur.execute("SELECT MAX(id) AS max_id, COUNT(*) AS n FROM hl_transactions")
+        row     = cur.fetchone()
+        version = (row["max_id"], row["n"])
+        if version == self._version:
+            return
+
+        if self._version is None:
+            new_rows = None
+        else:
+            last_id, last_n = self._version
+            cur.execute("""
+                SELECT id, type, trade_date, client_name, account_type, ticker, description, value_gbp
+                FROM hl_transactions
+                WHERE id > %s
+            """, [last_id or 0])
+            new_rows = cur.fetchall()
+            if last_n + len(new_rows) != version[1]:
+                new_rows = None         # rows were deleted too — start again
+
+        if new_rows is None:
+            self._by_month, self._payments = {}, {}
+            cur.execute("""
+                SELECT id, type, trade_date, client_name, account_type, ticker, description, value_gbp
+                FROM hl_transactions
+                WHERE type = 'Dividend'
+            """)
+            new_rows = cur.fetchall()
+
+        for r in new_rows:
+            if r["type"] == "Dividend":
+                self._add(r)
+        self._version = version
+
+    def _add(self, r: dict) -> None:
+        month  = r["trade_date"].strftime("%Y-%m")
+        key    = (r["client_name"], r["account_type"], r["ticker"])
+        value  = float(r["value_gbp"] or 0)
+        desc   = r["description"]
+        bucket = self._by_month.setdefault(month, {}).setdefault(key, [0.0, 0, None])
+        bucket[0] += value
+        bucket[1] += 1
+        bucket[2]  = max_description(bucket[2], desc)
+        self._payments.setdefault(month, []).append((r["trade_date"], *key, value, desc))
+
+    def summarise(
+        self,
+        cur,
+        client: Optional[str],
+        account: Optional[str],
+        date_from: dt.date,
+        date_to: dt.date,
+    ) -> dict:
+        """
+        Totals for the filters and inclusive date range, grouped every way the
+        tool can report: {"total": [gbp, n], "ticker": {...}, "month": {...}, "year": {...}},
+        plus each ticker's MAX(description) over the same payments.
+        """
+        with self._lock:
+            self._refresh(cur)
+            groups       = {"ticker": {}, "month": {}, "year": {}}
+            total        = [0.0, 0]
+            descriptions = {}
+
+            def add(ticker: str, month: str, value: float, count: int, desc: Optional[str]) -> None:
+                for group, key in (("ticker", ticker), ("month", month), ("year", month[:4])):
+                    acc = groups[group].setdefault(key, [0.0, 0])
+                    acc[0] += value
+                    acc[1] += count
+                total[0] += value
+                total[1] += count
+                descriptions[ticker] = max_description(descriptions.get(ticker), desc)
+
+            for start in month_starts(date_from, date_to):
+                month = start.strftime("%Y-%m")
+                end   = (start + dt.timedelta(days=32)).replace(day=1) - dt.timedelta(days=1)
+                if start >= date_from and end <= date_to:
+                    for (c_name, acct, ticker), (value, count, desc) in self._by_month.get(month, {}).items():
+                        if (not client or c_name == client) and (not account or acct == account):
+                            add(ticker, month, value, count, desc)
+                else:
+                    for trade_date, c_name, acct, ticker, value, desc in self._payments.get(month, ()):
+                        if (date_from <= trade_date <= date_to
+                                and (not client or c_name == client) and (not account or acct == account)):
+                            add(ticker, month, value, 1, desc)
+
+            return {"total": total, "descriptions": descriptions, **groups}
+
+
+DIVIDENDS = DividendRollup()
+
+
+# ── Return series ─────────────────────────────────────────────────────────────
+
+class ReturnSeries:
+    """
+    Whole-history daily values, aligned deposits/withdrawals and the
+    time-weighted growth index for one client/account filter. Any period or
+    rolling window is then a few index lookups (performance.period_return).
+    """
+
+    def __init__(self, value_rows: list[dict], flow_rows: list[dict]):
+        self.dates  = performance.as_dates(r["trade_date"] for r in value_rows)
+        self.values = np.array([float(r["total"] or 0) for r in value_rows])
+        self.flows  = performance.align_flows(
+            self.dates,
+            performance.as_dates(r["trade_date"] for r in flow_rows),
+            np.array([float(r["net"] or 0) for r in flow_rows]),
+        )
+        self.index  = performance.twr_index(self.values, self.flows) if len(self.dates) else self.values
+
+
+class ReturnsCache:
+    """
+    ReturnSeries per (client, account) filter, reloaded only when the data
+    version moves: (MAX(id), COUNT(*)) of hl_account_values_historical and of
+    hl_transactions, checked in one query per call.
+    """
+
+    def __init__(self):
+        self._lock   = threading.Lock()
+        self._series: dict[tuple, tuple] = {}      # (client, account) -> (version, ReturnSeries)
+        self._loads  = 0
+
+    def get(self, cur, client: Optional[str], account: Optional[str]) -> ReturnSeries:
+        cur.execute("""
+            SELECT (SELECT MAX(id)   FROM hl_account_values_historical) AS v_id,
+                   (SELECT COUNT(*)  FROM hl_account_values_historical) AS v_n,
+                   (SELECT MAX(id)   FROM hl_transactions)              AS t_id,
+                   (SELECT COUNT(*)  FROM hl_transactions)              AS t_n
+        """)
+        row     = cur.fetchone()
+        version = (row["v_id"], row["v_n"], row["t_id"], row["t_n"])
+        key     = (client, account)
+
+        with self._lock:
+            cached = self._series.get(key)
+            if cached and cached[0] == version:
+                return cached[1]
+
+        h_clauses, h_params = conditions(client, account)
+        d_clauses = list(h_clauses) + ["type IN ('Deposit', 'Withdrawal')"]
+        value_rows = fetch_all(cur, f"""
+            SELECT trade_date, SUM(total_value_gbp) AS total
+            FROM hl_account_values_historical
+            {where_from(h_clauses)}
+            GROUP BY trade_date
+            ORDER BY trade_date
+        """, h_params)
+        flow_rows = fetch_all(cur, f"""
+            SELECT trade_date, SUM(value_gbp) AS net
+            FROM hl_transactions
+            {where_from(d_clauses)}
+            GROUP BY trade_date
+        """, h_params)
+        series = ReturnSeries(value_rows, flow_rows)
+
+        with self._lock:
+            self._series[key] = (version, series)
+            self._loads += 1
+        return series
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"series": len(self._series), "loads": self._loads}
+
+
+RETURNS = ReturnsCache()
+
+
+# ── Tools ─────────────────────────────────────────────────────────────────────
+
+@mcp.tool()
+@instrumented(MCP_SLOW_MS)
+async def get_portfolio_summary(
+    client: Optional[str] = None,
+    account_type: Optional[str] = None,
+) -> dict:
+    """
+    Current portfolio value broken down by account.
+
+    Returns holdings value (at latest prices) plus estimated cash balance
+    for each client/account combination, and a grand total in GBP.
+
+    Args:
+        client: Filter by "David" or "Jen". Omit for combined view.
+        account_type: Filter by "SIPP", "ISA", or "Fund & Share". Omit for all.
+    """
+    validate(client, account_type)
+
+    # Positions/cash and latest prices are independent — fetch concurrently
+    snap, price_data = await asyncio.gather(
+        run_db(SNAPSHOT.get),
+        latest_prices(),
+    )
+    cash_map = snap.cash_for(client, account_type)
+
+    # Value every selected account in one pass
+    rows            = snap.rows(client, account_type)
+    price, divisor  = price_data.aligned(snap)
+    account_values  = valuation.account_totals(snap.net_qty[rows], price, divisor)
+    h_totals        = {snap.accounts[i]: val for i, val in zip(rows, account_values.tolist())}
+
+    accounts = []
+    grand    = 0.0
+    for key in sorted(set(h_totals) | set(cash_map)):
+        c_name, acct = key
+        h_val  = round(h_totals.get(key, 0.0), 2)
+        c_val  = round(cash_map.get(key, 0.0),  2)
+        total  = round(h_val + c_val, 2)
+        grand += total
+        accounts.append({
+            "client":       c_name,
+            "account":      acct,
+            "holdings_gbp": h_val,
+            "cash_gbp":     c_val,
+            "total_gbp":    total,
+        })
+
+    return {
+        "accounts":        accounts,
+        "grand_total_gbp": round(grand, 2),
+        "as_of":           dt.date.today().isoformat(),
+    }
+
+
+async def values_as_of(dates: list[str], client: Optional[str], account: Optional[str]) -> list[tuple]:
+    """
+    For each date, (snapshot_date, total) of the most recent snapshot on or
+    before it — or (None, 0.0) if there is none. The snapshot date is the
+    latest one among the matching accounts, and the total sums the accounts
+    with a row on that date, as a MAX(trade_date) subquery would. Answered
+    from the VALUES as-of index; the DB is only touched when a refresh is due.
+    """
+    if VALUES.due():
+        await run_db(VALUES.sync)
+    keys = [(c_name, acct) for c_name, acct in VALUES.keys()
+            if (not client or c_name == client) and (not account or acct == account)]
+    if not keys:
+        return [(None, 0.0)] * len(dates)
+
+    found, totals = VALUES.lookup(keys * len(dates), [d for d in dates for _ in keys])
+    found  = found.reshape(len(dates), len(keys))
+    totals = totals.reshape(len(dates), len(keys))
+    result = []
+    for day_found, day_totals in zip(found, totals):
+        if np.isnat(day_found).all():
+            result.append((None, 0.0))
+            continue
+        latest = day_found[~np.isnat(day_found)].max()
+        result.append((latest.item(), float(np.nansum(np.where(day_found == latest, day_totals, np.nan)))))
+    return result
 
 
 @mcp.tool()
-def get_daily_gain_loss(
+@instrumented(MCP_SLOW_MS)
+async def get_daily_gain_loss(
     client: Optional[str] = None,
     account_type: Optional[str] = None,
 ) -> dict:
@@ -241,7 +903,8 @@ def get_daily_gain_loss(
     (falls back to Friday if yesterday was a weekend/holiday).
 
     Any deposits or withdrawals made today are excluded so they don't inflate
-    or deflate the gain/loss figure.
+    or deflate the gain/loss figure. Like the snapshots it is compared with,
+    today's value takes foreign-currency prices as quoted, without FX conversion.
 
     Args:
         client: Filter by "David" or "Jen". Omit for combined view.
@@ -251,102 +914,56 @@ def get_daily_gain_loss(
     today     = dt.date.today()
     yesterday = today - dt.timedelta(days=1)
 
-    conn = db_conn()
-    cur  = conn.cursor(dictionary=True)
-    try:
-        f_clauses, f_params = conditions(client, account_type, alias="t")
-        c_clauses, c_params = conditions(client, account_type)
-
-        # ── Today's value (live prices) ──────────────────────────────────────
-        cur.execute(f"""
-            SELECT t.client_name, t.account_type, t.ticker,
-                   SUM(CASE WHEN t.type = 'Buy' THEN t.quantity ELSE -t.quantity END) AS net_qty
-            FROM hl_transactions t
-            WHERE t.type IN ('Buy', 'Sell')
-            {and_from(f_clauses)}
-            GROUP BY t.client_name, t.account_type, t.ticker
-            HAVING net_qty > 0
-        """, f_params)
-        holdings = cur.fetchall()
-
-        cur.execute("SELECT ticker, price, currency FROM hl_prices_latest")
-        prices = {r["ticker"]: r for r in cur.fetchall()}
-
-        cur.execute(f"""
-            SELECT client_name, account_type,
-                   SUM(CASE
-                       WHEN type IN ('Deposit','Interest','Sell','Dividend','Loyalty Payment') THEN value_gbp
-                       WHEN type IN ('Buy','Withdrawal','Fee') THEN -ABS(value_gbp)
-                       ELSE 0
-                   END) AS cash
-            FROM hl_transactions
-            {where_from(c_clauses)}
-            GROUP BY client_name, account_type
-        """, c_params)
-        cash_map = {(r["client_name"], r["account_type"]): float(r["cash"] or 0)
-                    for r in cur.fetchall()}
-
-        holdings_value = 0.0
-        for h in holdings:
-            ticker = h["ticker"]
-            if ticker in prices:
-                p = prices[ticker]
-                holdings_value += float(h["net_qty"]) * to_gbp(float(p["price"]), p["currency"])
-
-        total_cash = sum(cash_map.values())
-        current_total = holdings_value + total_cash
-
-        # ── Today's deposits/withdrawals (excluded from gain/loss) ───────────
-        d_today_clauses = list(c_clauses) + [
-            "type IN ('Deposit', 'Withdrawal')",
-            "trade_date = %s",
-        ]
-        cur.execute(f"""
+    c_clauses, c_params = conditions(client, account_type)
+    d_today_clauses     = list(c_clauses) + [
+        "type IN ('Deposit', 'Withdrawal')",
+        "trade_date = %s",
+    ]
+
+    # Today's live value, today's deposits and yesterday's snapshot are
+    # independent — fetch them concurrently.
+    snap, price_data, deposit_row, baseline = await asyncio.gather(
+        run_db(SNAPSHOT.get),
+        latest_prices(),
+        query_one(f"""
             SELECT COALESCE(SUM(value_gbp), 0) AS net
             FROM hl_transactions
             {where_from(d_today_clauses)}
-        """, c_params + [today.isoformat()])
-        today_deposits = float(cur.fetchone()["net"] or 0)
+        """, c_params + [today.isoformat()]),
+        values_as_of([yesterday.isoformat()], client, account_type),
+    )
+    baseline_date, baseline_total = baseline[0]
 
-        # ── Yesterday's value (most recent snapshot on or before yesterday) ──
-        cur.execute(f"""
-            SELECT MAX(trade_date) AS latest
-            FROM hl_account_values_historical
-            WHERE trade_date <= %s
-            {and_from(c_clauses)}
-        """, [yesterday.isoformat()] + c_params)
-        row = cur.fetchone()
-        baseline_date = row["latest"] if row else None
-
-        baseline_total = 0.0
-        if baseline_date:
-            cur.execute(f"""
-                SELECT SUM(total_value_gbp) AS total
-                FROM hl_account_values_historical
-                WHERE trade_date = %s
-                {and_from(c_clauses)}
-            """, [baseline_date] + c_params)
-            baseline_total = float(cur.fetchone()["total"] or 0)
-
-        gain_loss = (current_total - today_deposits) - baseline_total
-        pct       = (gain_loss / baseline_total * 100) if baseline_total else 0.0
+    # ── Today's value (live prices) ──────────────────────────────────────────
+    cash_map = snap.cash_for(client, account_type)
 
-        return {
-            "current_value_gbp":   round(current_total, 2),
-            "baseline_value_gbp":  round(baseline_total, 2),
-            "baseline_date":       baseline_date.isoformat() if baseline_date else None,
-            "today_deposits_gbp":  round(today_deposits, 2),
-            "gain_loss_gbp":       round(gain_loss, 2),
-            "gain_loss_pct":       round(pct, 4),
-            "as_of":               today.isoformat(),
-        }
-    finally:
-        cur.close()
-        conn.close()
+    price, divisor = price_data.aligned(snap, convert=False)     # same basis as the snapshot
+    rows           = snap.rows(client, account_type)
+    holdings_value = float(valuation.account_totals(snap.net_qty[rows], price, divisor).sum())
+
+    total_cash    = sum(cash_map.values())
+    current_total = holdings_value + total_cash
+
+    # ── Today's deposits/withdrawals (excluded from gain/loss) ───────────────
+    today_deposits = float(deposit_row["net"] or 0)
+
+    gain_loss = (current_total - today_deposits) - baseline_total
+    pct       = (gain_loss / baseline_total * 100) if baseline_total else 0.0
+
+    return {
+        "current_value_gbp":   round(current_total, 2),
+        "baseline_value_gbp":  round(baseline_total, 2),
+        "baseline_date":       baseline_date.isoformat() if baseline_date else None,
+        "today_deposits_gbp":  round(today_deposits, 2),
+        "gain_loss_gbp":       round(gain_loss, 2),
+        "gain_loss_pct":       round(pct, 4),
+        "as_of":               today.isoformat(),
+    }
 
 
 @mcp.tool()
-def get_holdings(
+@instrumented(MCP_SLOW_MS)
+async def get_holdings(
     client: Optional[str] = None,
     account_type: Optional[str] = None,
 ) -> dict:
@@ -362,94 +979,77 @@ def get_holdings(
         account_type: Filter by "SIPP", "ISA", or "Fund & Share". Omit for all.
     """
     validate(client, account_type)
-    conn = db_conn()
-    cur  = conn.cursor(dictionary=True)
-    try:
-        f_clauses, f_params = conditions(client, account_type, alias="t")
-
-        cur.execute(f"""
-            SELECT
-                t.client_name,
-                t.account_type,
-                t.ticker,
-                MAX(t.description)                                                        AS description,
-                SUM(CASE WHEN t.type = 'Buy' THEN t.quantity  ELSE 0            END)     AS total_bought_qty,
-                SUM(CASE WHEN t.type = 'Buy' THEN t.quantity  ELSE -t.quantity  END)     AS net_qty,
-                SUM(CASE WHEN t.type = 'Buy' THEN t.value_gbp ELSE 0            END)     AS total_cost_gbp,
-                s.target_allocation,
-                p.price     AS latest_price,
-                p.currency,
-                y.dividend_yield
-            FROM hl_transactions t
-            LEFT JOIN hl_ticker_symbols s ON t.ticker COLLATE utf8mb4_unicode_ci = s.ticker COLLATE utf8mb4_unicode_ci
-            LEFT JOIN hl_prices_latest  p ON t.ticker COLLATE utf8mb4_unicode_ci = p.ticker COLLATE utf8mb4_unicode_ci
-            LEFT JOIN hl_yield_latest   y ON t.ticker COLLATE utf8mb4_unicode_ci = y.ticker COLLATE utf8mb4_unicode_ci
-            WHERE t.type IN ('Buy', 'Sell')
-            {and_from(f_clauses)}
-            GROUP BY t.client_name, t.account_type, t.ticker,
-                     s.target_allocation, p.price, p.currency, y.dividend_yield
-            HAVING net_qty > 0
-            ORDER BY t.client_name, t.account_type, t.ticker
-        """, f_params)
-        rows = cur.fetchall()
-
-        holdings     = []
-        total_value  = 0.0
-        total_cost   = 0.0
 
-        for r in rows:
-            net_qty       = float(r["net_qty"])
-            total_bought  = float(r["total_bought_qty"] or 0)
-            cost_gbp      = float(r["total_cost_gbp"]   or 0)
-            avg_cost      = cost_gbp / total_bought if total_bought else 0.0
-
-            raw_price     = float(r["latest_price"]) if r["latest_price"] is not None else None
-            currency      = r["currency"] or "GBP"
-            price_gbp     = to_gbp(raw_price, currency) if raw_price is not None else None
-
-            current_value = net_qty * price_gbp  if price_gbp  is not None else None
-            cost_basis    = net_qty * avg_cost
-
-            if current_value is not None:
-                unreal_gbp = round(current_value - cost_basis, 2)
-                unreal_pct = round(unreal_gbp / cost_basis * 100, 2) if cost_basis > 0 else None
-                total_value += current_value
-            else:
-                unreal_gbp = unreal_pct = None
-
-            total_cost += cost_basis
-
-            holdings.append({
-                "client":               r["client_name"],
-                "account":              r["account_type"],
-                "ticker":               r["ticker"],
-                "description":          r["description"],
-                "quantity":             round(net_qty, 4),
-                "avg_cost_gbp":         round(avg_cost, 4),
-                "latest_price":         round(raw_price, 4) if raw_price is not None else None,
-                "price_currency":       currency,
-                "current_value_gbp":    round(current_value, 2) if current_value is not None else None,
-                "cost_basis_gbp":       round(cost_basis, 2),
-                "unrealised_gain_gbp":  unreal_gbp,
-                "unrealised_gain_pct":  unreal_pct,
-                "allocation":           r["target_allocation"],
-                "dividend_yield_pct":   round(float(r["dividend_yield"]), 2) if r["dividend_yield"] else None,
-            })
-
-        return {
-            "holdings":                 holdings,
-            "total_current_value_gbp":  round(total_value, 2),
-            "total_cost_basis_gbp":     round(total_cost,  2),
-            "total_unrealised_gain_gbp": round(total_value - total_cost, 2),
-            "as_of":                    dt.date.today().isoformat(),
-        }
-    finally:
-        cur.close()
-        conn.close()
+    snap, price_data, alloc_rows, yield_rows = await asyncio.gather(
+        run_db(SNAPSHOT.get),
+        latest_prices(),
+        query("SELECT ticker, target_allocation FROM hl_ticker_symbols"),
+        query("SELECT ticker, dividend_yield FROM hl_yield_latest"),
+    )
+    prices      = price_data.rows
+    allocations = {r["ticker"]: r["target_allocation"] for r in alloc_rows}
+    yields      = {r["ticker"]: r["dividend_yield"] for r in yield_rows}
+
+    # Vectorised per-position figures for the selected accounts
+    rows        = snap.rows(client, account_type)
+    net_qty     = snap.net_qty[rows]
+    bought      = snap.bought_qty[rows]
+    avg_cost    = np.divide(snap.cost_gbp[rows], bought, out=np.zeros_like(bought), where=bought != 0)
+    cost_basis  = net_qty * avg_cost
+    price, divisor = price_data.aligned(snap)
+    unit        = valuation.unit_values(price, divisor)
+    values      = net_qty * unit                 # NaN where unpriced
+    held        = net_qty > 0
+
+    total_value = float(np.nansum(np.where(held, values, np.nan)))
+    total_cost  = float(cost_basis[held].sum())
+
+    holdings = []
+    for r, j in np.argwhere(held).tolist():
+        i       = rows[r]
+        ticker  = snap.tickers[j]
+        c_name, acct = snap.accounts[i]
+        p        = prices.get(ticker)
+        currency = (p["currency"] if p else None) or "GBP"
+        basis    = float(cost_basis[r, j])
+
+        if np.isnan(unit[j]):
+            raw_price = current_value = unreal_gbp = unreal_pct = None
+        else:
+            raw_price     = float(price[j])
+            current_value = float(values[r, j])
+            unreal_gbp    = round(current_value - basis, 2)
+            unreal_pct    = round(unreal_gbp / basis * 100, 2) if basis > 0 else None
+
+        holdings.append({
+            "client":               c_name,
+            "account":              acct,
+            "ticker":               ticker,
+            "description":          snap.descriptions.get((i, j)),
+            "quantity":             round(float(net_qty[r, j]), 4),
+            "avg_cost_gbp":         round(float(avg_cost[r, j]), 4),
+            "latest_price":         round(raw_price, 4) if raw_price is not None else None,
+            "price_currency":       currency,
+            "current_value_gbp":    round(current_value, 2) if current_value is not None else None,
+            "cost_basis_gbp":       round(basis, 2),
+            "unrealised_gain_gbp":  unreal_gbp,
+            "unrealised_gain_pct":  unreal_pct,
+            "allocation":           allocations.get(ticker),
+            "dividend_yield_pct":   round(float(yields[ticker]), 2) if yields.get(ticker) else None,
+        })
+
+    return {
+        "holdings":                 holdings,
+        "total_current_value_gbp":  round(total_value, 2),
+        "total_cost_basis_gbp":     round(total_cost,  2),
+        "total_unrealised_gain_gbp": round(total_value - total_cost, 2),
+        "as_of":                    dt.date.today().isoformat(),
+    }
 
 
 @mcp.tool()
-def get_account_performance(
+@instrumented(MCP_SLOW_MS)
+async def get_account_performance(
     client: Optional[str] = None,
     account_type: Optional[str] = None,
     date_from: Optional[str] = None,
@@ -473,68 +1073,265 @@ def get_account_performance(
     date_from      = date_from or tax_year_start.isoformat()
     date_to        = date_to   or today.isoformat()
 
-    conn = db_conn()
-    cur  = conn.cursor(dictionary=True)
-    try:
-        h_clauses, h_params = conditions(client, account_type)
-
-        def value_at(date: str) -> float:
-            """Portfolio value on the most recent date with data on or before `date`."""
-            cur.execute(f"""
-                SELECT MAX(trade_date) AS latest
-                FROM hl_account_values_historical
-                WHERE trade_date <= %s
-                {and_from(h_clauses)}
-            """, [date] + h_params)
-            row = cur.fetchone()
-            latest = row["latest"] if row else None
-            if not latest:
-                return 0.0
-            cur.execute(f"""
-                SELECT SUM(total_value_gbp) AS total
-                FROM hl_account_values_historical
-                WHERE trade_date = %s
-                {and_from(h_clauses)}
-            """, [latest] + h_params)
-            row = cur.fetchone()
-            return float(row["total"] or 0)
-
-        start_value = value_at(date_from)
-        end_value   = value_at(date_to)
-
-        # Net deposits/withdrawals strictly within the period
-        d_clauses = list(h_clauses) + [
-            "type IN ('Deposit', 'Withdrawal')",
-            "trade_date > %s",
-            "trade_date <= %s",
-        ]
-        cur.execute(f"""
+    h_clauses, h_params = conditions(client, account_type)
+
+    # Net deposits/withdrawals strictly within the period
+    d_clauses = list(h_clauses) + [
+        "type IN ('Deposit', 'Withdrawal')",
+        "trade_date > %s",
+        "trade_date <= %s",
+    ]
+
+    ((_, start_value), (_, end_value)), row = await asyncio.gather(
+        values_as_of([date_from, date_to], client, account_type),
+        query_one(f"""
             SELECT SUM(value_gbp) AS net_deposits
             FROM hl_transactions
             {where_from(d_clauses)}
-        """, h_params + [date_from, date_to])
-        row          = cur.fetchone()
-        net_deposits = float(row["net_deposits"] or 0)
+        """, h_params + [date_from, date_to]),
+    )
+    net_deposits = float(row["net_deposits"] or 0)
 
-        gain_loss     = end_value - start_value - net_deposits
-        gain_loss_pct = round(gain_loss / start_value * 100, 2) if start_value > 0 else None
+    gain_loss     = end_value - start_value - net_deposits
+    gain_loss_pct = round(gain_loss / start_value * 100, 2) if start_value > 0 else None
 
-        return {
-            "date_from":        date_from,
-            "date_to":          date_to,
-            "start_value_gbp":  round(start_value,  2),
-            "end_value_gbp":    round(end_value,    2),
-            "net_deposits_gbp": round(net_deposits, 2),
-            "gain_loss_gbp":    round(gain_loss,    2),
-            "gain_loss_pct":    gain_loss_pct,
-        }
-    finally:
-        cur.close()
-        conn.close()
+    return {
+        "date_from":        date_from,
+        "date_to":          date_to,
+        "start_value_gbp":  round(start_value,  2),
+        "end_value_gbp":    round(end_value,    2),
+        "net_deposits_gbp": round(net_deposits, 2),
+        "gain_loss_gbp":    round(gain_loss,    2),
+        "gain_loss_pct":    gain_loss_pct,
+    }
 
 
 @mcp.tool()
-def get_transactions(
+@instrumented(MCP_SLOW_MS)
+async def get_performance_series(
+    client: Optional[str] = None,
+    account_type: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    interval: str = "month",
+) -> dict:
+    """
+    Portfolio value and deposit-adjusted gain/loss for every day, month or year
+    in a date range, from stored daily valuations — one call instead of one
+    get_account_performance call per period.
+
+    Each period's gain is its closing value minus the previous period's closing
+    value minus net deposits/withdrawals made during the period. Days after the
+    last stored valuation (e.g. today, before the nightly snapshot runs) are
+    valued from transactions and prices on the fly; "computed_from" gives the
+    first such day.
+
+    Args:
+        client: Filter by "David" or "Jen". Omit for combined view.
+        account_type: Filter by "SIPP", "ISA", or "Fund & Share". Omit for all.
+        date_from: Start of range (YYYY-MM-DD). Defaults to start of current UK tax year.
+        date_to: End of range (YYYY-MM-DD). Defaults to today.
+        interval: "day", "month" (default) or "year".
+    """
+    validate(client, account_type)
+    if interval not in performance.INTERVAL_UNITS:
+        raise ValueError("interval must be 'day', 'month' or 'year'")
+    today          = dt.date.today()
+    tax_year_start = dt.date(today.year if today.month >= 4 else today.year - 1, 4, 6)
+    date_from      = date_from or tax_year_start.isoformat()
+    date_to        = date_to   or today.isoformat()
+
+    h_clauses, h_params = conditions(client, account_type)
+    d_clauses = list(h_clauses) + [
+        "type IN ('Deposit', 'Withdrawal')",
+        "trade_date > %s",
+        "trade_date <= %s",
+    ]
+
+    # One scan of the snapshots from the as-of baseline to date_to, plus the
+    # day-level deposit totals, fetched concurrently.
+    value_rows, flow_rows = await asyncio.gather(
+        query(f"""
+            SELECT trade_date, SUM(total_value_gbp) AS total
+            FROM hl_account_values_historical
+            WHERE trade_date >= COALESCE((
+                      SELECT MAX(trade_date)
+                      FROM hl_account_values_historical
+                      WHERE trade_date <= %s
+                      {and_from(h_clauses)}
+                  ), %s)
+              AND trade_date <= %s
+              {and_from(h_clauses)}
+            GROUP BY trade_date
+            ORDER BY trade_date
+        """, [date_from] + h_params + [date_from, date_to] + h_params),
+        query(f"""
+            SELECT trade_date, SUM(value_gbp) AS net
+            FROM hl_transactions
+            {where_from(d_clauses)}
+            GROUP BY trade_date
+        """, h_params + [date_from, date_to]),
+    )
+
+    dates  = performance.as_dates(r["trade_date"] for r in value_rows)
+    values = np.array([float(r["total"] or 0) for r in value_rows])
+
+    # Fill in the days the nightly snapshot hasn't written yet
+    last_day = min(dt.date.fromisoformat(date_to), today)
+    gap_from = dates[-1].item() + dt.timedelta(days=1) if len(dates) else dt.date.fromisoformat(date_from)
+    computed_from = None
+    if gap_from <= last_day:
+        gap_dates, gap_values = await run_db(
+            unsnapshotted_values, snapshot_accounts(client, account_type), gap_from, last_day,
+        )
+        dates  = np.concatenate([dates, gap_dates])
+        values = np.concatenate([values, gap_values])
+        computed_from = gap_from.isoformat()
+
+    series = performance.period_series(
+        dates,
+        values,
+        performance.as_dates(r["trade_date"] for r in flow_rows),
+        np.array([float(r["net"] or 0) for r in flow_rows]),
+        interval,
+    )
+
+    return {
+        "date_from":           date_from,
+        "date_to":             date_to,
+        "interval":            interval,
+        "start_date":          str(dates[0]) if len(dates) else None,
+        "start_value_gbp":     round(float(values[0]), 2) if len(values) else 0.0,
+        "computed_from":       computed_from,
+        "series":              series,
+        "total_gain_loss_gbp": series[-1]["cumulative_gain_gbp"] if series else 0.0,
+    }
+
+
+def snapshot_accounts(client: Optional[str], account: Optional[str]) -> list[tuple[str, str]]:
+    """The (client, account) pairs the snapshots hold that match the filters."""
+    return [(c, a) for c, a in account_snapshots.ACCOUNTS
+            if (not client or c == client) and (not account or a == account)]
+
+
+def unsnapshotted_values(cur, accounts: list, first: dt.date, last: dt.date) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (dates, summed total value) for every day from first to last, computed
+    by the snapshot engine the nightly job uses, rounded per account as the
+    stored rows are.
+    """
+    engine = account_snapshots.SnapshotEngine.load(cur, accounts, until=last)
+    v = engine.values(account_snapshots.date_range(first, last))
+    return v["dates"], np.round(v["total"], 2).sum(axis=1)
+
+
+@mcp.tool()
+@instrumented(MCP_SLOW_MS)
+async def get_returns(
+    client: Optional[str] = None,
+    account_type: Optional[str] = None,
+    periods: Optional[list[str]] = None,
+    date_to: Optional[str] = None,
+    rolling: Optional[str] = None,
+) -> dict:
+    """
+    Time-weighted (TWR) and money-weighted (MWR / XIRR) returns for several
+    periods at once, from stored daily valuations and deposits/withdrawals.
+
+    TWR chains daily returns so the timing of deposits and withdrawals does not
+    affect it — use it to judge the investments. MWR is the internal rate of
+    return of the actual cash flows — what the investor earned given when money
+    went in and out. Both are annualised for periods of a year or more.
+
+    Args:
+        client: Filter by "David" or "Jen". Omit for combined view.
+        account_type: Filter by "SIPP", "ISA", or "Fund & Share". Omit for all.
+        periods: Any of "1M", "3M", "6M", "YTD", "TAX_YEAR", "1Y", "3Y", "5Y",
+            "INCEPTION", or "YYYY-MM-DD:YYYY-MM-DD". Defaults to all named periods.
+            A period reaching back before the first valuation runs from that
+            valuation and is marked "clamped"; one with no data has a null start_date.
+        date_to: End date for the named periods (YYYY-MM-DD). Defaults to the latest valuation.
+        rolling: Optional trailing window ("1M", "3M", "6M", "12M", "3Y", "5Y") —
+            adds that window's TWR at every month end since inception.
+    """
+    validate(client, account_type)
+    periods = periods or list(performance.PERIODS)
+    series  = await run_db(RETURNS.get, client, account_type)
+    dates   = series.dates
+    if not len(dates):
+        return {"as_of": None, "first_date": None, "periods": [], "rolling": [] if rolling else None}
+
+    end = min(np.datetime64(date_to, "D"), dates[-1]) if date_to else dates[-1]
+    results = []
+    for period in periods:
+        start, stop = performance.period_bounds(period, end, dates[0])
+        result = performance.period_return(dates, series.values, series.flows, series.index, start, stop)
+        results.append({"period": period, **(result or {"start_date": None, "end_date": None})})
+
+    return {
+        "as_of":      str(end),
+        "first_date": str(dates[0]),
+        "periods":    results,
+        "rolling":    performance.rolling_twr(dates, series.index, rolling, dates[0], end) if rolling else None,
+    }
+
+
+def encode_cursor(trade_date, row_id: int) -> str:
+    """Opaque pagination cursor for the (trade_date, id) of the last row on a page."""
+    raw = f"{trade_date.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple[str, int]:
+    """Inverse of encode_cursor(); raises ValueError for anything it didn't produce."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        date_part, id_part = raw.split("|")
+        return dt.date.fromisoformat(date_part).isoformat(), int(id_part)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("cursor is not a valid next_cursor value") from None
+
+
+def format_transaction(r: dict) -> dict:
+    return {
+        "date":            r["trade_date"].isoformat() if hasattr(r["trade_date"], "isoformat") else str(r["trade_date"]),
+        "client":          r["client_name"],
+        "account":         r["account_type"],
+        "type":            r["type"],
+        "ticker":          r["ticker"],
+        "description":     r["description"],
+        "quantity":        float(r["quantity"])        if r["quantity"]        is not None else None,
+        "price_per_share": float(r["price_per_share"]) if r["price_per_share"] is not None else None,
+        "value_gbp":       float(r["value_gbp"])       if r["value_gbp"]       is not None else None,
+    }
+
+
+def stream_page(cur, sql: str, params: list, limit: int) -> tuple[list[dict], Optional[str]]:
+    """
+    Read up to `limit` transactions from an unbuffered (server-side) cursor in
+    small batches, formatting each row as it arrives so memory stays O(page).
+    The query must select one extra row: if it arrives, the page is full and a
+    next_cursor is returned for the last row kept.
+    """
+    cur.execute(sql, params)
+    page, last, more = [], None, False
+    while True:
+        batch = cur.fetchmany(100)
+        if not batch:
+            break
+        for r in batch:
+            if len(page) == limit:
+                more = True         # the look-ahead row; keep draining the result
+                continue
+            page.append(format_transaction(r))
+            last = r
+    next_cursor = encode_cursor(last["trade_date"], last["id"]) if more else None
+    return page, next_cursor
+
+
+@mcp.tool()
+@instrumented(MCP_SLOW_MS)
+async def get_transactions(
     client: Optional[str] = None,
     account_type: Optional[str] = None,
     ticker: Optional[str] = None,
@@ -542,9 +1339,14 @@ def get_transactions(
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
     limit: int = 50,
+    cursor: Optional[str] = None,
 ) -> dict:
     """
-    Filterable transaction history.
+    Filterable transaction history, newest first, one page at a time.
+
+    To walk further back, call again with the same filters and pass the
+    previous response's `next_cursor` as `cursor`. `next_cursor` is null on
+    the last page.
 
     Args:
         client: Filter by "David" or "Jen". Omit for both.
@@ -554,65 +1356,53 @@ def get_transactions(
                           "Withdrawal", "Interest", "Fee", etc.
         date_from: Earliest trade date (YYYY-MM-DD). Omit for no lower bound.
         date_to: Latest trade date (YYYY-MM-DD). Omit for today.
-        limit: Maximum rows to return (default 50, max 500).
+        limit: Maximum rows per page (default 50, max 500).
+        cursor: next_cursor from the previous page. Omit for the first page.
     """
     validate(client, account_type)
     limit = min(max(1, limit), 500)
 
-    conn = db_conn()
-    cur  = conn.cursor(dictionary=True)
-    try:
-        clauses, params = conditions(client, account_type)
-
-        if ticker:
-            clauses.append("ticker = %s")
-            params.append(ticker.upper())
-        if transaction_type:
-            clauses.append("type = %s")
-            params.append(transaction_type)
-        if date_from:
-            clauses.append("trade_date >= %s")
-            params.append(date_from)
-        if date_to:
-            clauses.append("trade_date <= %s")
-            params.append(date_to)
-
-        cur.execute(f"""
-            SELECT trade_date, client_name, account_type, type,
-                   ticker, description, quantity, price_per_share, value_gbp
-            FROM hl_transactions
-            {where_from(clauses)}
-            ORDER BY trade_date DESC, id DESC
-            LIMIT %s
-        """, params + [limit])
-
-        rows = cur.fetchall()
-        transactions = []
-        for r in rows:
-            transactions.append({
-                "date":            r["trade_date"].isoformat() if hasattr(r["trade_date"], "isoformat") else str(r["trade_date"]),
-                "client":          r["client_name"],
-                "account":         r["account_type"],
-                "type":            r["type"],
-                "ticker":          r["ticker"],
-                "description":     r["description"],
-                "quantity":        float(r["quantity"])        if r["quantity"]        is not None else None,
-                "price_per_share": float(r["price_per_share"]) if r["price_per_share"] is not None else None,
-                "value_gbp":       float(r["value_gbp"])       if r["value_gbp"]       is not None else None,
-            })
-
-        return {
-            "transactions": transactions,
-            "count":        len(transactions),
-            "limit_applied": limit,
-        }
-    finally:
-        cur.close()
-        conn.close()
+    clauses, params = conditions(client, account_type)
+
+    if ticker:
+        clauses.append("ticker = %s")
+        params.append(ticker.upper())
+    if transaction_type:
+        clauses.append("type = %s")
+        params.append(transaction_type)
+    if date_from:
+        clauses.append("trade_date >= %s")
+        params.append(date_from)
+    if date_to:
+        clauses.append("trade_date <= %s")
+        params.append(date_to)
+    if cursor:
+        # Keyset: resume strictly after the last (trade_date, id) returned, so
+        # each page is an index range scan rather than an OFFSET skip.
+        after_date, after_id = decode_cursor(cursor)
+        clauses.append("(trade_date < %s OR (trade_date = %s AND id < %s))")
+        params += [after_date, after_date, after_id]
+
+    transactions, next_cursor = await run_db(stream_page, f"""
+        SELECT id, trade_date, client_name, account_type, type,
+               ticker, description, quantity, price_per_share, value_gbp
+        FROM hl_transactions
+        {where_from(clauses)}
+        ORDER BY trade_date DESC, id DESC
+        LIMIT %s
+    """, params + [limit + 1], limit)
+
+    return {
+        "transactions":  transactions,
+        "count":         len(transactions),
+        "limit_applied": limit,
+        "next_cursor":   next_cursor,
+    }
 
 
 @mcp.tool()
-def get_dividend_income(
+@instrumented(MCP_SLOW_MS)
+async def get_dividend_income(
     client: Optional[str] = None,
     account_type: Optional[str] = None,
     date_from: Optional[str] = None,
@@ -640,90 +1430,57 @@ def get_dividend_income(
     if group_by is not None and group_by not in ("ticker", "month", "year"):
         raise ValueError("group_by must be 'ticker', 'month', 'year', or omitted")
 
-    conn = db_conn()
-    cur  = conn.cursor(dictionary=True)
-    try:
-        clauses, params = conditions(client, account_type)
-        clauses += ["type = 'Dividend'", "trade_date >= %s", "trade_date <= %s"]
-        params  += [date_from, date_to]
-        wh       = where_from(clauses)
-
-        if group_by == "ticker":
-            cur.execute(f"""
-                SELECT ticker, MAX(description) AS description,
-                       SUM(value_gbp) AS total_gbp, COUNT(*) AS payments
-                FROM hl_transactions {wh}
-                GROUP BY ticker
-                ORDER BY total_gbp DESC
-            """, params)
-            breakdown = [
-                {
-                    "ticker":      r["ticker"],
-                    "description": r["description"],
-                    "total_gbp":   round(float(r["total_gbp"]), 2),
-                    "payments":    r["payments"],
-                }
-                for r in cur.fetchall()
-            ]
-        elif group_by == "month":
-            cur.execute(f"""
-                SELECT DATE_FORMAT(trade_date, '%Y-%m') AS month,
-                       SUM(value_gbp) AS total_gbp, COUNT(*) AS payments
-                FROM hl_transactions {wh}
-                GROUP BY month
-                ORDER BY month
-            """, params)
-            breakdown = [
-                {
-                    "month":     r["month"],
-                    "total_gbp": round(float(r["total_gbp"]), 2),
-                    "payments":  r["payments"],
-                }
-                for r in cur.fetchall()
-            ]
-        elif group_by == "year":
-            cur.execute(f"""
-                SELECT YEAR(trade_date) AS year,
-                       SUM(value_gbp) AS total_gbp, COUNT(*) AS payments
-                FROM hl_transactions {wh}
-                GROUP BY year
-                ORDER BY year
-            """, params)
-            breakdown = [
-                {
-                    "year":      int(r["year"]),
-                    "total_gbp": round(float(r["total_gbp"]), 2),
-                    "payments":  r["payments"],
-                }
-                for r in cur.fetchall()
-            ]
-        else:
-            breakdown = None
-
-        # Grand total
-        cur.execute(f"""
-            SELECT SUM(value_gbp) AS total_gbp, COUNT(*) AS payments
-            FROM hl_transactions {wh}
-        """, params)
-        row = cur.fetchone()
-
-        result = {
-            "date_from":  date_from,
-            "date_to":    date_to,
-            "total_gbp":  round(float(row["total_gbp"] or 0), 2),
-            "payments":   int(row["payments"] or 0),
-        }
-        if breakdown is not None:
-            result["breakdown"] = breakdown
+    rollup = await run_db(
+        DIVIDENDS.summarise, client, account_type,
+        dt.date.fromisoformat(date_from), dt.date.fromisoformat(date_to),
+    )
 
-        return result
-    finally:
-        cur.close()
-        conn.close()
+    if group_by == "ticker":
+        breakdown = [
+            {
+                "ticker":      ticker,
+                "description": rollup["descriptions"].get(ticker),
+                "total_gbp":   round(total, 2),
+                "payments":    count,
+            }
+            for ticker, (total, count) in sorted(rollup["ticker"].items(), key=lambda x: -x[1][0])
+        ]
+    elif group_by == "month":
+        breakdown = [
+            {
+                "month":     month,
+                "total_gbp": round(total, 2),
+                "payments":  count,
+            }
+            for month, (total, count) in sorted(rollup["month"].items())
+        ]
+    elif group_by == "year":
+        breakdown = [
+            {
+                "year":      int(year),
+                "total_gbp": round(total, 2),
+                "payments":  count,
+            }
+            for year, (total, count) in sorted(rollup["year"].items())
+        ]
+    else:
+        breakdown = None
+
+    result = {
+        "date_from":  date_from,
+        "date_to":    date_to,
+        "total_gbp":  round(rollup["total"][0], 2),
+        "payments":   rollup["total"][1],
+    }
+    if breakdown is not None:
+        result["breakdown"] = breakdown
+
+    return result
 
 
 @mcp.tool()
-def get_allocation_breakdown(
+@instrumented(MCP_SLOW_MS)
+async def get_allocation_breakdown(
     client: Optional[str] = None,
     account_type: Optional[str] = None,
 ) -> dict:
@@ -738,64 +1495,65 @@ def get_allocation_breakdown(
         account_type: Filter by "SIPP", "ISA", or "Fund & Share". Omit for all.
     """
     validate(client, account_type)
-    conn = db_conn()
-    cur  = conn.cursor(dictionary=True)
-    try:
-        f_clauses, f_params = conditions(client, account_type, alias="t")
-
-        # Net quantity per ticker (current holdings only)
-        cur.execute(f"""
-            SELECT t.ticker,
-                   SUM(CASE WHEN t.type = 'Buy' THEN t.quantity ELSE -t.quantity END) AS net_qty,
-                   COALESCE(s.target_allocation, 'Unclassified') AS allocation
-            FROM hl_transactions t
-            LEFT JOIN hl_ticker_symbols s ON t.ticker COLLATE utf8mb4_unicode_ci = s.ticker COLLATE utf8mb4_unicode_ci
-            WHERE t.type IN ('Buy', 'Sell')
-            {and_from(f_clauses)}
-            GROUP BY t.ticker, s.target_allocation
-            HAVING net_qty > 0
-        """, f_params)
-        holdings = cur.fetchall()
-
-        # Latest prices
-        cur.execute("SELECT ticker, price, currency FROM hl_prices_latest")
-        prices = {r["ticker"]: r for r in cur.fetchall()}
-
-        # Aggregate by allocation
-        alloc_totals: dict[str, float] = {}
-        grand = 0.0
-        for h in holdings:
-            ticker = h["ticker"]
-            alloc  = h["allocation"] or "Unclassified"
-            if ticker in prices:
-                p   = prices[ticker]
-                val = float(h["net_qty"]) * to_gbp(float(p["price"]), p["currency"])
-                alloc_totals[alloc] = alloc_totals.get(alloc, 0.0) + val
-                grand += val
-
-        breakdown = [
-            {
-                "allocation":   alloc,
-                "value_gbp":    round(val, 2),
-                "percentage":   round(val / grand * 100, 1) if grand > 0 else 0.0,
-            }
-            for alloc, val in sorted(alloc_totals.items(), key=lambda x: -x[1])
-        ]
 
-        return {
-            "breakdown":       breakdown,
-            "total_value_gbp": round(grand, 2),
-            "as_of":           dt.date.today().isoformat(),
+    snap, alloc_rows, price_data = await asyncio.gather(
+        run_db(SNAPSHOT.get),
+        query("SELECT ticker, target_allocation FROM hl_ticker_symbols"),
+        latest_prices(),
+    )
+    allocations = {r["ticker"]: r["target_allocation"] for r in alloc_rows}
+
+    # Net each ticker across the selected accounts, value it, then group by allocation
+    rows           = snap.rows(client, account_type)
+    price, divisor = price_data.aligned(snap)
+    ticker_values  = valuation.ticker_totals(snap.net_qty[rows], price, divisor)
+    labels         = [allocations.get(t) or "Unclassified" for t in snap.tickers]
+    alloc_totals   = {
+        alloc: val
+        for alloc, val in valuation.group_totals(ticker_values, labels).items()
+        if val > 0
+    }
+    grand          = float(ticker_values.sum())
+
+    breakdown = [
+        {
+            "allocation":   alloc,
+            "value_gbp":    round(val, 2),
+            "percentage":   round(val / grand * 100, 1) if grand > 0 else 0.0,
         }
-    finally:
-        cur.close()
-        conn.close()
+        for alloc, val in sorted(alloc_totals.items(), key=lambda x: -x[1])
+    ]
+
+    return {
+        "breakdown":       breakdown,
+        "total_value_gbp": round(grand, 2),
+        "as_of":           dt.date.today().isoformat(),
+    }
+
+
+# ── Server stats ──────────────────────────────────────────────────────────────
+
+@mcp.custom_route("/stats", methods=["GET"])
+async def stats_endpoint(request: Request) -> JSONResponse:
+    """Connection pool, price cache, as-of index and return series usage. Not proxied publicly — query on 127.0.0.1."""
+    return JSONResponse({"pool": POOL.stats(), "prices": PRICES.stats(), "values_index": VALUES.stats(),
+                         "fx_index": FX.stats(), "returns": RETURNS.stats()})
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """Per-tool latency, SQL and error metrics in Prometheus text format (127.0.0.1 only)."""
+    body = metrics.REGISTRY.render({"pool": POOL.stats(), "price_cache": PRICES.stats(),
+                                    "values_index": VALUES.stats(), "fx_index": FX.stats(),
+                                    "returns": RETURNS.stats()})
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
 
 
 # ── Entry point ───────────────────────────────────────────────────────────────
 
 if __name__ == "__main__":
     import uvicorn
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(name)s %(levelname)s %(message)s")
     print(f"Starting Investment Portfolio MCP server on {MCP_HOST}:{MCP_PORT}")
     app = mcp.streamable_http_app()
     uvicorn.run(app, host=MCP_HOST, port=MCP_PORT, log_level="warning")
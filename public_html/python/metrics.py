@@ -0,0 +1,260 @@
+"""
+Tool Metrics
+============
+In-process instrumentation for the MCP server, rendered in the Prometheus
+text exposition format.
+
+Each tool call runs inside a CallStats record held in a context variable.
+run_db() copies the context into its worker thread, so every TimedCursor
+used on behalf of that call adds its statement count, rows fetched and SQL
+time to the same record. When the call finishes, the record is folded into
+the process-wide histograms and counters below.
+"""
+
+import re
+import time
+import logging
+import functools
+import threading
+import contextvars
+from typing import Optional
+
+log = logging.getLogger("mcp_server.slow")
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS   = (0, 1, 2, 3, 5, 10, 20, 50)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label value (not thread-safe; see Registry)."""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.series: dict[str, list] = {}       # label → [bucket counts..., sum, count]
+
+    def observe(self, label: str, value: float) -> None:
+        s = self.series.get(label)
+        if s is None:
+            s = self.series[label] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                s[i] += 1
+        s[-2] += value
+        s[-1] += 1
+
+    def render(self, name: str, label_name: str) -> list[str]:
+        lines = []
+        for label, s in sorted(self.series.items()):
+            tag = f'{label_name}="{escape(label)}"'
+            for bound, n in zip(self.buckets, s):
+                lines.append(f'{name}_bucket{{{tag},le="{bound:g}"}} {n}')
+            lines.append(f'{name}_bucket{{{tag},le="+Inf"}} {s[-1]}')
+            lines.append(f"{name}_sum{{{tag}}} {s[-2]:.6f}")
+            lines.append(f"{name}_count{{{tag}}} {s[-1]}")
+        return lines
+
+
+class CallStats:
+    """Counters for one tool call. Updated from DB worker threads, so locked."""
+
+    __slots__ = ("tool", "queries", "rows", "errors", "sql_time", "statements", "_lock")
+
+    def __init__(self, tool: str, keep_statements: bool):
+        self.tool       = tool
+        self.queries    = 0
+        self.rows       = 0
+        self.errors     = 0
+        self.sql_time   = 0.0
+        self.statements = [] if keep_statements else None
+        self._lock      = threading.Lock()
+
+    def add_query(self, sql: str, params, elapsed: float, failed: bool) -> None:
+        with self._lock:
+            self.queries  += 1
+            self.sql_time += elapsed
+            self.errors   += failed
+            if self.statements is not None:
+                self.statements.append((sql, params, elapsed))
+
+    def add_fetch(self, rows: int, elapsed: float) -> None:
+        with self._lock:
+            self.rows     += rows
+            self.sql_time += elapsed
+
+
+CURRENT_CALL: contextvars.ContextVar[Optional[CallStats]] = contextvars.ContextVar("mcp_call", default=None)
+
+
+class TimedCursor:
+    """
+    Cursor proxy that charges execute/fetch time and fetched rows to the
+    current CallStats. Anything else is passed through to the real cursor.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def execute(self, sql, params=()):
+        stats  = CURRENT_CALL.get()
+        t0     = time.perf_counter()
+        failed = True
+        try:
+            result = self._cursor.execute(sql, params)
+            failed = False
+            return result
+        finally:
+            elapsed = time.perf_counter() - t0
+            if stats is not None:
+                stats.add_query(sql, params, elapsed, failed)
+            else:
+                REGISTRY.untracked_query(elapsed, failed)
+
+    def _fetch(self, method, *args):
+        t0     = time.perf_counter()
+        result = method(*args)
+        stats  = CURRENT_CALL.get()
+        if stats is not None:
+            rows = len(result) if isinstance(result, list) else int(result is not None)
+            stats.add_fetch(rows, time.perf_counter() - t0)
+        return result
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchmany(self, size=1):
+        return self._fetch(self._cursor.fetchmany, size)
+
+
+class Registry:
+    """Process-wide metrics, guarded by one lock."""
+
+    def __init__(self):
+        self._lock        = threading.Lock()
+        self.duration     = Histogram(LATENCY_BUCKETS)
+        self.sql_duration = Histogram(LATENCY_BUCKETS)
+        self.queries      = Histogram(QUERY_BUCKETS)
+        self.calls: dict[tuple[str, str], int] = {}   # (tool, status) → n
+        self.rows:  dict[str, int] = {}
+        self.query_errors: dict[str, int] = {}
+        self.untracked = [0, 0.0, 0]                  # queries, seconds, errors outside a tool call
+
+    def record(self, stats: CallStats, elapsed: float, ok: bool) -> None:
+        status = "ok" if ok else "error"
+        with self._lock:
+            self.duration.observe(stats.tool, elapsed)
+            self.sql_duration.observe(stats.tool, stats.sql_time)
+            self.queries.observe(stats.tool, stats.queries)
+            self.calls[stats.tool, status] = self.calls.get((stats.tool, status), 0) + 1
+            self.rows[stats.tool]         = self.rows.get(stats.tool, 0) + stats.rows
+            self.query_errors[stats.tool] = self.query_errors.get(stats.tool, 0) + stats.errors
+
+    def untracked_query(self, elapsed: float, failed: bool) -> None:
+        with self._lock:
+            self.untracked[0] += 1
+            self.untracked[1] += elapsed
+            self.untracked[2] += failed
+
+    def render(self, gauges: dict[str, dict]) -> str:
+        """
+        Prometheus text for all tool metrics plus `gauges`: {prefix: stats dict},
+        e.g. {"pool": POOL.stats()}. Non-numeric stats values are skipped.
+        """
+        with self._lock:
+            lines = [
+                "# HELP mcp_tool_calls_total Tool calls by outcome.",
+                "# TYPE mcp_tool_calls_total counter",
+            ]
+            for (tool, status), n in sorted(self.calls.items()):
+                lines.append(f'mcp_tool_calls_total{{tool="{escape(tool)}",status="{status}"}} {n}')
+
+            lines += ["# HELP mcp_tool_duration_seconds Wall time per tool call.",
+                      "# TYPE mcp_tool_duration_seconds histogram"]
+            lines += self.duration.render("mcp_tool_duration_seconds", "tool")
+            lines += ["# HELP mcp_tool_sql_seconds Time spent executing and fetching SQL per tool call.",
+                      "# TYPE mcp_tool_sql_seconds histogram"]
+            lines += self.sql_duration.render("mcp_tool_sql_seconds", "tool")
+            lines += ["# HELP mcp_tool_queries SQL statements executed per tool call.",
+                      "# TYPE mcp_tool_queries histogram"]
+            lines += self.queries.render("mcp_tool_queries", "tool")
+
+            lines += ["# HELP mcp_db_rows_fetched_total Rows fetched from MySQL.",
+                      "# TYPE mcp_db_rows_fetched_total counter"]
+            for tool, n in sorted(self.rows.items()):
+                lines.append(f'mcp_db_rows_fetched_total{{tool="{escape(tool)}"}} {n}')
+            lines += ["# HELP mcp_db_query_errors_total SQL statements that raised.",
+                      "# TYPE mcp_db_query_errors_total counter"]
+            for tool, n in sorted(self.query_errors.items()):
+                lines.append(f'mcp_db_query_errors_total{{tool="{escape(tool)}"}} {n}')
+
+            queries, seconds, errors = self.untracked
+            lines += ["# HELP mcp_db_untracked_queries_total SQL statements run outside a tool call.",
+                      "# TYPE mcp_db_untracked_queries_total counter",
+                      f"mcp_db_untracked_queries_total {queries}",
+                      "# HELP mcp_db_untracked_seconds_total Time in SQL statements run outside a tool call.",
+                      "# TYPE mcp_db_untracked_seconds_total counter",
+                      f"mcp_db_untracked_seconds_total {seconds:.6f}",
+                      "# HELP mcp_db_untracked_errors_total SQL statements run outside a tool call that raised.",
+                      "# TYPE mcp_db_untracked_errors_total counter",
+                      f"mcp_db_untracked_errors_total {errors}"]
+
+        for prefix, stats in gauges.items():
+            for key, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"mcp_{prefix}_{key}"
+                lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def instrumented(slow_ms: float = 0):
+    """
+    Decorator for async tools: time the call, attribute its SQL to it and
+    record the outcome. Calls slower than `slow_ms` (0 = never) are logged
+    with every statement they ran.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            stats = CallStats(fn.__name__, keep_statements=slow_ms > 0)
+            token = CURRENT_CALL.set(stats)
+            t0    = time.perf_counter()
+            ok    = False
+            try:
+                result = await fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                elapsed = time.perf_counter() - t0
+                CURRENT_CALL.reset(token)
+                REGISTRY.record(stats, elapsed, ok)
+                if slow_ms and elapsed * 1000 >= slow_ms:
+                    log_slow_call(stats, elapsed, kwargs, ok)
+        return wrapper
+    return decorate
+
+
+def log_slow_call(stats: CallStats, elapsed: float, kwargs: dict, ok: bool) -> None:
+    lines = [f"slow call {stats.tool}({', '.join(f'{k}={v!r}' for k, v in kwargs.items())}) "
+             f"{elapsed * 1000:.1f} ms, sql {stats.sql_time * 1000:.1f} ms, "
+             f"{stats.queries} queries, {stats.rows} rows{'' if ok else ', FAILED'}"]
+    for sql, params, took in stats.statements or ():
+        sql = re.sub(r"\s+", " ", sql).strip()
+        lines.append(f"  {took * 1000:8.1f} ms  {sql}  params={params!r}")
+    log.warning("\n".join(lines))
@@ -0,0 +1,269 @@
+"""
+Performance Series
+==================
+Vectorised gain/loss arithmetic over a daily valuation series.
+
+Inputs are the summed snapshot values from hl_account_values_historical (one
+per snapshot date) and the external cash flows from hl_transactions
+(deposits positive, withdrawals negative). A flow is attributed to the first
+snapshot on or after its trade date, so gain for each step is
+
+    gain[t] = value[t] - value[t-1] - flows[t]
+
+The first point of the series is the baseline: it has no gain of its own and
+only provides the opening value for the first period.
+
+Returns use the same alignment: chaining (value[t] - flows[t]) / value[t-1]
+gives a time-weighted growth index, so any period's TWR is a ratio of two
+index points, and the money-weighted return is the XIRR of the period's
+opening value, flows and closing value.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+# Calendar bucket for each supported interval (numpy datetime64 unit)
+INTERVAL_UNITS = {"day": "D", "month": "M", "year": "Y"}
+
+
+def as_dates(values) -> np.ndarray:
+    """Convert an iterable of date/ISO strings to a datetime64[D] array."""
+    return np.array([np.datetime64(v, "D") for v in values], dtype="datetime64[D]")
+
+
+def align_flows(dates: np.ndarray, flow_dates: np.ndarray, flow_amounts: np.ndarray) -> np.ndarray:
+    """
+    Sum flows onto the snapshot dates: each flow lands on the first snapshot
+    dated on or after it. Flows after the last snapshot are dropped.
+    """
+    idx  = np.searchsorted(dates, flow_dates, side="left")
+    keep = idx < len(dates)
+    return np.bincount(idx[keep], weights=flow_amounts[keep], minlength=len(dates)).astype(float)
+
+
+def step_gains(values: np.ndarray, flows: np.ndarray) -> np.ndarray:
+    """Deposit-adjusted gain for every step; the baseline step is 0."""
+    gains = np.zeros_like(values)
+    gains[1:] = values[1:] - values[:-1] - flows[1:]
+    return gains
+
+
+def period_series(
+    dates: np.ndarray,
+    values: np.ndarray,
+    flow_dates: np.ndarray,
+    flow_amounts: np.ndarray,
+    interval: str = "day",
+) -> list[dict]:
+    """
+    Gain/loss per calendar interval ("day", "month" or "year") after the baseline.
+
+    Each period's gain is measured from the closing value of the previous
+    period (the baseline for the first one) to the last snapshot inside it.
+    """
+    if len(dates) < 2:
+        return []
+    unit  = INTERVAL_UNITS[interval]
+    flows = align_flows(dates, flow_dates, flow_amounts)
+    gains = step_gains(values, flows)
+
+    # Periods cover the points after the baseline (index 0)
+    keys   = dates[1:].astype(f"datetime64[{unit}]")
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends   = np.r_[starts[1:] - 1, len(keys) - 1]
+
+    period_gain  = np.add.reduceat(gains[1:], starts)
+    period_flows = np.add.reduceat(flows[1:], starts)
+    open_values  = values[starts]           # value at the point before each period
+    close_values = values[ends + 1]
+    pct          = np.divide(period_gain * 100, open_values,
+                             out=np.full_like(period_gain, np.nan), where=open_values > 0)
+    cumulative   = np.cumsum(period_gain)
+
+    series = []
+    for k in range(len(starts)):
+        series.append({
+            "period":              str(keys[starts[k]]),
+            "end_date":            str(dates[ends[k] + 1]),
+            "end_value_gbp":       round(float(close_values[k]), 2),
+            "net_deposits_gbp":    round(float(period_flows[k]), 2),
+            "gain_loss_gbp":       round(float(period_gain[k]), 2),
+            "gain_loss_pct":       None if np.isnan(pct[k]) else round(float(pct[k]), 2),
+            "cumulative_gain_gbp": round(float(cumulative[k]), 2),
+        })
+    return series
+
+
+# ── Returns ───────────────────────────────────────────────────────────────────
+
+# Named periods accepted by period_bounds(), besides "YYYY-MM-DD:YYYY-MM-DD"
+PERIODS = ("1M", "3M", "6M", "YTD", "TAX_YEAR", "1Y", "3Y", "5Y", "INCEPTION")
+
+# Window lengths in months for trailing periods and rolling windows
+WINDOW_MONTHS = {"1M": 1, "3M": 3, "6M": 6, "12M": 12, "1Y": 12, "3Y": 36, "5Y": 60}
+
+
+def twr_index(values: np.ndarray, flows: np.ndarray) -> np.ndarray:
+    """
+    Cumulative time-weighted growth index over the series, 1.0 at the first
+    point. Each step grows by (value[t] - flows[t]) / value[t-1], i.e. flows
+    count at the end of their day as in step_gains(); steps opening at zero
+    or below have nothing invested and are flat. The TWR between points a
+    and b is index[b] / index[a] - 1.
+    """
+    growth  = np.ones_like(values)
+    opening = values[:-1]
+    growth[1:] = np.divide(values[1:] - flows[1:], opening, out=np.ones_like(opening), where=opening > 0)
+    return np.cumprod(growth)
+
+
+def months_before(dates: np.ndarray, months: int) -> np.ndarray:
+    """The same day `months` calendar months earlier (clamped to month end), for datetime64[D] arrays."""
+    month  = dates.astype("datetime64[M]")
+    day    = (dates - month.astype("datetime64[D]")).astype(int)
+    target = month - months
+    length = ((target + 1).astype("datetime64[D]") - target.astype("datetime64[D]")).astype(int)
+    return target.astype("datetime64[D]") + np.minimum(day, length - 1)
+
+
+def period_bounds(period: str, end: np.datetime64, first: np.datetime64) -> tuple[np.datetime64, np.datetime64]:
+    """
+    (start, end) dates for a named period ending at `end`, or for an explicit
+    "YYYY-MM-DD:YYYY-MM-DD" range. A period is measured from the closing value
+    on its start date, so YTD starts on 31 December and TAX_YEAR on 5 April.
+    Only a malformed explicit range raises; a named period with no data (e.g.
+    INCEPTION when `end` is not after `first`) is left to period_return().
+    """
+    name = period.upper()
+    if ":" in period:
+        start, end = (np.datetime64(part.strip(), "D") for part in period.split(":", 1))
+        if start >= end:
+            raise ValueError(f"period '{period}' is empty")
+    elif name in WINDOW_MONTHS:
+        start = months_before(np.array([end]), WINDOW_MONTHS[name])[0]
+    elif name == "YTD":
+        start = end.astype("datetime64[Y]").astype("datetime64[D]") - 1
+    elif name == "TAX_YEAR":
+        year  = end.astype("datetime64[Y]").astype(int) + 1970
+        april = np.datetime64(f"{year}-04-05")
+        start = april if end > april else np.datetime64(f"{year - 1}-04-05")
+    elif name == "INCEPTION":
+        start = first
+    else:
+        raise ValueError(f"period must be one of {PERIODS} or 'YYYY-MM-DD:YYYY-MM-DD', not '{period}'")
+    return start, end
+
+
+def xirr(days: np.ndarray, amounts: np.ndarray) -> float:
+    """
+    Annualised money-weighted return: the rate r at which the cash flows
+    (`amounts`, negative = paid in, at `days` days from the first) have zero
+    net present value. Newton's method evaluates every flow at once per step,
+    with bisection as a fallback. NaN when no rate exists (e.g. flows all one sign).
+    """
+    years = days / 365.0
+
+    def npv(rate: float) -> float:
+        return float(np.sum(amounts * (1.0 + rate) ** -years))
+
+    rate = 0.1
+    for _ in range(50):
+        factor = (1.0 + rate) ** -years
+        value  = float(np.sum(amounts * factor))
+        slope  = float(np.sum(-years * amounts * factor / (1.0 + rate)))
+        if slope == 0 or not np.isfinite(slope):
+            break
+        step = value / slope
+        rate -= step
+        if rate <= -1 or not np.isfinite(rate):
+            break
+        if abs(step) < 1e-10:
+            return rate
+
+    low, high = -0.9999, 10.0
+    f_low, f_high = npv(low), npv(high)
+    while f_low * f_high > 0 and high < 1e6:
+        high *= 10
+        f_high = npv(high)
+    if not (np.isfinite(f_low) and np.isfinite(f_high)) or f_low * f_high > 0:
+        return float("nan")
+    for _ in range(200):
+        mid   = (low + high) / 2
+        f_mid = npv(mid)
+        if f_low * f_mid <= 0:
+            high = mid
+        else:
+            low, f_low = mid, f_mid
+        if high - low < 1e-10:
+            break
+    return (low + high) / 2
+
+
+def period_return(
+    dates: np.ndarray,
+    values: np.ndarray,
+    flows: np.ndarray,
+    index: np.ndarray,
+    start: np.datetime64,
+    end: np.datetime64,
+) -> Optional[dict]:
+    """
+    TWR and money-weighted return between the last snapshots on or before
+    `start` and `end`, or None when the range holds fewer than two snapshots.
+    If `start` precedes the first snapshot the period runs from that snapshot
+    instead and "clamped" is True.
+    """
+    a = max(int(np.searchsorted(dates, start, side="right")) - 1, 0)
+    b = int(np.searchsorted(dates, end, side="right")) - 1
+    if b <= a:
+        return None
+
+    span     = int((dates[b] - dates[a]).astype(int))
+    twr      = index[b] / index[a] - 1
+    inside   = slice(a + 1, b + 1)
+    moved    = np.flatnonzero(flows[inside]) + a + 1
+    mwr_days = np.r_[0, (dates[moved] - dates[a]).astype(int), span].astype(float)
+    mwr_cash = np.r_[-values[a], -flows[moved], values[b]]
+    mwr      = xirr(mwr_days, mwr_cash) if values[a] > 0 or len(moved) else float("nan")
+
+    def pct(x: float) -> Optional[float]:
+        return None if not np.isfinite(x) else round(float(x) * 100, 2)
+
+    return {
+        "start_date":         str(dates[a]),
+        "end_date":           str(dates[b]),
+        "clamped":            bool(start < dates[0]),
+        "days":               span,
+        "start_value_gbp":    round(float(values[a]), 2),
+        "end_value_gbp":      round(float(values[b]), 2),
+        "net_deposits_gbp":   round(float(flows[inside].sum()), 2),
+        "gain_loss_gbp":      round(float(values[b] - values[a] - flows[inside].sum()), 2),
+        "twr_pct":            pct(twr),
+        "twr_annualised_pct": pct((1 + twr) ** (365.0 / span) - 1) if span >= 365 else None,
+        "mwr_pct":            pct((1 + mwr) ** (span / 365.0) - 1),
+        "mwr_annualised_pct": pct(mwr) if span >= 365 else None,
+    }
+
+
+def rolling_twr(dates: np.ndarray, index: np.ndarray, window: str,
+                start: np.datetime64, end: np.datetime64) -> list[dict]:
+    """
+    Trailing `window` TWR (a WINDOW_MONTHS key) at the last snapshot of every
+    month in [start, end], skipping month ends whose window starts before the
+    first snapshot.
+    """
+    name = window.upper()
+    if name not in WINDOW_MONTHS:
+        raise ValueError(f"rolling must be one of {tuple(WINDOW_MONTHS)}")
+    points = np.flatnonzero((dates >= start) & (dates <= end))
+    if not len(points):
+        return []
+    months  = dates[points].astype("datetime64[M]")
+    points  = points[np.r_[months[1:] != months[:-1], True]]          # last snapshot of each month
+    begins  = months_before(dates[points], WINDOW_MONTHS[name])
+    base    = np.searchsorted(dates, begins, side="right") - 1
+    covered = (begins >= dates[0]) & (base >= 0)
+    points, base = points[covered], base[covered]
+    twr = index[points] / index[base] - 1
+    return [{"date": str(dates[p]), "twr_pct": round(float(r) * 100, 2)} for p, r in zip(points, twr)]
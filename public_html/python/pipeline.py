@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Fetch Pipeline
+Runs any combination of the Yahoo Finance cron jobs in one process, sharing
+one database connection, one active-symbol list, one rate limiter and one
+market data provider (providers.py; yfinance keeps a process-wide HTTP session).
+
+Every job is a set of stages driven by run_job():
+
+    source    job.prepare()  reads what the job needs besides the symbol list
+    fetch     job.fetch()    runs on the fetch_engine worker pool, in symbol order
+    validate  job.validate() turns a fetch result into something to store (or rejects it)
+    sink      job.sink() / job.flush()  writes to the database
+
+and the time spent in each stage is reported at the end of the job. Jobs
+with a log_file append their output to it as one run record (runlog.py).
+The job classes live next to their original scripts (fetch_prices.py, ...),
+which remain as thin entry points that run a single job.
+
+Usage:
+    python3 pipeline.py prices daily yields historical fx [options]
+
+Options are passed to every job: --no-batch/--batch-size (prices),
+--force (yields), --full/--no-cache (historical and fx).
+"""
+
+import os
+import sys
+import time
+import argparse
+import importlib
+import datetime as dt
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+import mysql.connector
+
+import runlog
+import providers
+from fetch_engine import TokenBucket, fetch_in_order
+
+# --- Config: read from environment variables (set via .env or cron environment)
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_NAME = os.getenv("DB_NAME", "investments")
+DB_USER = os.getenv("DB_USER", "root")
+DB_PASS = os.getenv("DB_PASS")
+if DB_PASS is None:
+    raise RuntimeError(
+        "DB_PASS environment variable must be set. "
+        "See .env.example. For cron: export DB_PASS=yourpassword before running."
+    )
+
+UTC = pytz.UTC
+
+# Job name → "module:Class", imported on demand
+JOBS = {
+    "prices":     "fetch_prices:LatestPricesJob",
+    "daily":      "fetch_daily_prices:DailyPricesJob",
+    "yields":     "fetch_dividend_yields:DividendYieldsJob",
+    "historical": "fetch_historical_prices:HistoricalPricesJob",
+    "fx":         "fetch_fx_rates:FxRatesJob",
+}
+STAGES = ("source", "fetch", "validate", "sink")
+
+def db_conn():
+    return mysql.connector.connect(
+        host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME, autocommit=True
+    )
+
+def fetch_active_symbols(cursor) -> List[Tuple[str, str, str]]:
+    """Get all active ticker symbols from the database."""
+    cursor.execute("""
+        SELECT ticker, yahoo_symbol, currency
+        FROM hl_ticker_symbols
+        WHERE is_active = 1
+        ORDER BY ticker
+    """)
+    return cursor.fetchall()
+
+
+class StageTimer:
+    """
+    Accumulates wall time per pipeline stage. Stages may nest (e.g. a batch
+    download inside prepare()); time is charged to the innermost stage only.
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {stage: 0.0 for stage in STAGES}
+        self._stack: List[str] = []
+        self._since = 0.0
+
+    @contextmanager
+    def stage(self, name: str):
+        now = time.perf_counter()
+        if self._stack:
+            self.seconds[self._stack[-1]] += now - self._since
+        self._stack.append(name)
+        self._since = now
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.seconds[self._stack.pop()] += now - self._since
+            self._since = now
+
+    def report(self) -> str:
+        return ", ".join(f"{stage} {self.seconds[stage]:.2f}s" for stage in STAGES)
+
+
+class Context:
+    """What the jobs in one invocation share."""
+
+    def __init__(self, conn, symbols: List[Tuple[str, str, str]], options: argparse.Namespace):
+        self.conn    = conn
+        self.cursor  = conn.cursor()
+        self.symbols = symbols
+        self.options = options
+        self.limiter = TokenBucket()
+        self.provider = providers.get_provider()
+        self.timer   = StageTimer()     # replaced for each job by run_job()
+
+
+class Skip:
+    """Returned by Job.fetch() for a symbol that needs no download this run."""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+
+
+class Failure:
+    """Stands in for the result of a Job.fetch() call that raised."""
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+class Job:
+    """
+    Base class for a fetch job. Subclasses implement fetch() and usually
+    prepare(), validate(), sink(), flush() and summary(). fetch() runs on a
+    worker thread and must take a ctx.limiter token before each Yahoo request;
+    everything else runs on the main thread.
+    """
+
+    name = ""
+    title: Optional[str] = None     # header line; None for no header
+    rule = 60                       # width of the ==== separator lines
+    log_file: Optional[str] = None  # append a run record here (runlog.py), if set
+    progress = True                 # print "[i/n] Processing ..." per symbol
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.skipped = 0
+        self.errors = 0                 # rows whose fetch() raised
+
+    def log(self, message: str):
+        """Print message and collect it for the log file."""
+        print(message)
+        self.lines.append(message)
+
+    def prepare(self, ctx: Context):
+        pass
+
+    def rows(self, ctx: Context) -> list:
+        """The (key, yahoo_symbol, currency) rows to fetch, after prepare(); the active symbols by default."""
+        return ctx.symbols
+
+    def fetch(self, ctx: Context, row):
+        raise NotImplementedError
+
+    def skip(self, ctx: Context, row, skip: Skip):
+        self.log(f"  [SKIP] {skip.reason}")
+        self.skipped += 1
+
+    def fail(self, ctx: Context, row, failure: Failure):
+        self.log(f"  [ERROR] Fetch failed: {type(failure.error).__name__}: {failure.error}")
+        self.errors += 1
+
+    def validate(self, ctx: Context, row, result):
+        """Return what sink() should store for this row, or None to store nothing."""
+        return result
+
+    def sink(self, ctx: Context, row, value):
+        pass
+
+    def end_row(self, ctx: Context, row):
+        pass
+
+    def flush(self, ctx: Context):
+        pass
+
+    def summary(self, ctx: Context) -> int:
+        """Log the closing summary and return the job's exit status."""
+        return 0
+
+
+def run_job(job: Job, ctx: Context) -> int:
+    """
+    Run every stage of `job` and return its exit status. A fetch that raises
+    fails only its own row; an error anywhere else ends the job with status 1
+    but not the invocation. Either way the run record is written.
+    """
+    timer = ctx.timer = StageTimer()
+    started = dt.datetime.now()
+    status = 1
+    if job.title:
+        job.log(f"{job.title} - {started.strftime('%Y-%m-%d %H:%M:%S')}")
+        job.log("=" * job.rule)
+
+    def fetch(row):
+        try:
+            return job.fetch(ctx, row)
+        except Exception as e:
+            return Failure(e)
+
+    try:
+        with timer.stage("source"):
+            job.prepare(ctx)
+
+        rows = job.rows(ctx)
+        fetched = iter(fetch_in_order(rows, fetch))
+        for i, row in enumerate(rows, 1):
+            with timer.stage("fetch"):
+                _, result = next(fetched)
+            if job.progress:
+                job.log(f"[{i}/{len(rows)}] Processing {row[0]} ({row[1]})...")
+            if isinstance(result, Skip):
+                job.skip(ctx, row, result)
+            elif isinstance(result, Failure):
+                job.fail(ctx, row, result)
+            else:
+                with timer.stage("validate"):
+                    value = job.validate(ctx, row, result)
+                if value is not None:
+                    with timer.stage("sink"):
+                        job.sink(ctx, row, value)
+            job.end_row(ctx, row)
+
+        with timer.stage("sink"):
+            job.flush(ctx)
+
+        status = job.summary(ctx)
+        if job.errors:
+            job.log(f"Fetch errors: {job.errors}")
+            status = max(status, 1)
+    except Exception as e:
+        job.log(f"[ERROR] {job.name} job failed: {type(e).__name__}: {e}")
+    finally:
+        job.log(f"Stage timings: {timer.report()}")
+        if job.log_file and job.lines:
+            runlog.append_run(job.log_file, runlog.run_record(job.name, started, status, job.lines, timer.seconds))
+    return status
+
+
+def load_job(name: str) -> Job:
+    module_name, class_name = JOBS[name].split(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run Yahoo Finance fetch jobs in one process.")
+    parser.add_argument("jobs", nargs="+", choices=sorted(JOBS), help="Jobs to run, in order")
+    parser.add_argument("--no-batch", action="store_true",
+                        help="prices: fetch each symbol separately (the original, slower path)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="prices: symbols per batched download")
+    parser.add_argument("--force", action="store_true",
+                        help="yields: refresh every symbol, ignoring YIELD_MAX_AGE_HOURS")
+    parser.add_argument("--full", action="store_true",
+                        help="historical/fx: re-download everything instead of only the missing tail")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="historical/fx: bypass the on-disk history cache")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    options = parse_args(argv)
+    jobs = [load_job(name) for name in dict.fromkeys(options.jobs)]
+
+    # Connect to database
+    try:
+        conn = db_conn()
+    except Exception as e:
+        print(f"[ERROR] Failed to connect to database: {e}")
+        return 1
+
+    try:
+        # Get active symbols
+        try:
+            cursor = conn.cursor()
+            symbols = fetch_active_symbols(cursor)
+            cursor.close()
+        except Exception as e:
+            print(f"[ERROR] Failed to fetch symbols: {e}")
+            return 1
+        if not symbols:
+            print("No active symbols found; exiting.")
+            return 0
+
+        ctx = Context(conn, symbols, options)
+        status = 0
+        for k, job in enumerate(jobs):
+            if k:
+                print()
+            status = max(status, run_job(job, ctx))
+        ctx.cursor.close()
+    finally:
+        conn.close()
+    return status
+
+if __name__ == "__main__":
+    # Run through the importable module so the job modules share its state
+    import pipeline
+    sys.exit(pipeline.main())
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Intraday Price Daemon
+Long-running alternative to the "prices" cron job. Keeps hl_prices_latest
+current during market hours and writes only the rows whose price changed.
+
+Each active symbol belongs to the exchange for its currency (GBP/GBp → London,
+USD → New York, EUR → Frankfurt). One asyncio task per exchange polls that
+exchange's symbols every DAEMON_POLL_SECONDS while it is open (Mon-Fri, no
+holiday calendar) and sleeps until the next open otherwise. Poll results are
+compared with an in-memory map of the last stored price per ticker, seeded
+from hl_prices_latest at startup, and the changed rows are upserted in one
+batch. Unchanged rows keep their previous asof_utc.
+
+A heartbeat file is rewritten after every poll and every
+DAEMON_HEARTBEAT_SECONDS, recording per exchange whether it is open, the last
+poll and how many rows changed. `--status` prints it and exits non-zero if it
+is stale, for use from monitoring or a systemd timer.
+
+Run it as a service with investment-price-daemon.service (copy it to
+/etc/systemd/system/, then `systemctl enable --now investment-price-daemon`).
+Its venv needs the fetch scripts' packages (requirements-fetch.txt; see
+MCP_SETUP.md). The "prices" cron job can then be dropped.
+
+Usage:
+    python3 price_daemon.py             run until SIGTERM/SIGINT
+    python3 price_daemon.py --once      one poll of every open exchange, then exit
+    python3 price_daemon.py --status    show the heartbeat
+
+Config (environment, plus the usual DB_* and PRICE_PROVIDER):
+    DAEMON_POLL_SECONDS       seconds between polls of an open exchange (default 60)
+    DAEMON_SYMBOL_REFRESH     seconds between re-reading active symbols (default 600)
+    DAEMON_HEARTBEAT          heartbeat file (default ../logs/price_daemon.heartbeat.json)
+    DAEMON_HEARTBEAT_SECONDS  heartbeat interval when nothing is polling (default 60)
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import logging
+import argparse
+import datetime as dt
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+
+import pipeline
+import price_sink
+import providers
+from fetch_engine import TokenBucket
+from fetch_prices import get_latest_prices_batch, BATCH_SIZE
+
+DAEMON_POLL_SECONDS      = float(os.getenv("DAEMON_POLL_SECONDS", "60"))
+DAEMON_SYMBOL_REFRESH    = float(os.getenv("DAEMON_SYMBOL_REFRESH", "600"))
+DAEMON_HEARTBEAT         = os.getenv("DAEMON_HEARTBEAT", "../logs/price_daemon.heartbeat.json")
+DAEMON_HEARTBEAT_SECONDS = float(os.getenv("DAEMON_HEARTBEAT_SECONDS", "60"))
+
+UTC = pytz.UTC
+
+log = logging.getLogger("price_daemon")
+
+# Exchange → (timezone, open, close), local time
+EXCHANGES = {
+    "LSE":  ("Europe/London",    dt.time(8, 0),  dt.time(16, 30)),
+    "NYSE": ("America/New_York", dt.time(9, 30), dt.time(16, 0)),
+    "XETR": ("Europe/Berlin",    dt.time(9, 0),  dt.time(17, 30)),
+}
+CURRENCY_EXCHANGE = {"GBP": "LSE", "GBp": "LSE", "GBX": "LSE", "USD": "NYSE", "EUR": "XETR"}
+DEFAULT_EXCHANGE = "LSE"
+
+Row = Tuple[str, str, str]      # (ticker, yahoo_symbol, currency)
+
+# Decimal places of hl_prices_latest.price (DECIMAL(18,6)); quotes are compared and stored at this precision
+PRICE_DP = 6
+
+
+def exchange_for(currency: str) -> str:
+    return CURRENCY_EXCHANGE.get(currency, CURRENCY_EXCHANGE.get((currency or "").upper(), DEFAULT_EXCHANGE))
+
+
+def is_open(exchange: str, now: dt.datetime) -> bool:
+    tz, opens, closes = EXCHANGES[exchange]
+    local = now.astimezone(pytz.timezone(tz))
+    return local.weekday() < 5 and opens <= local.time() < closes
+
+
+def next_open(exchange: str, now: dt.datetime) -> dt.datetime:
+    """The next session open strictly after `now` (UTC)."""
+    tz_name, opens, _ = EXCHANGES[exchange]
+    tz = pytz.timezone(tz_name)
+    day = now.astimezone(tz).date()
+    for _ in range(8):
+        if day.weekday() < 5:
+            candidate = tz.localize(dt.datetime.combine(day, opens))
+            if candidate > now:
+                return candidate.astimezone(UTC)
+        day += dt.timedelta(days=1)
+    raise RuntimeError(f"No open found for {exchange}")
+
+
+def changed_rows(rows: List[Row], quotes: Dict[str, providers.Quote],
+                 last: Dict[str, float]) -> List[tuple]:
+    """hl_prices_latest rows for tickers whose price, rounded as stored, differs from `last`."""
+    changed = []
+    for ticker, symbol, currency in rows:
+        price, asof = quotes.get(symbol, (None, None))
+        if price is None:
+            continue
+        price = round(price, PRICE_DP)
+        if last.get(ticker) == price:
+            continue
+        changed.append((ticker, symbol, price, currency, asof.strftime("%Y-%m-%d %H:%M:%S"), "yfinance"))
+    return changed
+
+
+class ExchangeState:
+    def __init__(self, name: str):
+        self.name          = name
+        self.symbols       = 0
+        self.open          = False
+        self.last_poll: Optional[str] = None
+        self.next_poll: Optional[str] = None
+        self.polls         = 0
+        self.last_changed  = 0
+        self.changed_total = 0
+        self.errors        = 0
+        self.last_error: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class PriceDaemon:
+    def __init__(self, poll_seconds: float = DAEMON_POLL_SECONDS, heartbeat_file: str = DAEMON_HEARTBEAT):
+        self.poll_seconds   = poll_seconds
+        self.heartbeat_file = heartbeat_file
+        self.provider       = providers.get_provider()
+        self.limiter        = TokenBucket()
+        self.conn           = None
+        self.rows: Dict[str, List[Row]] = {name: [] for name in EXCHANGES}
+        self.last: Dict[str, float] = {}
+        self.state = {name: ExchangeState(name) for name in EXCHANGES}
+        self.started   = dt.datetime.now(tz=UTC)
+        self.stopping  = asyncio.Event()
+        self._db_lock  = asyncio.Lock()
+        self._symbols_loaded = 0.0
+
+    # ── Database (blocking; run in the default executor under _db_lock) ──────
+
+    def _connect(self):
+        if self.conn is None:
+            self.conn = pipeline.db_conn()
+        else:
+            self.conn.ping(reconnect=True, attempts=3, delay=2)
+        return self.conn
+
+    def _load_symbols(self) -> Tuple[List[Row], Dict[str, float]]:
+        cursor = self._connect().cursor()
+        try:
+            symbols = pipeline.fetch_active_symbols(cursor)
+            cursor.execute("SELECT ticker, price FROM hl_prices_latest")
+            stored = {ticker: float(price) for ticker, price in cursor.fetchall() if price is not None}
+        finally:
+            cursor.close()
+        return symbols, stored
+
+    def _write(self, rows: List[tuple]) -> int:
+        with price_sink.transaction(self._connect()) as cursor:
+            return price_sink.upsert_rows(cursor, "hl_prices_latest", price_sink.LATEST_COLUMNS,
+                                          ("yahoo_symbol", "price", "currency", "asof_utc", "source"), rows)
+
+    async def _db(self, fn, *args):
+        async with self._db_lock:
+            return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    # ── Scheduling ───────────────────────────────────────────────────────────
+
+    async def refresh_symbols(self, force: bool = False) -> None:
+        if not force and time.monotonic() - self._symbols_loaded < DAEMON_SYMBOL_REFRESH:
+            return
+        symbols, stored = await self._db(self._load_symbols)
+        rows = {name: [] for name in EXCHANGES}
+        for row in symbols:
+            rows[exchange_for(row[2])].append(row)
+        self.rows = rows
+        # Re-seed from the table so writes by other jobs (e.g. the daily close) are compared against
+        self.last = stored
+        for name, state in self.state.items():
+            state.symbols = len(rows[name])
+        self._symbols_loaded = time.monotonic()
+        log.info("Loaded %d active symbols: %s", len(symbols),
+                 ", ".join(f"{name} {len(r)}" for name, r in rows.items()))
+
+    async def poll(self, exchange: str) -> int:
+        """Fetch every symbol on `exchange` and store the changed prices. Returns rows written."""
+        state = self.state[exchange]
+        rows  = self.rows[exchange]
+        state.polls += 1
+        state.last_poll = dt.datetime.now(tz=UTC).isoformat(timespec="seconds")
+        if not rows:
+            return 0
+        symbols = sorted({symbol for _, symbol, _ in rows})
+        try:
+            quotes = await asyncio.get_running_loop().run_in_executor(
+                None, get_latest_prices_batch, symbols, BATCH_SIZE, self.limiter, self.provider)
+            changed = changed_rows(rows, quotes, self.last)
+            if changed:
+                await self._db(self._write, changed)
+                for ticker, _, price, _, _, _ in changed:
+                    self.last[ticker] = price
+        except Exception as e:
+            state.errors += 1
+            state.last_error = f"{type(e).__name__}: {e}"
+            log.warning("%s poll failed: %s", exchange, state.last_error)
+            return 0
+        state.last_changed   = len(changed)
+        state.changed_total += len(changed)
+        log.info("%s: %d/%d quotes, %d changed", exchange, len(quotes), len(symbols), len(changed))
+        return len(changed)
+
+    async def run_exchange(self, exchange: str) -> None:
+        state = self.state[exchange]
+        while not self.stopping.is_set():
+            now = dt.datetime.now(tz=UTC)
+            state.open = is_open(exchange, now)
+            if state.open:
+                try:
+                    await self.refresh_symbols()
+                except Exception as e:
+                    state.errors += 1
+                    state.last_error = f"{type(e).__name__}: {e}"
+                    log.warning("Symbol refresh failed: %s", state.last_error)
+                started = time.monotonic()
+                await self.poll(exchange)
+                wait = max(0.0, self.poll_seconds - (time.monotonic() - started))
+            else:
+                wait = (next_open(exchange, now) - now).total_seconds()
+            state.next_poll = (dt.datetime.now(tz=UTC) + dt.timedelta(seconds=wait)).isoformat(timespec="seconds")
+            self.write_heartbeat()
+            await self._sleep(wait)
+
+    async def heartbeat(self) -> None:
+        while not self.stopping.is_set():
+            now = dt.datetime.now(tz=UTC)
+            for name, state in self.state.items():
+                state.open = is_open(name, now)
+            self.write_heartbeat()
+            await self._sleep(DAEMON_HEARTBEAT_SECONDS)
+
+    async def _sleep(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self.stopping.wait(), timeout=max(0.0, seconds))
+        except asyncio.TimeoutError:
+            pass
+
+    def write_heartbeat(self) -> None:
+        beat = {
+            "pid":       os.getpid(),
+            "provider":  self.provider.name,
+            "started":   self.started.isoformat(timespec="seconds"),
+            "updated":   dt.datetime.now(tz=UTC).isoformat(timespec="seconds"),
+            "poll_seconds": self.poll_seconds,
+            "exchanges": {name: state.as_dict() for name, state in self.state.items()},
+        }
+        try:
+            heartbeat_dir = os.path.dirname(self.heartbeat_file)
+            if heartbeat_dir:
+                os.makedirs(heartbeat_dir, exist_ok=True)
+            tmp = self.heartbeat_file + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(beat, f, indent=2)
+            os.replace(tmp, self.heartbeat_file)
+        except OSError as e:
+            log.warning("Could not write heartbeat %s: %s", self.heartbeat_file, e)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stopping.set)
+        await self.refresh_symbols(force=True)
+        tasks = [asyncio.create_task(self.run_exchange(name)) for name in EXCHANGES]
+        tasks.append(asyncio.create_task(self.heartbeat()))
+        log.info("Price daemon started (provider %s, poll every %gs)", self.provider.name, self.poll_seconds)
+        await self.stopping.wait()
+        await asyncio.gather(*tasks)
+        self.write_heartbeat()
+        log.info("Price daemon stopped")
+
+    async def run_once(self) -> int:
+        await self.refresh_symbols(force=True)
+        now = dt.datetime.now(tz=UTC)
+        written = 0
+        for name, state in self.state.items():
+            state.open = is_open(name, now)
+            if state.open:
+                written += await self.poll(name)
+            else:
+                log.info("%s closed; next open %s", name, next_open(name, now).isoformat())
+        self.write_heartbeat()
+        return written
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def show_status(heartbeat_file: str, max_age: float) -> int:
+    try:
+        with open(heartbeat_file, "r", encoding="utf-8") as f:
+            beat = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] No heartbeat at {heartbeat_file}: {e}")
+        return 2
+    age = (dt.datetime.now(tz=UTC) - dt.datetime.fromisoformat(beat["updated"])).total_seconds()
+    print(f"pid {beat['pid']}, provider {beat['provider']}, started {beat['started']}, "
+          f"heartbeat {age:.0f}s ago")
+    print(f"{'exchange':<8} {'open':<5} {'symbols':>7} {'polls':>6} {'changed':>8} {'errors':>6}  last poll / next poll")
+    for name, state in beat["exchanges"].items():
+        print(f"{name:<8} {'yes' if state['open'] else 'no':<5} {state['symbols']:>7} {state['polls']:>6} "
+              f"{state['changed_total']:>8} {state['errors']:>6}  {state['last_poll'] or '-'} / {state['next_poll'] or '-'}")
+        if state.get("last_error"):
+            print(f"         last error: {state['last_error']}")
+    if age > max_age:
+        print(f"[ERROR] Heartbeat is stale (older than {max_age:.0f}s)")
+        return 1
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Poll intraday prices during market hours.")
+    parser.add_argument("--once", action="store_true", help="Poll every open exchange once and exit")
+    parser.add_argument("--status", action="store_true", help="Show the heartbeat and exit")
+    parser.add_argument("--max-age", type=float, default=3 * DAEMON_HEARTBEAT_SECONDS,
+                        help="--status: seconds before the heartbeat counts as stale")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        return show_status(DAEMON_HEARTBEAT, args.max_age)
+
+    daemon = PriceDaemon()
+    try:
+        if args.once:
+            written = asyncio.run(daemon.run_once())
+            print(f"Updated {written} changed prices")
+        else:
+            asyncio.run(daemon.run())
+    finally:
+        daemon.close()
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    sys.exit(main())
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+As-of Index
+In-process "latest value on or before a date" lookups over the dated tables.
+
+Answering "what was the price of X on date D" in SQL means a MAX(trade_date)
+subquery or an ORDER BY trade_date DESC scan per question. This index keeps,
+per key, a sorted datetime64[D] array of dates and a matching array of values,
+so each question is a binary search (np.searchsorted) and a batch of
+(key, date) pairs is one vectorised search per key.
+
+    PriceIndex   hl_prices_historical, keyed by ticker (also keeps the currency)
+    ValueIndex   hl_account_values_historical, keyed by (client, account),
+                 valued by total_value_gbp
+    FxIndex      hl_fx_rates GBP cross rates, keyed by currency
+
+Loading is lazy: nothing is read until sync() first asks for some keys, and
+then only those keys' rows (or the whole table with keys=None, as the MCP
+server does for the handful of accounts). After that it refreshes incrementally:
+
+  - rows with an id above the highest id seen are new (inserts, backfills,
+    and rows deleted and re-inserted by account_snapshots.py --replace)
+  - rows dated within RECENT_DAYS of the newest date held are re-read, since
+    the price jobs upsert today's and yesterday's rows in place (same id)
+
+Refreshes run at most every `check` seconds; an index older than `ttl` seconds
+is dropped and reloaded key by key, which also picks up deletions and in-place
+edits of older rows.
+
+The index takes any cursor (tuple or dictionary rows) and holds no connection,
+so the MCP server and the fetch jobs can each keep one. Lookups are pure
+in-memory calls; sync(cur, keys) is the only method that touches the DB.
+
+Usage:
+    python3 price_index.py TICKER [DATE ...]    as-of prices (default today)
+
+Config (environment):
+    ASOF_RECENT_DAYS   days re-read on each refresh (default 7)
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+import datetime as dt
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+RECENT_DAYS = int(os.getenv("ASOF_RECENT_DAYS", "7"))
+
+NAT = np.datetime64("NaT", "D")
+
+
+def _tuples(cur) -> List[tuple]:
+    """fetchall() as tuples in column order, for tuple or dictionary cursors."""
+    return [tuple(r.values()) if isinstance(r, dict) else tuple(r) for r in cur.fetchall()]
+
+
+EPOCH_ORDINAL = dt.date(1970, 1, 1).toordinal()
+
+
+def as_days(values: Iterable) -> np.ndarray:
+    """datetime64[D] array from dates or ISO strings (dates via ordinals, far faster than np.array)."""
+    values = list(values)
+    if values and isinstance(values[0], dt.date):
+        ordinals = np.fromiter((v.toordinal() for v in values), dtype=np.int64, count=len(values))
+        return (ordinals - EPOCH_ORDINAL).astype("datetime64[D]")
+    return np.array(values, dtype="datetime64[D]")
+
+
+class AsOfIndex:
+    """
+    Sorted (dates, values) per key for one dated table. Subclasses set the
+    table, key columns, value column and any `meta_columns` kept per key
+    (from the newest row seen).
+    """
+
+    table:        str             = ""
+    key_columns:  Tuple[str, ...] = ()
+    value_column: str             = ""
+    meta_columns: Tuple[str, ...] = ()
+
+    def __init__(self, check: float = 0.0, ttl: float = 3600.0, recent_days: int = RECENT_DAYS):
+        self.check       = check
+        self.ttl         = ttl
+        self.recent_days = recent_days
+        self._lock       = threading.Lock()
+        self._reset()
+        self._lookups   = 0
+        self._loads     = 0
+        self._refreshes = 0
+
+    def _reset(self):
+        self._dates:  Dict[Hashable, np.ndarray] = {}
+        self._values: Dict[Hashable, np.ndarray] = {}
+        self._meta:   Dict[Hashable, tuple]      = {}
+        self._complete  = False                  # whole table loaded (sync with keys=None)
+        self._last_id   = 0
+        self._newest    = None                   # newest date held, for the recent window
+        self._loaded    = time.monotonic()
+        self._refreshed = self._loaded
+
+    # ── Keys and rows ────────────────────────────────────────────────────────
+
+    def _key(self, row: tuple) -> Hashable:
+        """Key of a (id, *key columns, trade_date, value, *meta) row."""
+        n = len(self.key_columns)
+        return row[1] if n == 1 else tuple(row[1:1 + n])
+
+    def _select(self) -> str:
+        columns = ("id",) + self.key_columns + ("trade_date", self.value_column) + self.meta_columns
+        return f"SELECT {', '.join(columns)} FROM {self.table}"
+
+    def _key_filter(self, keys: Sequence[Hashable]) -> Tuple[str, list]:
+        if len(self.key_columns) == 1:
+            return f"{self.key_columns[0]} IN ({', '.join(['%s'] * len(keys))})", list(keys)
+        match = "(" + " AND ".join(f"{c} = %s" for c in self.key_columns) + ")"
+        return "(" + " OR ".join([match] * len(keys)) + ")", [v for key in keys for v in key]
+
+    def _merge(self, rows: List[tuple]):
+        """
+        Fold rows for held keys (any key once the whole table is loaded) into
+        the arrays; a row for a date already held replaces it.
+        """
+        n = len(self.key_columns)
+        grouped: Dict[Hashable, List[tuple]] = {}
+        for row in rows:
+            key = self._key(row)
+            if key not in self._dates and self._complete:
+                self._dates[key]  = np.array([], dtype="datetime64[D]")
+                self._values[key] = np.array([])
+            if key in self._dates:
+                grouped.setdefault(key, []).append(row)
+
+        for key, group in grouped.items():
+            group.sort(key=lambda r: (r[1 + n], r[0]))
+            old_days = self._dates[key]
+            new_days = as_days([r[1 + n] for r in group])
+            latest   = not len(old_days) or new_days[-1] >= old_days[-1]
+            days   = np.concatenate([old_days, new_days])
+            values = np.concatenate([self._values[key],
+                                     [np.nan if r[2 + n] is None else float(r[2 + n]) for r in group]])
+            if len(old_days) and new_days[0] <= old_days[-1]:
+                # Rewrites or backfill: re-sort, keeping new rows after old ones for the same date
+                order = np.argsort(days, kind="stable")
+                days, values = days[order], values[order]
+            keep = np.ones(len(days), dtype=bool)
+            keep[:-1] = days[1:] != days[:-1]              # last of each run of equal dates wins
+            self._dates[key], self._values[key] = days[keep], values[keep]
+            if self.meta_columns and latest:
+                self._meta[key] = tuple(group[-1][3 + n:])
+            newest = group[-1][1 + n]
+            if self._newest is None or newest > self._newest:
+                self._newest = newest
+
+    # ── Loading and refreshing ───────────────────────────────────────────────
+
+    def due(self, keys: Optional[Sequence[Hashable]] = None) -> bool:
+        """True if sync(cur, keys) has work to do: keys to load, or a refresh is due."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._loaded >= self.ttl or now - self._refreshed >= self.check:
+                return True
+            if keys is None:
+                return not self._complete
+            return any(key not in self._dates for key in keys)
+
+    def sync(self, cur, keys: Optional[Sequence[Hashable]] = None):
+        """
+        Refresh the held keys if the check interval has passed, then load any
+        of `keys` not yet held. keys=None loads the whole table, after which
+        refreshes also add keys that appear later.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._loaded >= self.ttl:
+                self._reset()
+            held = list(self._dates)
+
+            if (held or self._complete) and now - self._refreshed >= self.check:
+                cur.execute(f"{self._select()} WHERE id > %s", (self._last_id,))
+                rows = _tuples(cur)
+                # Only this query covers every key, so only it may advance the id mark
+                self._last_id = max([self._last_id] + [int(r[0]) for r in rows])
+                if self._newest is not None:
+                    clause, params = self._key_filter(held) if not self._complete else ("1 = 1", [])
+                    cur.execute(f"{self._select()} WHERE {clause} AND trade_date >= %s",
+                                params + [self._newest - dt.timedelta(days=self.recent_days)])
+                    rows += _tuples(cur)
+                self._merge(rows)
+                self._refreshed = now
+                self._refreshes += 1
+
+            if keys is None and self._complete:
+                return
+            missing = None if keys is None else [key for key in dict.fromkeys(keys) if key not in self._dates]
+            if missing == []:
+                return
+            if not held:
+                # First load: later refreshes pick up from the table's current MAX(id)
+                cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {self.table}")
+                self._last_id   = int(_tuples(cur)[0][0])
+                self._refreshed = now
+            if missing is None:
+                # Whole table, skipping keys already held
+                self._complete = True
+                cur.execute(self._select())
+                rows = [r for r in _tuples(cur) if self._key(r) not in held]
+            else:
+                for key in missing:
+                    self._dates[key]  = np.array([], dtype="datetime64[D]")
+                    self._values[key] = np.array([])
+                clause, params = self._key_filter(missing)
+                cur.execute(f"{self._select()} WHERE {clause}", params)
+                rows = _tuples(cur)
+            self._merge(rows)
+            self._loads += 1
+
+    def keys(self) -> List[Hashable]:
+        """Keys held, sorted."""
+        with self._lock:
+            return sorted(self._dates)
+
+    # ── Lookups ──────────────────────────────────────────────────────────────
+
+    def lookup(self, keys: Sequence[Hashable], days: Sequence) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        As-of lookups for (keys[i], days[i]) pairs: (dates, values) arrays
+        holding each pair's latest date on or before days[i] and its value, or
+        NaT/NaN where there is none. Keys must have been sync()ed.
+        """
+        days     = as_days(days)
+        out_days = np.full(len(days), NAT)
+        out_vals = np.full(len(days), np.nan)
+        groups: Dict[Hashable, List[int]] = {}
+        for i, key in enumerate(keys):
+            groups.setdefault(key, []).append(i)
+        with self._lock:
+            self._lookups += len(days)
+            for key, idx in groups.items():
+                dates = self._dates.get(key)
+                if dates is None:
+                    raise KeyError(f"{key!r} is not loaded; call sync() first")
+                idx = np.array(idx, dtype=np.intp)
+                pos = np.searchsorted(dates, days[idx], side="right") - 1
+                hit = pos >= 0
+                out_days[idx[hit]] = dates[pos[hit]]
+                out_vals[idx[hit]] = self._values[key][pos[hit]]
+        return out_days, out_vals
+
+    def get(self, key: Hashable, day) -> Optional[Tuple[dt.date, float]]:
+        """(date, value) of the latest row for `key` on or before `day`, or None."""
+        found, values = self.lookup([key], [day])
+        return None if np.isnat(found[0]) else (found[0].item(), float(values[0]))
+
+    def meta(self, key: Hashable) -> Optional[tuple]:
+        """The meta_columns of the newest row seen for `key`."""
+        with self._lock:
+            return self._meta.get(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "keys":      len(self._dates),
+                "rows":      int(sum(len(d) for d in self._dates.values())),
+                "lookups":   self._lookups,
+                "loads":     self._loads,
+                "refreshes": self._refreshes,
+                "age_s":     round(time.monotonic() - self._loaded, 1),
+            }
+
+
+class PriceIndex(AsOfIndex):
+    """hl_prices_historical by ticker; meta(ticker) is (currency,)."""
+
+    table        = "hl_prices_historical"
+    key_columns  = ("ticker",)
+    value_column = "price"
+    meta_columns = ("currency",)
+
+    def currency(self, ticker: str) -> Optional[str]:
+        meta = self.meta(ticker)
+        return meta[0] if meta else None
+
+
+class ValueIndex(AsOfIndex):
+    """hl_account_values_historical totals by (client, account)."""
+
+    table        = "hl_account_values_historical"
+    key_columns  = ("client_name", "account_type")
+    value_column = "total_value_gbp"
+
+
+class FxIndex(AsOfIndex):
+    """hl_fx_rates GBP cross rates (units per £1) by currency, for valuation.currency_divisors()."""
+
+    table        = "hl_fx_rates"
+    key_columns  = ("currency",)
+    value_column = "rate"
+
+    def rates_on(self, day) -> Dict[str, float]:
+        """{currency: latest rate on or before `day`}, skipping currencies with none yet."""
+        currencies = self.keys()
+        _, rates = self.lookup(currencies, [day] * len(currencies))
+        return {currency: float(rate) for currency, rate in zip(currencies, rates) if not np.isnan(rate)}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Look up as-of prices from hl_prices_historical.")
+    parser.add_argument("ticker")
+    parser.add_argument("dates", nargs="*", help="YYYY-MM-DD (default today)")
+    args = parser.parse_args(argv)
+    days = args.dates or [dt.date.today().isoformat()]
+
+    import pipeline
+    index = PriceIndex()
+    conn  = pipeline.db_conn()
+    cur   = conn.cursor()
+    t0    = time.perf_counter()
+    index.sync(cur, [args.ticker])
+    found, prices = index.lookup([args.ticker] * len(days), days)
+    cur.close()
+    conn.close()
+
+    currency = index.currency(args.ticker) or ""
+    for day, on, price in zip(days, found, prices):
+        print(f"{args.ticker} {day}: " + ("no price" if np.isnat(on) else f"{price:g} {currency} (from {on})"))
+    print(f"{index.stats()['rows']} rows loaded in {time.perf_counter() - t0:.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
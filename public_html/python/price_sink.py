@@ -0,0 +1,97 @@
+"""
+Price Sink
+Bulk writers for hl_prices_historical and hl_prices_latest, shared by the
+daily and historical price fetchers.
+
+Rows are written as multi-row INSERT ... ON DUPLICATE KEY UPDATE statements of
+up to PRICE_SINK_BATCH rows each, all inside one explicit transaction, so a
+ten-year backfill for a ticker is a handful of statements and a single commit
+rather than one autocommitted round trip per trading day.
+
+Config (environment):
+    PRICE_SINK_BATCH   rows per INSERT statement (default 1000)
+"""
+
+import os
+import datetime as dt
+from contextlib import contextmanager
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+PRICE_SINK_BATCH = int(os.getenv("PRICE_SINK_BATCH", "1000"))
+
+HISTORICAL_COLUMNS = ("ticker", "yahoo_symbol", "price", "currency", "trade_date")
+LATEST_COLUMNS     = ("ticker", "yahoo_symbol", "price", "currency", "asof_utc", "source")
+
+
+@contextmanager
+def transaction(conn):
+    """Yield a cursor inside an explicit transaction; commit on success, roll back on error."""
+    conn.start_transaction()
+    cursor = conn.cursor()
+    try:
+        yield cursor
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def upsert_rows(cursor, table: str, columns: Sequence[str], update_columns: Sequence[str],
+                rows: List[tuple], batch_size: int = PRICE_SINK_BATCH) -> int:
+    """
+    INSERT ... ON DUPLICATE KEY UPDATE `rows` in multi-row statements of up to
+    `batch_size` rows. Returns the number of rows sent.
+    """
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    head = f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+    tail = " ON DUPLICATE KEY UPDATE " + ", ".join(f"{c} = VALUES({c})" for c in update_columns)
+    batch_size = max(1, batch_size)
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        params = [value for row in batch for value in row]
+        cursor.execute(head + ", ".join([placeholders] * len(batch)) + tail, params)
+    return len(rows)
+
+
+def history_rows(ticker: str, yahoo_symbol: str, currency: str, hist_data,
+                 start_date: dt.date, end_date: dt.date) -> List[Tuple]:
+    """
+    hl_prices_historical rows from a yfinance history DataFrame, converted
+    column-wise. Days outside [start_date, end_date] and missing closes are dropped.
+    """
+    if hist_data is None or hist_data.empty:
+        return []
+    dates  = np.array(hist_data.index.date, dtype=object)
+    closes = hist_data["Close"].to_numpy(dtype=float)
+    keep   = (dates >= start_date) & (dates <= end_date) & ~np.isnan(closes)
+    return [(ticker, yahoo_symbol, price, currency, trade_date)
+            for trade_date, price in zip(dates[keep].tolist(), closes[keep].tolist())]
+
+
+def write_historical(conn, rows: List[Tuple], batch_size: int = PRICE_SINK_BATCH) -> int:
+    """Upsert hl_prices_historical rows in one transaction. Returns rows written."""
+    if not rows:
+        return 0
+    with transaction(conn) as cursor:
+        return upsert_rows(cursor, "hl_prices_historical", HISTORICAL_COLUMNS,
+                           ("price", "yahoo_symbol"), rows, batch_size)
+
+
+def write_prices(conn, historical: List[Tuple], latest: List[Tuple],
+                 batch_size: int = PRICE_SINK_BATCH) -> int:
+    """
+    Upsert historical rows and the matching hl_prices_latest rows together in
+    one transaction, so the two tables never disagree. Returns rows written.
+    """
+    if not historical and not latest:
+        return 0
+    with transaction(conn) as cursor:
+        upsert_rows(cursor, "hl_prices_historical", HISTORICAL_COLUMNS,
+                    ("price", "yahoo_symbol"), historical, batch_size)
+        upsert_rows(cursor, "hl_prices_latest", LATEST_COLUMNS,
+                    ("yahoo_symbol", "price", "currency", "asof_utc", "source"), latest, batch_size)
+    return len(historical) + len(latest)
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Price Providers
+Where the fetch jobs get market data from. Every Yahoo request made by the
+fetch scripts goes through a Provider:
+
+    latest_price(symbol)              → (price, asof_utc) or (None, None)
+    latest_prices(symbols)            → {symbol: (price, asof_utc)}, one bulk request
+    history(symbol, start, end)       → daily DataFrame for [start, end], or None
+    info(symbol)                      → quote/summary dict (dividendYield, currency, ...)
+    dividends(symbol)                 → Series of dividend amounts by date
+
+Providers (PRICE_PROVIDER):
+    yfinance   live Yahoo Finance (default)
+    record     yfinance, saving every response under PROVIDER_FIXTURES
+    replay     serve saved responses from PROVIDER_FIXTURES, no network
+
+A replay run is deterministic, so ingest throughput can be measured offline,
+e.g. with a fixed REPLAY_LATENCY_MS standing in for Yahoo's response time.
+REPLAY_FAILURE_RATE makes that share of calls raise ProviderError (chosen from
+REPLAY_SEED, the call and the symbol, so the same calls fail on every run).
+
+Fixtures are one JSON file per symbol. History is stored as rows by date, so
+a recording of a wide range serves any range inside it.
+
+Usage:
+    PRICE_PROVIDER=record python3 pipeline.py daily yields historical
+    PRICE_PROVIDER=replay REPLAY_LATENCY_MS=150 python3 pipeline.py daily
+    python3 providers.py inspect [SYMBOL ...]
+
+Config (environment):
+    PRICE_PROVIDER       yfinance | record | replay (default yfinance)
+    PROVIDER_FIXTURES    fixture directory (default ../fixtures/providers)
+    REPLAY_LATENCY_MS    added delay per replayed call (default 0)
+    REPLAY_JITTER_MS     extra random delay, 0 to this (default 0)
+    REPLAY_FAILURE_RATE  fraction of replayed calls that fail, 0-1 (default 0)
+    REPLAY_SEED          seed for jitter and failures (default 0)
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import datetime as dt
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import pandas as pd
+import pytz
+import yfinance as yf
+
+PRICE_PROVIDER      = os.getenv("PRICE_PROVIDER", "yfinance")
+PROVIDER_FIXTURES   = os.getenv("PROVIDER_FIXTURES", "../fixtures/providers")
+REPLAY_LATENCY_MS   = float(os.getenv("REPLAY_LATENCY_MS", "0"))
+REPLAY_JITTER_MS    = float(os.getenv("REPLAY_JITTER_MS", "0"))
+REPLAY_FAILURE_RATE = float(os.getenv("REPLAY_FAILURE_RATE", "0"))
+REPLAY_SEED         = int(os.getenv("REPLAY_SEED", "0"))
+
+UTC = pytz.UTC
+
+Quote = Tuple[Optional[float], Optional[dt.datetime]]
+
+
+class ProviderError(Exception):
+    """A provider call failed; raised by the replay provider's injected failures."""
+
+
+def as_utc(ts) -> dt.datetime:
+    if isinstance(ts, pd.Timestamp):
+        ts = ts.to_pydatetime()
+    if ts.tzinfo is None:
+        ts = UTC.localize(ts)
+    return ts.astimezone(UTC)
+
+
+def _request_bounds(start: dt.date, end: dt.date) -> Tuple[dt.datetime, dt.datetime]:
+    # yfinance expects datetime objects, and its end bound is exclusive
+    return dt.datetime.combine(start, dt.time()), dt.datetime.combine(end + dt.timedelta(days=1), dt.time())
+
+
+class Provider:
+    """Market data source. Methods raise on transport errors; callers log and carry on."""
+
+    name = ""
+
+    def latest_price(self, symbol: str) -> Quote:
+        raise NotImplementedError
+
+    def latest_prices(self, symbols: Sequence[str]) -> Dict[str, Quote]:
+        return {}
+
+    def history(self, symbol: str, start: dt.date, end: dt.date) -> Optional[pd.DataFrame]:
+        raise NotImplementedError
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def dividends(self, symbol: str) -> pd.Series:
+        raise NotImplementedError
+
+# ── yfinance ──────────────────────────────────────────────────────────────────
+
+def _split_download(data: Optional[pd.DataFrame], symbols: Sequence[str]) -> Dict[str, pd.DataFrame]:
+    """Per-symbol frames from a group_by="ticker" yf.download() result."""
+    frames = {}
+    if data is None or data.empty:
+        return frames
+    for symbol in symbols:
+        # Columns are (symbol, field) for group_by="ticker"; older yfinance
+        # returns flat columns when only one symbol is asked for
+        if data.columns.nlevels > 1 and symbol in data.columns.get_level_values(0):
+            frame = data[symbol]
+        elif data.columns.nlevels == 1 and len(symbols) == 1:
+            frame = data
+        else:
+            continue
+        # The index is the union of every symbol's rows, so drop this symbol's empty ones
+        frame = frame.dropna(subset=["Close"])
+        if not frame.empty:
+            frames[symbol] = frame
+    return frames
+
+
+class YFinanceProvider(Provider):
+    name = "yfinance"
+
+    def latest_price(self, symbol: str) -> Quote:
+        """
+        Latest close/last trade price.
+        Strategy: try '1d'/'1m' intraday tail, then fallback to fast_info or last close.
+        """
+        t = yf.Ticker(symbol)
+
+        # Try intraday 1-minute latest candle
+        hist = t.history(period="1d", interval="1m")
+        if not hist.empty:
+            last = hist.tail(1).iloc[0]
+            return float(last.get("Close")), as_utc(last.name)
+
+        # Fallbacks:
+        fi = getattr(t, "fast_info", None)
+        if fi:
+            # fast_info has last_price sometimes
+            price = getattr(fi, "last_price", None)
+            if price is not None:
+                return float(price), dt.datetime.now(tz=UTC)
+
+        # Fallback to last close daily
+        hist = t.history(period="5d", interval="1d")
+        if not hist.empty:
+            last = hist.tail(1).iloc[0]
+            return float(last.get("Close")), as_utc(last.name)
+
+        return None, None
+
+    def latest_prices(self, symbols: Sequence[str]) -> Dict[str, Quote]:
+        """Latest 1-minute close for each symbol from one multi-ticker download."""
+        data = yf.download(
+            list(symbols), period="1d", interval="1m", group_by="ticker",
+            auto_adjust=False, threads=True, progress=False,
+        )
+        return {symbol: (float(frame["Close"].iloc[-1]), as_utc(frame.index[-1]))
+                for symbol, frame in _split_download(data, symbols).items()}
+
+    def history(self, symbol: str, start: dt.date, end: dt.date) -> Optional[pd.DataFrame]:
+        start_dt, end_dt = _request_bounds(start, end)
+        return yf.Ticker(symbol).history(start=start_dt, end=end_dt, interval="1d")
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        return yf.Ticker(symbol).info
+
+    def dividends(self, symbol: str) -> pd.Series:
+        return yf.Ticker(symbol).dividends
+
+# ── Fixtures ──────────────────────────────────────────────────────────────────
+
+def fixture_path(symbol: str, fixture_dir: str = PROVIDER_FIXTURES) -> str:
+    safe = "".join(c if c.isalnum() or c in ".-_" else f"%{ord(c):02X}" for c in symbol)
+    return os.path.join(fixture_dir, f"{safe}.json")
+
+
+def _frame_to_rows(frame: pd.DataFrame) -> Dict[str, Dict[str, float]]:
+    """Daily frame → {"YYYY-MM-DD": {column: value}}, numeric columns only."""
+    frame = frame.select_dtypes("number")
+    dates = [ts.date().isoformat() for ts in frame.index]
+    return {day: {col: (None if pd.isna(v) else float(v)) for col, v in values.items()}
+            for day, values in zip(dates, frame.to_dict("records"))}
+
+
+def _rows_to_frame(rows: Dict[str, Dict[str, float]], start: dt.date, end: dt.date) -> pd.DataFrame:
+    days = sorted(day for day in rows if start.isoformat() <= day <= end.isoformat())
+    index = pd.DatetimeIndex([pd.Timestamp(day) for day in days], name="Date")
+    return pd.DataFrame([rows[day] for day in days], index=index, dtype="float64")
+
+
+class FixtureStore:
+    """Thread-safe read/merge/write of per-symbol fixture files."""
+
+    def __init__(self, fixture_dir: str = PROVIDER_FIXTURES):
+        self.fixture_dir = fixture_dir
+        self._lock = threading.Lock()
+        self._loaded: Dict[str, Dict[str, Any]] = {}
+
+    def load(self, symbol: str) -> Dict[str, Any]:
+        with self._lock:
+            return self._load(symbol)
+
+    def _load(self, symbol: str) -> Dict[str, Any]:
+        if symbol not in self._loaded:
+            try:
+                with open(fixture_path(symbol, self.fixture_dir), "r", encoding="utf-8") as f:
+                    self._loaded[symbol] = json.load(f)
+            except (OSError, ValueError):
+                self._loaded[symbol] = {"symbol": symbol}
+        return self._loaded[symbol]
+
+    def update(self, symbol: str, **fields) -> None:
+        """Merge fields into the symbol's fixture (history rows are merged by date) and save."""
+        with self._lock:
+            fixture = self._load(symbol)
+            for key, value in fields.items():
+                if key == "history":
+                    fixture.setdefault("history", {}).update(value)
+                else:
+                    fixture[key] = value
+            os.makedirs(self.fixture_dir, exist_ok=True)
+            path = fixture_path(symbol, self.fixture_dir)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(fixture, f, indent=1, sort_keys=True, default=str)
+            os.replace(tmp, path)
+
+
+class RecordingProvider(Provider):
+    """Passes calls to another provider and saves what comes back as fixtures."""
+
+    def __init__(self, inner: Provider, fixture_dir: str = PROVIDER_FIXTURES):
+        self.inner = inner
+        self.name  = inner.name
+        self.store = FixtureStore(fixture_dir)
+
+    def _save_quote(self, symbol: str, quote: Quote) -> None:
+        price, asof = quote
+        if price is not None:
+            self.store.update(symbol, latest={"price": price, "asof_utc": as_utc(asof).isoformat()})
+
+    def latest_price(self, symbol: str) -> Quote:
+        quote = self.inner.latest_price(symbol)
+        self._save_quote(symbol, quote)
+        return quote
+
+    def latest_prices(self, symbols: Sequence[str]) -> Dict[str, Quote]:
+        found = self.inner.latest_prices(symbols)
+        for symbol, quote in found.items():
+            self._save_quote(symbol, quote)
+        return found
+
+    def history(self, symbol: str, start: dt.date, end: dt.date) -> Optional[pd.DataFrame]:
+        hist = self.inner.history(symbol, start, end)
+        if hist is not None and not hist.empty:
+            self.store.update(symbol, history=_frame_to_rows(hist))
+        return hist
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        info = self.inner.info(symbol)
+        self.store.update(symbol, info=json.loads(json.dumps(dict(info), default=str)))
+        return info
+
+    def dividends(self, symbol: str) -> pd.Series:
+        series = self.inner.dividends(symbol)
+        self.store.update(symbol, dividends={ts.date().isoformat(): float(v) for ts, v in series.items()})
+        return series
+
+
+class ReplayProvider(Provider):
+    """
+    Serves recorded fixtures. A symbol with nothing recorded behaves like Yahoo
+    does for an unknown symbol: empty history, no quote, empty info.
+    """
+
+    name = "replay"
+
+    def __init__(self, fixture_dir: str = PROVIDER_FIXTURES, latency_ms: float = REPLAY_LATENCY_MS,
+                 jitter_ms: float = REPLAY_JITTER_MS, failure_rate: float = REPLAY_FAILURE_RATE,
+                 seed: int = REPLAY_SEED):
+        self.store        = FixtureStore(fixture_dir)
+        self.latency_ms   = latency_ms
+        self.jitter_ms    = jitter_ms
+        self.failure_rate = failure_rate
+        self.seed         = seed
+        self.calls        = 0
+        self.failures     = 0
+        self._lock        = threading.Lock()
+
+    def _call(self, method: str, key: str) -> None:
+        """Apply the configured latency and fail deterministically for this (method, key)."""
+        digest = hashlib.sha256(f"{self.seed}:{method}:{key}".encode()).digest()
+        rng = random.Random(digest)
+        with self._lock:
+            self.calls += 1
+        delay = self.latency_ms + (rng.uniform(0, self.jitter_ms) if self.jitter_ms > 0 else 0.0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if self.failure_rate > 0 and rng.random() < self.failure_rate:
+            with self._lock:
+                self.failures += 1
+            raise ProviderError(f"replayed failure: {method}({key})")
+
+    def latest_price(self, symbol: str) -> Quote:
+        self._call("latest_price", symbol)
+        latest = self.store.load(symbol).get("latest")
+        if not latest:
+            return None, None
+        return float(latest["price"]), as_utc(dt.datetime.fromisoformat(latest["asof_utc"]))
+
+    def latest_prices(self, symbols: Sequence[str]) -> Dict[str, Quote]:
+        self._call("latest_prices", ",".join(symbols))
+        found = {}
+        for symbol in symbols:
+            latest = self.store.load(symbol).get("latest")
+            if latest:
+                found[symbol] = (float(latest["price"]),
+                                 as_utc(dt.datetime.fromisoformat(latest["asof_utc"])))
+        return found
+
+    def history(self, symbol: str, start: dt.date, end: dt.date) -> Optional[pd.DataFrame]:
+        self._call("history", f"{symbol}:{start}:{end}")
+        return _rows_to_frame(self.store.load(symbol).get("history", {}), start, end)
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        self._call("info", symbol)
+        return dict(self.store.load(symbol).get("info", {}))
+
+    def dividends(self, symbol: str) -> pd.Series:
+        self._call("dividends", symbol)
+        recorded = self.store.load(symbol).get("dividends", {})
+        return pd.Series(list(recorded.values()), dtype="float64",
+                         index=pd.DatetimeIndex([pd.Timestamp(d) for d in recorded], name="Date"),
+                         name="Dividends")
+
+
+_provider: Optional[Provider] = None
+_provider_lock = threading.Lock()
+
+
+def make_provider(name: str = PRICE_PROVIDER) -> Provider:
+    if name == "yfinance":
+        return YFinanceProvider()
+    if name == "record":
+        return RecordingProvider(YFinanceProvider())
+    if name == "replay":
+        return ReplayProvider()
+    raise ValueError(f"Unknown PRICE_PROVIDER {name!r} (expected yfinance, record or replay)")
+
+
+def get_provider() -> Provider:
+    """The process-wide provider chosen by PRICE_PROVIDER."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = make_provider()
+        return _provider
+
+# ── CLI ───────────────────────────────────────────────────────────────────────
+
+def cmd_inspect(args) -> int:
+    names = args.symbols
+    if not names:
+        names = []
+        if os.path.isdir(PROVIDER_FIXTURES):
+            for name in sorted(os.listdir(PROVIDER_FIXTURES)):
+                if name.endswith(".json"):
+                    with open(os.path.join(PROVIDER_FIXTURES, name), "r", encoding="utf-8") as f:
+                        names.append(json.load(f).get("symbol", name[:-len(".json")]))
+    store = FixtureStore()
+    print(f"{'symbol':<16} {'history':>7} {'from':<10} {'to':<10}  {'latest':<25} {'info':>5} {'divs':>5}")
+    for symbol in names:
+        fixture = store.load(symbol)
+        days = sorted(fixture.get("history", {}))
+        latest = fixture.get("latest") or {}
+        print(f"{symbol:<16} {len(days):>7} {days[0] if days else '-':<10} {days[-1] if days else '-':<10}  "
+              f"{latest.get('asof_utc', '-'):<25} {len(fixture.get('info', {})):>5} "
+              f"{len(fixture.get('dividends', {})):>5}")
+    print(f"{len(names)} symbols in {PROVIDER_FIXTURES}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect recorded provider fixtures.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    i = sub.add_parser("inspect", help="Show what is recorded per symbol")
+    i.add_argument("symbols", nargs="*")
+    args = parser.parse_args()
+    return {"inspect": cmd_inspect}[args.command](args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Run Log
+Append-only JSON-lines logs for the cron fetch jobs, one record per run:
+
+    {"job": "daily", "started": "...", "finished": "...", "status": 0,
+     "timings": {"source": 0.01, ...}, "lines": ["Daily Price Fetcher - ...", ...]}
+
+A run appends a single line; nothing already in the file is read or
+rewritten. The current file is rotated to <file>.1 (then .2, ...) once it
+would grow past RUNLOG_MAX_BYTES or its oldest run is older than
+RUNLOG_MAX_AGE_DAYS, and only RUNLOG_KEEP rotated files are kept.
+
+The reader walks the files backwards a block at a time, so showing the latest
+runs costs the same however much history has built up.
+
+Usage:
+    python3 runlog.py show ../logs/price_cron_daily.jsonl [-n 3] [--json]
+    python3 runlog.py list ../logs/yields_cron_daily.jsonl [-n 20]
+
+Config (environment):
+    RUNLOG_MAX_BYTES     rotate the current file beyond this size (default 1048576)
+    RUNLOG_MAX_AGE_DAYS  rotate once the oldest run in it is this old (default 90)
+    RUNLOG_KEEP          rotated files to keep (default 4)
+"""
+
+import os
+import sys
+import json
+import argparse
+import datetime as dt
+from typing import Any, Dict, Iterator, List, Optional
+
+RUNLOG_MAX_BYTES    = int(os.getenv("RUNLOG_MAX_BYTES", str(1024 * 1024)))
+RUNLOG_MAX_AGE_DAYS = float(os.getenv("RUNLOG_MAX_AGE_DAYS", "90"))
+RUNLOG_KEEP         = int(os.getenv("RUNLOG_KEEP", "4"))
+
+READ_BLOCK = 64 * 1024
+
+
+def run_record(job: str, started: dt.datetime, status: int, lines: List[str],
+               timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    return {
+        "job":      job,
+        "started":  started.isoformat(timespec="seconds"),
+        "finished": dt.datetime.now().isoformat(timespec="seconds"),
+        "status":   status,
+        "timings":  {stage: round(seconds, 3) for stage, seconds in (timings or {}).items()},
+        "lines":    lines,
+    }
+
+
+def _first_started(path: str) -> Optional[dt.datetime]:
+    """Start time of the oldest run in `path` (its first line)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return dt.datetime.fromisoformat(json.loads(f.readline())["started"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def rotate(path: str, keep: int = RUNLOG_KEEP) -> None:
+    """path → path.1 → path.2 ..., dropping anything beyond `keep`."""
+    if keep <= 0:
+        os.remove(path)
+        return
+    oldest = f"{path}.{keep}"
+    if os.path.exists(oldest):
+        os.remove(oldest)
+    for n in range(keep - 1, 0, -1):
+        if os.path.exists(f"{path}.{n}"):
+            os.replace(f"{path}.{n}", f"{path}.{n + 1}")
+    os.replace(path, f"{path}.1")
+
+
+def needs_rotation(path: str, incoming: int, max_bytes: int = RUNLOG_MAX_BYTES,
+                   max_age_days: float = RUNLOG_MAX_AGE_DAYS) -> bool:
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return False
+    if size == 0:
+        return False
+    if max_bytes > 0 and size + incoming > max_bytes:
+        return True
+    if max_age_days > 0:
+        first = _first_started(path)
+        if first is not None and dt.datetime.now() - first > dt.timedelta(days=max_age_days):
+            return True
+    return False
+
+
+def append_run(path: str, record: Dict[str, Any]) -> None:
+    """Append one run record to `path`, rotating first if it is due."""
+    try:
+        log_dir = os.path.dirname(path)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        data = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        if needs_rotation(path, len(data)):
+            rotate(path)
+        # One write on an O_APPEND descriptor, so concurrent runs don't interleave
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+    except Exception as e:
+        print(f"[ERROR] Failed to write to log file {path}: {e}")
+
+
+def _lines_reversed(path: str, block: int = READ_BLOCK) -> Iterator[bytes]:
+    """Non-empty lines of `path`, last first, reading `block` bytes at a time."""
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        tail = b""
+        while pos > 0:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + tail).split(b"\n")
+            tail = lines.pop(0)      # may continue in the previous block
+            for line in reversed(lines):
+                if line.strip():
+                    yield line
+        if tail.strip():
+            yield tail
+
+
+def log_files(path: str) -> List[str]:
+    """The current file followed by its rotated files, newest first."""
+    files = [path]
+    n = 1
+    while os.path.exists(f"{path}.{n}"):
+        files.append(f"{path}.{n}")
+        n += 1
+    return [p for p in files if os.path.exists(p)]
+
+
+def iter_runs(path: str) -> Iterator[Dict[str, Any]]:
+    """Run records from `path` and its rotations, newest first."""
+    for file in log_files(path):
+        for line in _lines_reversed(file):
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue             # a run killed mid-write leaves a partial line
+
+
+def format_run(record: Dict[str, Any]) -> str:
+    return "\n".join(record.get("lines", []))
+
+# ── CLI ───────────────────────────────────────────────────────────────────────
+
+def _take(path: str, count: int) -> Iterator[Dict[str, Any]]:
+    for i, record in enumerate(iter_runs(path)):
+        if count and i >= count:
+            break
+        yield record
+
+
+def cmd_show(args) -> int:
+    for i, record in enumerate(_take(args.file, args.runs)):
+        if args.json:
+            print(json.dumps(record))
+            continue
+        if i:
+            print("\n\n")            # same separation as the old prepended logs
+        print(format_run(record))
+    return 0
+
+
+def cmd_list(args) -> int:
+    print(f"{'started':<19}  {'finished':<19}  {'job':<10} {'status':>6}  {'lines':>5}  timings")
+    for record in _take(args.file, args.runs):
+        timings = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in record.get("timings", {}).items())
+        print(f"{record.get('started', ''):<19}  {record.get('finished', ''):<19}  {record.get('job', ''):<10} "
+              f"{record.get('status', ''):>6}  {len(record.get('lines', [])):>5}  {timings}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show cron run logs, newest first.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    s = sub.add_parser("show", help="Print the output of recent runs")
+    s.add_argument("file")
+    s.add_argument("-n", "--runs", type=int, default=1, help="Runs to show (0 = all)")
+    s.add_argument("--json", action="store_true", help="Print the raw records")
+
+    l = sub.add_parser("list", help="One line per run")
+    l.add_argument("file")
+    l.add_argument("-n", "--runs", type=int, default=20, help="Runs to list (0 = all)")
+
+    args = parser.parse_args()
+    return {"show": cmd_show, "list": cmd_list}[args.command](args)
+
+if __name__ == "__main__":
+    sys.exit(main())
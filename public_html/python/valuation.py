@@ -0,0 +1,91 @@
+"""
+Vectorised Valuation Kernel
+===========================
+Shared NumPy routines for pricing net positions.
+
+Positions are held as an (account × ticker) quantity matrix. Prices are a
+ticker-aligned vector with a matching currency divisor vector (100 for GBp
+quotes, the GBP cross rate from hl_fx_rates for foreign currencies, 1 for
+GBP), so a whole portfolio is valued with a handful of array operations
+instead of a Python loop per holding. Unpriced tickers carry NaN
+and contribute nothing to totals; only positive (currently held) quantities
+are valued.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+
+def fx_currency(currency: Optional[str]) -> Optional[str]:
+    """The code whose GBP cross rate converts `currency`, or None for sterling (GBP, GBp/GBX pence)."""
+    if not currency or currency == "GBp" or currency.upper() in ("GBP", "GBX"):
+        return None
+    return currency.upper()
+
+
+def currency_divisors(currencies, rates: Optional[dict] = None) -> np.ndarray:
+    """
+    Divisor turning a quoted price into GBP: 100 for GBp (pence), the rate
+    in `rates` ({"USD": units per £1, ...}) for other currencies, otherwise 1.
+    Currencies with no rate (or a NaN one) are left unconverted.
+    """
+    codes   = np.array([fx_currency(c) for c in currencies], dtype=object)
+    divisor = np.where(np.asarray(currencies, dtype=object) == "GBp", 100.0, 1.0)
+    for code, rate in (rates or {}).items():
+        if not np.isnan(rate):
+            divisor = np.where(codes == code, float(rate), divisor)
+    return divisor
+
+
+def price_vector(tickers: list[str], prices: dict, rates: Optional[dict] = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Align {ticker: {"price": ..., "currency": ...}} rows to `tickers`.
+    Returns (price, divisor); tickers without a price get NaN. `rates` are
+    GBP cross rates as for currency_divisors().
+    """
+    price    = np.full(len(tickers), np.nan)
+    currency = np.full(len(tickers), "GBP", dtype=object)
+    for j, ticker in enumerate(tickers):
+        p = prices.get(ticker)
+        if p is not None and p["price"] is not None:
+            price[j]    = float(p["price"])
+            currency[j] = p["currency"]
+    return price, currency_divisors(currency, rates)
+
+
+def unit_values(price: np.ndarray, divisor: np.ndarray) -> np.ndarray:
+    """GBP value of one unit of each ticker (NaN where unpriced)."""
+    return price / divisor
+
+
+def value_matrix(qty: np.ndarray, price: np.ndarray, divisor: np.ndarray) -> np.ndarray:
+    """
+    GBP value of every holding in `qty` (any shape whose last axis is tickers).
+    Positions that are closed (qty <= 0) or unpriced are valued at 0.
+    """
+    unit = unit_values(price, divisor)
+    held = (qty > 0) & ~np.isnan(unit)
+    return np.where(held, qty * np.nan_to_num(unit), 0.0)
+
+
+def account_totals(qty: np.ndarray, price: np.ndarray, divisor: np.ndarray) -> np.ndarray:
+    """Holdings value per account row of an (account × ticker) quantity matrix."""
+    return value_matrix(qty, price, divisor).sum(axis=-1)
+
+
+def ticker_totals(qty: np.ndarray, price: np.ndarray, divisor: np.ndarray) -> np.ndarray:
+    """
+    Value per ticker after netting quantities across all account rows, so a
+    ticker only counts if the combined position is still open.
+    """
+    return value_matrix(qty.sum(axis=0), price, divisor)
+
+
+def group_totals(values: np.ndarray, labels: list) -> dict:
+    """Sum `values` by the parallel `labels` list: {label: total}."""
+    order = sorted(set(labels), key=str)
+    codes = {label: i for i, label in enumerate(order)}
+    idx   = np.fromiter((codes[label] for label in labels), dtype=np.intp, count=len(labels))
+    sums  = np.bincount(idx, weights=values, minlength=len(order))
+    return dict(zip(order, sums.tolist()))
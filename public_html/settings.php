@@ -623,10 +623,61 @@ try {
             echo "</div>";
         }
         
-        // Display the three log files
-        displayLogFile('logs/price_cron_daily.log', 'Daily Price Logs');
-        displayLogFile('logs/yields_cron_daily.log', 'Daily Yield Log');
+        // Read and display the latest runs from a JSON-lines run log (python/runlog.py),
+        // newest first. Only the end of the file is read, however large it has grown.
+        function displayRunLog($filePath, $title, $maxRuns = 10, $maxBytes = 262144) {
+            echo "<div style='margin-bottom: 2rem;'>";
+            echo "<h3 style='margin: 0 0 0.5rem 0; color: #34495e; font-size: 1.0rem;'>{$title}</h3>";
+            echo "<p style='margin: 0 0 0.5rem 0; color: #666; font-size: 0.8rem;'>Showing latest {$maxRuns} runs</p>";
+
+            $runs = [];
+            // Fall back to the last rotated file when the current one is new
+            foreach ([$filePath, $filePath . '.1'] as $path) {
+                if (count($runs) >= $maxRuns || !file_exists($path)) {
+                    continue;
+                }
+                $handle = fopen($path, 'rb');
+                if ($handle === false) {
+                    continue;
+                }
+                $size = filesize($path);
+                $offset = max(0, $size - $maxBytes);
+                fseek($handle, $offset);
+                $chunk = stream_get_contents($handle);
+                fclose($handle);
+
+                $lines = explode("\n", $chunk);
+                if ($offset > 0) {
+                    array_shift($lines); // Partial first line
+                }
+                foreach (array_reverse($lines) as $line) {
+                    $record = json_decode($line, true);
+                    if (is_array($record) && isset($record['lines'])) {
+                        $runs[] = implode("\n", $record['lines']);
+                        if (count($runs) >= $maxRuns) {
+                            break;
+                        }
+                    }
+                }
+            }
+
+            if (!empty($runs)) {
+                echo "<div style='background: #f8f9fa; border: 1px solid #dee2e6; border-radius: 4px; padding: 1rem; font-family: ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, monospace; font-size: 0.8rem; max-height: 300px; overflow-y: auto; white-space: pre-wrap;'>";
+                echo htmlspecialchars(implode("\n\n\n", $runs));
+                echo "</div>";
+            } elseif (file_exists($filePath)) {
+                echo "<p class='muted'>Log file is empty.</p>";
+            } else {
+                echo "<p class='muted'>Log file not found: " . htmlspecialchars($filePath) . "</p>";
+            }
+            echo "</div>";
+        }
+
+        // Display the log files
+        displayRunLog('logs/price_cron_daily.jsonl', 'Daily Price Logs');
+        displayRunLog('logs/yields_cron_daily.jsonl', 'Daily Yield Log');
         displayLogFile('logs/daily_update_historical_values.log', 'Daily Portfolio Value Log');
+        displayRunLog('logs/account_snapshots.jsonl', 'Account Snapshot Engine Log');
         ?>
     </div>
   </main>